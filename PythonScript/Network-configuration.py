@@ -1,14 +1,45 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import psutil
 import socket
 import os
 import subprocess
-import yaml
 import glob
+import errno
+import time
+
+import command_runner
+import interface_collector
+import metrics
+import netlink
+import networkd_state
+import request_timing
+from representations import SnapshotRepresentations, columns
+from request_timing import stage
+from netplan_diff import FULL, NARROW, NOOP, NotNarrow, netlink_delta, plan_apply
+from netplan_model import NetplanModel
+from apply_scheduler import ApplyScheduler, public_job
+from counter_sampler import CounterSampler
+from route_table import MAX_LOOKUPS, RouteTable, parse_family, parse_table
+import shared_snapshot
+from snapshot_cache import SnapshotCache
+from snapshot_stream import SnapshotBroadcaster
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
+# Server-Timing on every response, cProfile on request from localhost
+request_timing.install(app)
+# Prometheus /metrics, aggregated over the gunicorn workers
+metrics.install(app, 'network-configuration')
+
+# Command timeouts (seconds) and how long read-only command output is reused
+READ_TIMEOUT = 5.0
+READ_CACHE_TTL = 1.0
+NETPLAN_GENERATE_TIMEOUT = 30.0
+NETPLAN_APPLY_TIMEOUT = 120.0
+
+# Parsed netplan files shared by the read and write paths
+netplan_model = NetplanModel()
 
 def get_physical_interfaces():
     """
@@ -16,7 +47,7 @@ def get_physical_interfaces():
     """
     try:
         # Get all network interfaces using ls command
-        result = subprocess.run(['ls', '/sys/class/net'], stdout=subprocess.PIPE, text=True)
+        result = command_runner.run(['ls', '/sys/class/net'], timeout=READ_TIMEOUT, cache_ttl=READ_CACHE_TTL)
         interfaces = result.stdout.strip().split('\n')
 
         physical_interfaces = []
@@ -35,9 +66,12 @@ def subnet_to_cidr(subnet):
     return sum(bin(x).count('1') for x in netmask)
 
 def get_gateway_from_networkctl(interface):
-    """Fetch the gateway for a specific interface using the `networkctl` command."""
+    """Fetch the gateway for a specific interface from its DHCP lease, else using the `networkctl` command."""
+    link = networkd_state.state.link(interface)
+    if link and link['lease'] and link['lease']['Router']:
+        return link['lease']['Router']
     try:
-        result = subprocess.run(['networkctl', 'status', interface], stdout=subprocess.PIPE, text=True)
+        result = command_runner.run(['networkctl', 'status', interface], timeout=READ_TIMEOUT, cache_ttl=READ_CACHE_TTL)
         output = result.stdout
 
         # Parse gateway from the output
@@ -50,9 +84,12 @@ def get_gateway_from_networkctl(interface):
     return "N/A"
 
 def get_dns_for_interface(interface):
-    """Fetch DNS information for a specific interface using resolvectl."""
+    """Fetch DNS information for a specific interface from networkd's state, else using resolvectl."""
+    link = networkd_state.state.link(interface)
+    if link is not None:
+        return ', '.join(link['dns']) or "N/A"
     try:
-        result = subprocess.run(['resolvectl', 'status', interface], stdout=subprocess.PIPE, text=True)
+        result = command_runner.run(['resolvectl', 'status', interface], timeout=READ_TIMEOUT, cache_ttl=READ_CACHE_TTL)
         output = result.stdout
 
         # Parse DNS Servers
@@ -65,15 +102,15 @@ def get_dns_for_interface(interface):
         print(f"Error fetching DNS for {interface}: {e}")
         return "N/A"
 
-def get_available_interfaces():
-    """Fetch available network interfaces using the custom method."""
+def get_available_interfaces_subprocess():
+    """Fetch available network interfaces using ip, networkctl and resolvectl."""
     interfaces = {}
     physical_interfaces = get_physical_interfaces()
 
     for interface in physical_interfaces:
         try:
             # Get interface details using ip command
-            result = subprocess.run(['ip', 'addr', 'show', interface], stdout=subprocess.PIPE, text=True)
+            result = command_runner.run(['ip', 'addr', 'show', interface], timeout=READ_TIMEOUT, cache_ttl=READ_CACHE_TTL)
             output = result.stdout
             
             # Extract IP address and subnet
@@ -98,48 +135,216 @@ def get_available_interfaces():
                 "Subnet Mask": subnet or "No Subnet",
                 "DHCP Status": "Unknown",  # Will fetch from Netplan
                 "Gateway": gateway,
-                "DNS": dns
+                "DNS": dns,
+                "DHCP Lease": (networkd_state.state.link(interface) or {}).get('lease')
             }
         except Exception as e:
             print(f"Error fetching details for interface {interface}: {e}")
 
     return interfaces
 
+def get_available_interfaces():
+    """Fetch available network interfaces from rtnetlink, falling back to the command based collector."""
+    try:
+        return interface_collector.get_available_interfaces()
+    except OSError as e:
+        print(f"Netlink collector unavailable, falling back to subprocesses: {e}")
+        return get_available_interfaces_subprocess()
+
+def netplan_overrides(settings):
+    """Return the record fields an interface's netplan settings replace."""
+    overrides = {"DHCP Status": "DHCP" if settings.get('dhcp4', False) else "Manual"}
+    if 'routes' in settings:
+        for route in settings['routes']:
+            if route.get('to') == '0.0.0.0/0':
+                overrides["Gateway"] = route.get('via', 'N/A')
+    if 'nameservers' in settings:
+        dns_addresses = settings['nameservers'].get('addresses', [])
+        overrides["DNS"] = ', '.join(dns_addresses)
+    return overrides
+
 def enrich_with_netplan(interfaces):
     """Fetch additional details from Netplan and enrich interface data."""
-    netplan_config_path = '/etc/netplan'
     try:
-        for yaml_file in glob.glob(os.path.join(netplan_config_path, '*.yaml')):
-            with open(yaml_file, 'r') as f:
-                config = yaml.safe_load(f)
-                for iface, settings in config['network']['ethernets'].items():
-                    if iface in interfaces:
-                        interfaces[iface]["DHCP Status"] = "DHCP" if settings.get('dhcp4', False) else "Manual"
-                        if 'routes' in settings:
-                            for route in settings['routes']:
-                                if route.get('to') == '0.0.0.0/0':
-                                    interfaces[iface]["Gateway"] = route.get('via', 'N/A')
-                        if 'nameservers' in settings:
-                            dns_addresses = settings['nameservers'].get('addresses', [])
-                            interfaces[iface]["DNS"] = ', '.join(dns_addresses)
+        with stage('netplan'):
+            netplan_interfaces = netplan_model.interfaces()
+        for iface, settings in netplan_interfaces.items():
+            if iface in interfaces and settings:
+                interfaces[iface].update(netplan_overrides(settings))
     except Exception as e:
         print(f"Error reading Netplan configuration: {e}")
 
     return interfaces
 
-@app.route('/network-info', methods=['GET'])
-def network_info():
+def collect_network_info():
     interfaces = get_available_interfaces()
     enriched_interfaces = enrich_with_netplan(interfaces)
-    return jsonify({"network_info": enriched_interfaces})
+    return {"network_info": enriched_interfaces}
+
+# Rebuilt only after a link/address/route event, a netplan file change or a
+# networkd state file change (DNS and leases don't always come with a netlink event)
+network_info_cache = SnapshotCache(collect_network_info, watch_globs=['/etc/netplan/*.yaml'], name='network_info')
+networkd_state.state.subscribe(network_info_cache.invalidate)
+# Collected by one worker, served by all of them from shared memory
+network_info_shared = shared_snapshot.SharedSnapshot('network-info', network_info_cache)
+# JSON, columnar and msgpack bodies, optionally compressed, rendered once per version
+network_info_representations = SnapshotRepresentations(
+    lambda data: {"network_info": columns([{"interface": iface, **record}
+                                           for iface, record in sorted(data["network_info"].items())])})
+# One watcher per worker process, shared by every open stream
+network_info_events = SnapshotBroadcaster(network_info_shared, lambda data: data["network_info"])
+
+def select_fields(record, fields):
+    return {field: record[field] for field in fields}
+
+def get_interface_info(iface, fields):
+    """
+    Collect ``fields`` of one interface without a full scan, or None if it does not exist.
 
-@app.route('/update-network', methods=['POST'])
-def update_network():
+    Fields netplan defines are taken from the parsed netplan files, so the
+    kernel and resolvectl are only asked for the rest.
     """
-    Updates the network configuration for a given interface based on the provided
-    JSON payload.
+    overrides = {}
+    if any(field in fields for field in ("DHCP Status", "Gateway", "DNS")):
+        try:
+            with stage('netplan'):
+                settings = netplan_model.interfaces().get(iface)
+            if settings:
+                overrides = netplan_overrides(settings)
+        except Exception as e:
+            print(f"Error reading Netplan configuration: {e}")
+    try:
+        record = interface_collector.get_interface(iface, [field for field in fields if field not in overrides])
+    except OSError as e:
+        print(f"Netlink collector unavailable, using the full snapshot: {e}")
+        record = network_info_shared.get().data["network_info"].get(iface)
+        if record is None:
+            return None
+        return select_fields(record, fields)
+    if record is None:
+        return None
+    record.update(overrides)
+    return select_fields(record, fields)
+
+@app.route('/network-info', methods=['GET'])
+def network_info():
+    fields = None
+    if 'fields' in request.args:
+        try:
+            fields = interface_collector.parse_fields(request.args['fields'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+    with stage('snapshot'):
+        snapshot = network_info_shared.get()
+    with stage('serialize'):
+        if fields is not None:
+            return jsonify({"network_info": {iface: select_fields(record, fields)
+                                             for iface, record in snapshot.data["network_info"].items()}})
+        return network_info_representations.response(app.response_class, request, snapshot)
+
+# /network-info/stream takes precedence over an interface named "stream",
+# which is only reachable under /network-info/interfaces/
+@app.route('/network-info/<iface>', methods=['GET'])
+@app.route('/network-info/interfaces/<iface>', methods=['GET'])
+def interface_info(iface):
+    """One interface, optionally only some fields (?fields=status,ip); collected on demand."""
+    try:
+        fields = interface_collector.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    record = get_interface_info(iface, fields)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Interface not found.'}), 404
+    return jsonify({"network_info": {iface: record}})
+
+@app.route('/network-info/stream', methods=['GET'])
+def network_info_stream():
+    """Push the full snapshot, then per-interface deltas as they happen."""
+    return Response(network_info_events.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Traffic counters of the physical interfaces, sampled every second by one worker
+counter_sampler = CounterSampler()
+
+@app.before_request
+def start_counter_sampler():
+    # Also started at worker boot by server.py; this covers other servers
+    counter_sampler.ensure_thread()
+
+def parse_time(value, now):
+    """Epoch seconds, or seconds before ``now`` when negative."""
+    value = int(value)
+    return now + value if value < 0 else value
+
+# API endpoint with the latest per-second traffic rates of every physical interface
+@app.route('/network-stats', methods=['GET'])
+def network_stats():
+    return jsonify({'network_stats': counter_sampler.latest()})
+
+@app.route('/network-stats/<iface>', methods=['GET'])
+def interface_stats(iface):
+    """Per-second rates for ?from=&to=&step= (epoch seconds, or negative for relative to now)."""
+    now = int(time.time())
+    try:
+        start = parse_time(request.args.get('from', -300), now)
+        end = parse_time(request.args.get('to', now), now)
+        step = request.args.get('step')
+        series = counter_sampler.series(iface, start, end, int(step) if step else None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if series is None:
+        return jsonify({'status': 'error', 'message': 'Interface not found.'}), 404
+    return jsonify(series)
+
+# Routes and rules of every table, updated from route events
+route_table = RouteTable()
+
+# API endpoint listing the routes of all tables (?family=inet|inet6, ?table=main|local|<number>) and the rules
+@app.route('/routes', methods=['GET'])
+def routes():
+    try:
+        family = parse_family(request.args['family']) if 'family' in request.args else None
+        table = parse_table(request.args['table']) if 'table' in request.args else None
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(route_table.listing(family, table))
+
+def parse_lookup(args, body):
+    """Destinations and source of a lookup: ?dst=a,b&dst=c&src=, or a JSON {"dst": [...], "src": ...} body."""
+    if body is not None:
+        if not isinstance(body, dict) or not isinstance(body.get('dst'), list):
+            raise ValueError('Expected a JSON object with a "dst" list.')
+        destinations, src = body['dst'], body.get('src')
+    else:
+        destinations = [dst for value in args.getlist('dst') for dst in value.split(',') if dst.strip()]
+        src = args.get('src')
+    if not destinations:
+        raise ValueError('Give at least one destination (dst).')
+    if len(destinations) > MAX_LOOKUPS:
+        raise ValueError(f"At most {MAX_LOOKUPS} destinations per lookup.")
+    return destinations, src
+
+# API endpoint answering which route, interface, gateway and source each destination would use
+@app.route('/routes/lookup', methods=['GET', 'POST'])
+def routes_lookup():
+    try:
+        destinations, src = parse_lookup(request.args, request.get_json(silent=True) if request.method == 'POST' else None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    results = route_table.lookup(destinations, src)
+    return jsonify({'version': route_table.version, 'results': results})
+
+class NetworkConfigError(ValueError):
+    """Raised for an interface configuration that cannot be applied."""
+
+def merge_interface_config(interface_settings, data):
+    """
+    Merge one interface's settings from a request payload into netplan.
+
+    ``interface_settings`` maps the interface name to its mutable netplan
+    settings; it is only called once the payload has been validated, so an
+    invalid payload raises NetworkConfigError without touching anything.
     """
-    data = request.json
     interface = data.get('interface')
     ip = data.get('ip')
     subnet = data.get('subnet')
@@ -147,72 +352,268 @@ def update_network():
     dns_servers = data.get('dns', None)
     dhcp_enabled = data.get('dhcp', None)
 
-    try:
-        # Find the first Netplan configuration file
-        netplan_files = glob.glob('/etc/netplan/*.yaml')
-        if not netplan_files:
-            return jsonify({'status': 'error', 'message': 'No Netplan configuration files found.'}), 400
-
-        netplan_config_path = netplan_files[0]
-        with open(netplan_config_path, 'r') as f:
-            config = yaml.safe_load(f)
-
-        # Ensure the 'ethernets' key exists
-        config.setdefault('network', {}).setdefault('ethernets', {})
-        interface_config = config['network']['ethernets'].setdefault(interface, {})
-
-        if dhcp_enabled:
-            # Enable DHCP and clear static configurations
-            interface_config['dhcp4'] = True
-            interface_config['dhcp6'] = True
-            interface_config.pop('addresses', None)
+    if not interface:
+        raise NetworkConfigError('Interface name is required.')
+
+    if not dhcp_enabled:
+        # Validate IP address and subnet when DHCP is disabled
+        if not ip or not subnet:
+            raise NetworkConfigError('IP address and subnet are required when DHCP is disabled.')
+
+        # Handle subnet mask and CIDR notation
+        if '/' in subnet:
+            cidr = subnet.split('/')[1]
+        elif subnet.count('.') == 3:
+            cidr = subnet_to_cidr(subnet)
+        elif subnet.isdigit() and 0 <= int(subnet) <= 32:
+            cidr = subnet
+        else:
+            raise NetworkConfigError('Invalid subnet format.')
+
+    interface_config = interface_settings(interface)
+
+    if dhcp_enabled:
+        # Enable DHCP and clear static configurations
+        interface_config['dhcp4'] = True
+        interface_config['dhcp6'] = True
+        interface_config.pop('addresses', None)
+        interface_config.pop('nameservers', None)
+        interface_config.pop('routes', None)
+    else:
+        # Update static IP configuration
+        interface_config['dhcp4'] = False
+        interface_config['dhcp6'] = False
+        interface_config['addresses'] = [f"{ip}/{cidr}"]
+
+        # Handle DNS configuration
+        if dns_servers:
+            interface_config['nameservers'] = {'addresses': dns_servers}
+        else:
             interface_config.pop('nameservers', None)
-            interface_config.pop('routes', None)
+
+        # Handle Gateway configuration
+        if gateway:
+            interface_config['routes'] = [{'to': '0.0.0.0/0', 'via': gateway, 'metric': 100}]
         else:
-            # Validate IP address and subnet when DHCP is disabled
-            if not ip or not subnet:
-                return jsonify({'status': 'error', 'message': 'IP address and subnet are required when DHCP is disabled.'}), 400
-
-            # Handle subnet mask and CIDR notation
-            if '/' in subnet:
-                cidr = subnet.split('/')[1]
-            elif subnet.count('.') == 3:
-                cidr = subnet_to_cidr(subnet)
-            elif subnet.isdigit() and 0 <= int(subnet) <= 32:
-                cidr = subnet
-            else:
-                return jsonify({'status': 'error', 'message': 'Invalid subnet format.'}), 400
-
-            # Update static IP configuration
-            interface_config['dhcp4'] = False
-            interface_config['dhcp6'] = False
-            interface_config['addresses'] = [f"{ip}/{cidr}"]
-
-            # Handle DNS configuration
-            if dns_servers:
-                interface_config['nameservers'] = {'addresses': dns_servers}
-            else:
-                interface_config.pop('nameservers', None)
-
-            # Handle Gateway configuration
-            if gateway:
-                interface_config['routes'] = [{'to': '0.0.0.0/0', 'via': gateway, 'metric': 100}]
-            else:
-                interface_config.pop('routes', None)
-
-        # Write back the updated configuration
-        with open(netplan_config_path, 'w') as f:
-            yaml.dump(config, f)
-
-        # Apply the changes using Netplan
-        subprocess.run(['sudo', 'netplan', 'apply'], check=True)
-
-        # Bring up the interface if it's down
-        subprocess.run(['sudo', 'ip', 'link', 'set', interface, 'up'], check=False)
-
-        return jsonify({'status': 'success', 'message': 'Network configuration updated and saved permanently!'})
+            interface_config.pop('routes', None)
+
+def write_and_apply_netplan(edit, interfaces):
+    """Write the changed netplan files once, run a single netplan apply and bring the interfaces up."""
+    edit.write()
+
+    # Apply the changes using Netplan
+    command_runner.run(['sudo', 'netplan', 'apply'], timeout=NETPLAN_APPLY_TIMEOUT, check=True)
+
+    # Bring up the interfaces if they're down
+    for interface in interfaces:
+        command_runner.run(['sudo', 'ip', 'link', 'set', interface, 'up'], timeout=READ_TIMEOUT)
+
+def write_and_apply_narrow(edit, changes):
+    """
+    Apply address/route/DNS-only changes without a global netplan apply.
+
+    The rendered networkd files are regenerated, the address and route
+    delta is programmed over netlink and `networkctl reload` reconfigures
+    only the links whose .network files changed.  Raises NotNarrow (before
+    writing anything) if an interface is not present in the kernel.
+    """
+    before = edit.base['network']['ethernets']
+    after = edit.merged()['network']['ethernets']
+    requests, deletions = [], []
+    for interface in changes:
+        try:
+            index = socket.if_nametoindex(interface)
+        except OSError:
+            raise NotNarrow(f"{interface} is not present")
+        interface_requests, interface_deletions = netlink_delta(index, before[interface], after[interface])
+        requests.extend(interface_requests)
+        deletions.extend(interface_deletions)
+
+    edit.write()
+    command_runner.run(['sudo', 'netplan', 'generate'], timeout=NETPLAN_GENERATE_TIMEOUT, check=True)
+    with netlink.NetlinkSocket() as nl:
+        errors = nl.execute(requests)
+    for error, deletion in zip(errors, deletions):
+        # Deleting something that is already gone is fine
+        if error and not (deletion and error in (errno.ENOENT, errno.ESRCH, errno.EADDRNOTAVAIL)):
+            raise OSError(error, f"Netlink update failed: {os.strerror(error)}")
+    command_runner.run(['sudo', 'networkctl', 'reload'], timeout=NETPLAN_GENERATE_TIMEOUT, check=True)
+
+def apply_netplan_changes(edit, interfaces):
+    """
+    Write and apply an edit through the least disruptive path.
+
+    Returns {'path': noop|narrow|full, 'seconds': ..., 'changes': {...}}.
+    """
+    start = time.monotonic()
+    path, changes = plan_apply(edit.base, edit.merged())
+    if path == NARROW:
+        try:
+            write_and_apply_narrow(edit, changes)
+        except Exception as e:
+            # The YAML may already be written; a full apply converges on it
+            print(f"Narrow apply failed, running a full netplan apply: {e}")
+            metrics.observe_apply(NARROW, time.monotonic() - start, failed=True)
+            path = FULL
+            start = time.monotonic()
+    if path == FULL:
+        try:
+            write_and_apply_netplan(edit, interfaces)
+        except Exception:
+            metrics.observe_apply(FULL, time.monotonic() - start, failed=True)
+            raise
+    if path != NOOP:
+        command_runner.clear_cache()
+        network_info_cache.invalidate()
+    seconds = time.monotonic() - start
+    metrics.observe_apply(path, seconds)
+    return {'path': path, 'seconds': round(seconds, 3), 'changes': changes}
+
+def apply_jobs(jobs):
+    """
+    Merge every queued job into the netplan config and apply them together.
+
+    A job whose interfaces cannot be merged fails on its own; the others
+    still go out in the single write and apply.
+    """
+    edit = netplan_model.edit()
+    if not edit.paths:
+        raise NetworkConfigError('No Netplan configuration files found.')
+    outcomes = {}
+    applied = []
+    interfaces = []
+    for job in jobs:
+        checkpoint = edit.checkpoint()
+        results = []
+        for item in job['payload']['interfaces']:
+            try:
+                merge_interface_config(edit.interface_config, item)
+                results.append({'interface': item.get('interface'), 'status': 'success'})
+            except NetworkConfigError as e:
+                results.append({'interface': item.get('interface'), 'status': 'error', 'message': str(e)})
+        if any(result['status'] == 'error' for result in results):
+            edit.rollback(checkpoint)
+            outcomes[job['id']] = ('failed', 'Invalid interface configuration; job was not applied.', results)
+            continue
+        applied.append((job, results))
+        interfaces.extend(result['interface'] for result in results)
+
+    if not applied:
+        return outcomes
+    try:
+        apply = apply_netplan_changes(edit, list(dict.fromkeys(interfaces)))
+    except Exception as e:
+        for job, results in applied:
+            outcomes[job['id']] = ('failed', str(e), results)
+        return outcomes
+    message = ('Network configuration already up to date; nothing was applied.' if apply['path'] == NOOP
+               else 'Network configuration updated and saved permanently!')
+    for job, results in applied:
+        outcomes[job['id']] = ('done', message, results, {'apply': apply})
+    return outcomes
+
+# Edits queued within the debounce window share one netplan write and apply
+apply_scheduler = ApplyScheduler(apply_jobs)
+
+def validate_interface_configs(items):
+    """Return per-interface results for a list of payloads, checking them without any file access."""
+    results = []
+    seen = set()
+    for item in items:
+        interface = item.get('interface')
+        try:
+            if interface in seen:
+                raise NetworkConfigError('Interface appears more than once in this batch.')
+            merge_interface_config(lambda interface: {}, item)
+            results.append({'interface': interface, 'status': 'success'})
+        except NetworkConfigError as e:
+            results.append({'interface': interface, 'status': 'error', 'message': str(e)})
+        seen.add(interface)
+    return results
+
+def check_batch(data):
+    """
+    Validate an /update-network/batch body.
+
+    Returns (interface payloads, None), or (None, error body) when the body
+    is malformed or any interface is invalid.
+    """
+    if isinstance(data, dict):
+        data = data.get('interfaces')
+    if not isinstance(data, list) or not data or not all(isinstance(item, dict) for item in data):
+        return None, {'status': 'error', 'message': 'Expected a non-empty list of interface configurations.'}
+
+    results = validate_interface_configs(data)
+    if any(result['status'] == 'error' for result in results):
+        for result in results:
+            if result['status'] == 'success':
+                result.update(status='skipped', message='Not applied because another interface in the batch is invalid.')
+        return None, {'status': 'error', 'message': 'Invalid interface configuration; nothing was applied.',
+                      'results': results}
+    return data, None
+
+def queued_response(job, message):
+    return jsonify({'status': 'queued', 'message': message, 'job_id': job['id'],
+                    'job_url': f"/jobs/{job['id']}"}), 202
+
+@app.route('/update-network', methods=['POST'])
+def update_network():
+    """
+    Queues a network configuration update for a given interface based on the
+    provided JSON payload and returns the job id to follow it with.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected an interface configuration object.'}), 400
+
+    result = validate_interface_configs([data])[0]
+    if result['status'] == 'error':
+        return jsonify({'status': 'error', 'message': result['message']}), 400
+
+    try:
+        job = apply_scheduler.submit('update', {'interfaces': [data]})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    return queued_response(job, 'Network configuration update queued.')
+
+@app.route('/update-network/batch', methods=['POST'])
+def update_network_batch():
+    """
+    Queues several interface updates as one job.
+
+    Takes a list of /update-network payloads (or {"interfaces": [...]}).
+    Every entry is validated first; if any is invalid nothing is queued.
+    """
+    data, error = check_batch(request.get_json(silent=True))
+    if error is not None:
+        return jsonify(error), 400
+
+    try:
+        job = apply_scheduler.submit('batch', {'interfaces': data})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return queued_response(job, f'{len(data)} interface configurations queued.')
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a queued update: queued, applying, done or failed, with timings."""
+    job = apply_scheduler.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    return jsonify(public_job(job))
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Push a status event on every state change until the job finishes."""
+    if apply_scheduler.get(job_id) is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    return Response(apply_scheduler.stream(job_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# API endpoint reporting this worker's command counters and latency histograms
+@app.route('/commands/stats', methods=['GET'])
+def command_stats():
+    return jsonify(command_runner.stats())
 
 def check_os_version():
     """Check the OS version and return it."""
@@ -269,7 +670,7 @@ network:
         print(f"Created new Netplan configuration: {new_netplan_config_path}")
         
         # Apply the new configuration using Netplan
-        subprocess.run(['sudo', 'netplan', 'apply'], check=True)
+        command_runner.run(['sudo', 'netplan', 'apply'], timeout=NETPLAN_APPLY_TIMEOUT, check=True)
         print("Network configuration applied successfully.")
         
         # Create the marker file to indicate setup completion
@@ -292,12 +693,19 @@ if __name__ == "__main__":
     else:
         print(f"OS version {os_version} is not explicitly handled. Proceeding with default logic.")
 
+    # Counters start from zero with the new workers
+    metrics.reset('network-configuration')
+    shared_snapshot.reset('network-info')
+
     script_filename = os.path.basename(__file__).replace('.py', '')
     app_module = f"{script_filename}:app"
 
     subprocess.run([
         'gunicorn',
         '-w', '4',          # Number of worker processes
+        '-k', 'gthread',    # Threaded workers so open event streams don't pin a whole worker
+        '--threads', '16',
+        '--keep-alive', '30', # Keep idle connections (fleet aggregator polls) open between polls
         '-b', '0.0.0.0:5001', # Bind to 0.0.0.0:5001
         app_module           # Pass the module name dynamically
     ])
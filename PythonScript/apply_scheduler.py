@@ -0,0 +1,205 @@
+"""
+Coalescing, asynchronous netplan apply scheduler.
+
+Requests enqueue a job and return at once; the job is a small JSON file in
+``JOB_DIR`` so every gunicorn worker can report on it.  Each worker runs a
+scheduler thread, but only the one holding ``APPLY_LOCK`` acts: it waits for
+a short debounce window after the newest queued job, then hands every
+pending job to ``apply`` in one go, so a burst of edits costs a single
+netplan write and apply.  If the leading worker dies its lock is released
+and another worker's thread takes over.
+
+Job states: queued -> applying -> done | failed.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+from snapshot_stream import KEEPALIVE_SECONDS, format_event
+
+JOB_DIR = '/run/network-configuration/jobs'
+APPLY_LOCK = '/run/network-configuration/apply.lock'
+# Quiet period after the newest queued job before applying
+DEBOUNCE_SECONDS = 0.5
+# Upper bound on how long a steady stream of edits can postpone an apply
+MAX_DELAY_SECONDS = 3.0
+POLL_SECONDS = 0.1
+# Finished jobs are kept this long for status queries
+JOB_RETENTION_SECONDS = 3600
+
+TERMINAL_STATES = ('done', 'failed')
+
+
+class ApplyScheduler:
+    def __init__(self, apply, job_dir=JOB_DIR, lock_path=APPLY_LOCK):
+        """
+        apply -- called with a list of queued jobs; returns {job_id: (status,
+                 message, results[, extra])} for the jobs it processed,
+                 where ``extra`` is a dict of fields added to the job.  It
+                 runs in the scheduler thread of whichever worker holds the
+                 lock.
+        """
+        self._apply = apply
+        self.job_dir = job_dir
+        self.lock_path = lock_path
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+
+    # -- job files --------------------------------------------------------
+
+    def _job_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _write_job(self, job):
+        os.makedirs(self.job_dir, exist_ok=True)
+        path = self._job_path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """Return the job record, or None for unknown (or expired) ids."""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._job_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _jobs(self):
+        jobs = []
+        try:
+            names = os.listdir(self.job_dir)
+        except FileNotFoundError:
+            return jobs
+        for name in names:
+            if name.endswith('.json'):
+                job = self.get(name[:-5])
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+    # -- API --------------------------------------------------------------
+
+    def submit(self, kind, payload):
+        """Queue a job and return its record; the apply happens in the background."""
+        self._ensure_thread()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'queued',
+            'payload': payload,
+            'queued_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'message': None,
+            'results': None,
+        }
+        self._write_job(job)
+        return job
+
+    def stream(self, job_id):
+        """Generator producing SSE ``status`` events for one job until it finishes."""
+        self._ensure_thread()
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                yield format_event('error', {'message': 'Job not found.'})
+                return
+            if job['status'] != last:
+                last = job['status']
+                last_sent = time.monotonic()
+                yield format_event('status', public_job(job))
+                if last in TERMINAL_STATES:
+                    return
+            elif time.monotonic() - last_sent > KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(POLL_SECONDS)
+
+    # -- scheduler --------------------------------------------------------
+
+    def _ensure_thread(self):
+        # Started lazily so each gunicorn worker gets its own candidate thread
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True, name='apply-scheduler').start()
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Blocks until this worker becomes the one that applies
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            print(f"Apply scheduler unavailable: {e}")
+            self._thread_pid = None
+            return
+        self._recover()
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                print(f"Apply scheduler error: {e}")
+            time.sleep(POLL_SECONDS)
+
+    def _recover(self):
+        """Fail jobs a previous leader left half-applied."""
+        for job in self._jobs():
+            if job['status'] == 'applying':
+                job.update(status='failed', finished_at=time.time(),
+                           message='The worker applying this job exited before it finished.')
+                self._write_job(job)
+
+    def _step(self):
+        now = time.time()
+        queued = []
+        for job in self._jobs():
+            if job['status'] == 'queued':
+                queued.append(job)
+            elif job['status'] in TERMINAL_STATES and now - job['finished_at'] > JOB_RETENTION_SECONDS:
+                try:
+                    os.unlink(self._job_path(job['id']))
+                except FileNotFoundError:
+                    pass
+        if not queued:
+            return
+        newest = max(job['queued_at'] for job in queued)
+        oldest = min(job['queued_at'] for job in queued)
+        if now - newest < DEBOUNCE_SECONDS and now - oldest < MAX_DELAY_SECONDS:
+            return
+
+        queued.sort(key=lambda job: job['queued_at'])
+        started = time.time()
+        for job in queued:
+            job.update(status='applying', started_at=started)
+            self._write_job(job)
+        try:
+            outcomes = self._apply(queued)
+        except Exception as e:
+            outcomes = {job['id']: ('failed', str(e), None) for job in queued}
+        finished = time.time()
+        for job in queued:
+            status, message, results, *extra = outcomes.get(job['id'], ('failed', 'Job was not processed.', None))
+            job.update(*extra, status=status, message=message, results=results, finished_at=finished,
+                       coalesced_jobs=len(queued))
+            self._write_job(job)
+
+
+def public_job(job):
+    """Job record as returned by the API, with derived timings."""
+    record = {key: value for key, value in job.items() if key != 'payload'}
+    if job['started_at'] is not None:
+        record['wait_seconds'] = round(job['started_at'] - job['queued_at'], 3)
+    if job['finished_at'] is not None and job['started_at'] is not None:
+        record['apply_seconds'] = round(job['finished_at'] - job['started_at'], 3)
+    return record
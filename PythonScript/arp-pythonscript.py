@@ -1,49 +1,45 @@
 import subprocess
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import os
 import sys
 
+import command_runner
+import metrics
+import shared_snapshot
+import request_timing
+from neighbor_index import QueryError, normalize_mac_prefix, parse_ip_prefix
+from neighbor_table import NeighborTable
+from representations import SnapshotRepresentations, columns
+from static_arp_store import StaticArpError, StaticArpStore, parse_csv, to_csv
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
+# Server-Timing on every response, cProfile on request from localhost
+request_timing.install(app)
 
-# Path to save the static ARP script
-ARP_FILE_PATH = '/etc/networkd-dispatcher/routable.d/setarp-static'
+# Static ARP entries, persisted and restored at boot by the dispatcher hook
+static_arp_store = StaticArpStore()
 
-# Get ARP table data
-def get_arp_data():
-    try:
-        result = subprocess.run(['arp', '-e'], capture_output=True, text=True, check=True)
-        arp_output = result.stdout
-        arp_entries = []
-        lines = arp_output.splitlines()
-
-        for line in lines[1:]:
-            columns = line.split()
-            if len(columns) >= 5:
-                ip = columns[0]
-                hw_type = columns[1]
-                mac = columns[2]
-                flags = columns[3]
-                iface = columns[4]
-
-                arp_entries.append({
-                    'ip': ip,
-                    'hw_type': hw_type,
-                    'mac': mac,
-                    'flags': flags,
-                    'iface': iface
-                })
-
-        return arp_entries
+# ARP table kept current by kernel neighbour events in one worker, which
+# publishes it to shared memory; the other workers serve the published body
+# and answer filtered and delta queries from a mirror of it
+neighbor_table = NeighborTable(share_as='arp')
+# JSON, columnar and msgpack bodies, optionally compressed, rendered once per version
+arp_representations = SnapshotRepresentations(columns)
 
-    except Exception as e:
-        return {'error': str(e)}
+def refresh_arp_metrics():
+    _version, entries = neighbor_table.entries()
+    metrics.set_arp_entries('neighbors', len(entries))
+    metrics.set_arp_entries('static', len(static_arp_store.entries()))
+
+# Prometheus /metrics, aggregated over the gunicorn workers
+metrics.install(app, 'arp', before_scrape=refresh_arp_metrics)
 
 # Get network interfaces
 def get_interfaces():
     try:
-        result = subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True, check=True)
+        result = command_runner.run(['ip', 'link', 'show'], timeout=5.0, check=True, cache_ttl=1.0)
         interfaces_output = result.stdout
         interfaces = []
         
@@ -58,74 +54,77 @@ def get_interfaces():
         return {'error': str(e)}
 
 # Add static ARP entry
-def add_static_arp(ip, mac):
+def add_static_arp(ip, mac, iface=None):
     try:
-        # Ensure the ARP script starts with the shebang
-        arp_entry = f"arp -s {ip} {mac}\n"
-        
-        if not os.path.exists(ARP_FILE_PATH):
-            # Create a new script with a proper header
-            with open(ARP_FILE_PATH, 'w') as file:
-                file.write(f"#!/bin/bash\n{arp_entry}")
-        else:
-            with open(ARP_FILE_PATH, 'r+') as file:
-                content = file.read()
-                if arp_entry not in content:
-                    file.write(arp_entry)
-
-        os.chmod(ARP_FILE_PATH, 0o755)  # Ensure the file is executable
-        
-        # Execute the script immediately
-        subprocess.run(['bash', ARP_FILE_PATH], check=True)
-
-        return {"message": "Static ARP entry added and script executed successfully"}
-    except subprocess.CalledProcessError as e:
-        return {"error": f"Command execution failed: {str(e)}"}
+        entry = static_arp_store.add(ip, mac, iface)
+        return {"message": "Static ARP entry added successfully", "entry": entry}
+    except StaticArpError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Failed to add ARP entry: {str(e)}"}
 
 # Delete static ARP entry
 def delete_static_arp(ip):
     try:
-        if not os.path.exists(ARP_FILE_PATH):
-            return {"error": "ARP file does not exist."}
-
-        with open(ARP_FILE_PATH, 'r') as file:
-            lines = file.readlines()
-
-        # Corrected the condition to ensure both IP and iface match
-        updated_lines = [
-            line for line in lines 
-            if not (line.startswith(f"arp -s {ip} "))
-        ]
-
-        if len(lines) == len(updated_lines):
+        if static_arp_store.delete(ip) is None:
             return {"error": "ARP entry not found."}
-
-        # Rewrite the file with the updated content
-        with open(ARP_FILE_PATH, 'w') as file:
-            file.writelines(updated_lines)
-
-        # Execute the command to delete the ARP entry from the system
-        delete_command = ['sudo', 'arp', '-d', ip]
-        subprocess.run(delete_command, check=True)
-
-        # Execute the script immediately to apply changes
-        subprocess.run(['bash', ARP_FILE_PATH], check=True)
-
         return {"message": "Static ARP entry deleted successfully and removed from system"}
-    except subprocess.CalledProcessError as e:
-        return {"error": f"Failed to execute command: {str(e)}"}
+    except StaticArpError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Failed to delete ARP entry: {str(e)}"}
 
+# Query parameters that switch /arp to the filtered, paged response
+ARP_QUERY_PARAMS = ('iface', 'flags', 'ip', 'mac', 'sort', 'limit', 'cursor')
+
+def parse_arp_query(args):
+    """Turn /arp query parameters into NeighborTable.query filters."""
+    limit = args.get('limit') or None
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise QueryError("limit must be an integer")
+    return {
+        'iface': args.get('iface') or None,
+        'flags': args.get('flags') or None,
+        'prefix': parse_ip_prefix(args['ip']) if args.get('ip') else None,
+        'mac': normalize_mac_prefix(args['mac']) if args.get('mac') else None,
+        'sort': args.get('sort', 'ip'),
+        'limit': limit,
+        'cursor': args.get('cursor') or None,
+    }
+
+def query_arp_table(args):
+    """Answer a filtered /arp request from the neighbour table indexes."""
+    try:
+        version, entries, next_cursor = neighbor_table.query(**parse_arp_query(args))
+    except (QueryError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'version': version, 'entries': entries, 'next_cursor': next_cursor})
+
 # API endpoint to get ARP table
 @app.route('/arp', methods=['GET'])
 def get_arp_table():
-    arp_data = get_arp_data()
-    if 'error' in arp_data:
-        return jsonify({'error': arp_data['error']}), 500
-    return jsonify(arp_data)
+    if any(param in request.args for param in ARP_QUERY_PARAMS):
+        return query_arp_table(request.args)
+    try:
+        snapshot = neighbor_table.snapshot()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return arp_representations.response(app.response_class, request, snapshot)
+
+# API endpoint to get ARP table changes since a version the client already has
+@app.route('/arp/changes', methods=['GET'])
+def get_arp_changes():
+    since = request.args.get('since', type=int)
+    epoch = request.args.get('epoch')
+    try:
+        return jsonify(neighbor_table.changes(since, epoch))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # API endpoint to get network interfaces
 @app.route('/interfaces', methods=['GET'])
@@ -135,15 +134,24 @@ def get_network_interfaces():
         return jsonify({'error': interfaces['error']}), 500
     return jsonify(interfaces)
 
+# API endpoint to list the persisted static ARP entries
+@app.route('/static', methods=['GET'])
+def get_static_arp_entries():
+    try:
+        return jsonify(static_arp_store.entries())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # API endpoint to add static ARP entry
 @app.route('/static', methods=['POST'])
 def add_static_arp_entry():
     data = request.get_json()
     ip = data.get('ip')
     mac = data.get('mac')
+    iface = data.get('iface')
 
     if ip and mac:
-        result = add_static_arp(ip, mac)
+        result = add_static_arp(ip, mac, iface)
         if 'error' in result:
             return jsonify(result), 500
         return jsonify(result)
@@ -162,12 +170,65 @@ def delete_static_arp_entry():
         return jsonify(result)
     return jsonify({"error": "Missing required data (ip)"}), 400
 
+def parse_bulk_request(mimetype, text, data, args):
+    """Return (rows, replace) for a /static/bulk body; raises ValueError if it is malformed."""
+    replace = args.get('replace', '').lower() in ('1', 'true', 'yes')
+    if mimetype in ('text/csv', 'text/plain'):
+        return parse_csv(text), replace
+    if isinstance(data, dict):
+        replace = replace or bool(data.get('replace'))
+        data = data.get('entries')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError("Expected a list of {ip, mac, iface} objects or a CSV body")
+    return data, replace
+
+def bulk_import(rows, replace):
+    results = static_arp_store.bulk_add(rows, replace=replace)
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return {"summary": summary, "results": results}
+
+# API endpoint to import many static ARP entries (JSON or CSV) in one write
+@app.route('/static/bulk', methods=['POST'])
+def bulk_static_arp_entries():
+    try:
+        rows, replace = parse_bulk_request(request.mimetype, request.get_data(as_text=True),
+                                           request.get_json(silent=True), request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return jsonify(bulk_import(rows, replace))
+    except Exception as e:
+        return jsonify({"error": f"Failed to import ARP entries: {str(e)}"}), 500
+
+# API endpoint to export the static ARP entries as JSON or CSV
+@app.route('/static/export', methods=['GET'])
+def export_static_arp_entries():
+    export_format = request.args.get('format', 'json')
+    try:
+        entries = static_arp_store.entries()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if export_format == 'csv':
+        return Response(to_csv(entries), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=static-arp.csv'})
+    if export_format != 'json':
+        return jsonify({'error': "format must be csv or json"}), 400
+    return jsonify(entries)
+
+# API endpoint reporting this worker's command counters and latency histograms
+@app.route('/commands/stats', methods=['GET'])
+def command_stats():
+    return jsonify(command_runner.stats())
+
 if __name__ == '__main__':
-    # Ensure the ARP file has the shebang and is executable
-    if not os.path.exists(ARP_FILE_PATH):
-        with open(ARP_FILE_PATH, 'w') as file:
-            file.write("#!/bin/bash\n")
-    os.chmod(ARP_FILE_PATH, 0o755)
+    # Migrate any legacy `arp -s` script and install the batched restore hook
+    static_arp_store.entries()
+    static_arp_store.install_hook()
+    # Counters start from zero with the new workers
+    metrics.reset('arp')
+    shared_snapshot.reset('arp')
 
     # Get the current filename dynamically
     current_file = os.path.basename(__file__)  # Get the filename of the current script
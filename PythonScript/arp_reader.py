@@ -0,0 +1,177 @@
+"""
+Fork-free ARP table reader.
+
+Reads the IPv4 neighbour table with an rtnetlink RTM_GETNEIGH dump and falls
+back to ``/proc/net/arp`` when netlink is not usable.  Records keep the
+``ip/hw_type/mac/flags/iface`` shape that ``arp -e`` parsing produced, plus
+the kernel NUD ``state``; net-tools is not needed.
+"""
+import socket
+
+import netlink
+
+PROC_NET_ARP = '/proc/net/arp'
+
+# ARPHRD_* values (linux/if_arp.h) as net-tools names them
+HW_TYPES = {
+    1: 'ether',
+    24: 'ieee1394',
+    32: 'infiniband',
+    768: 'ipip',
+    772: 'loopback',
+    776: 'sit',
+    778: 'gre',
+}
+
+# States `arp -e` lists; INCOMPLETE/FAILED/NONE entries had no hardware
+# address column and NOARP ones are hidden by the kernel's ARP listing.
+_VISIBLE_STATES = (netlink.NUD_REACHABLE | netlink.NUD_STALE | netlink.NUD_DELAY
+                   | netlink.NUD_PROBE | netlink.NUD_PERMANENT)
+
+# /proc/net/arp flag bits (linux/if_arp.h)
+ATF_COM = 0x02
+ATF_PERM = 0x04
+
+
+def arp_flags(state):
+    """net-tools flag column: C = complete, M = permanent."""
+    return 'CM' if state & netlink.NUD_PERMANENT else 'C'
+
+
+# state -> (flags column, state name), precomputed for the decode loop
+_STATE_COLUMNS = {state: (arp_flags(state), name) for state, name in netlink.NUD_STATES.items()}
+
+
+def link_names(links):
+    """Map ifindex -> (ifname, hw_type) from decoded RTM_NEWLINK messages."""
+    return {link['index']: (link['ifname'], HW_TYPES.get(link['type'], str(link['type']))) for link in links}
+
+
+def neighbor_entry(neigh, names):
+    """Build the ARP record for a decoded neighbour, or None if arp would hide it."""
+    state = neigh['state']
+    if (neigh['family'] != socket.AF_INET or not state & _VISIBLE_STATES
+            or neigh['flags'] & netlink.NTF_PROXY or not neigh['lladdr']):
+        return None
+    iface, hw_type = names.get(neigh['index']) or (str(neigh['index']), 'ether')
+    return {
+        'ip': neigh['dst'],
+        'hw_type': hw_type,
+        'mac': neigh['lladdr'],
+        'flags': arp_flags(state),
+        'iface': iface,
+        'state': netlink.NUD_STATES.get(state, 'UNKNOWN'),
+    }
+
+
+def build_arp_entries(neighbors, links):
+    """Turn decoded RTM_NEWNEIGH messages into ARP table records."""
+    names = link_names(links)
+    entries = []
+    for neigh in neighbors:
+        entry = neighbor_entry(neigh, names)
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
+
+def decode_neigh_datagram(data, seq, names, entries):
+    """
+    Append the ARP records found in one RTM_NEWNEIGH dump datagram.
+
+    This is the hot loop for tables with tens of thousands of neighbours, so
+    it walks the buffer once instead of going through the generic decoders.
+    Returns True once the NLMSG_DONE marker for ``seq`` has been seen.
+    """
+    unpack_header = netlink.NLMSGHDR.unpack_from
+    unpack_ndmsg = netlink.NDMSG.unpack_from
+    unpack_attr = netlink.RTATTR.unpack_from
+    inet_ntoa = socket.inet_ntoa
+    header_size = netlink.NLMSGHDR.size
+    body_offset = header_size + netlink.NDMSG.size
+    af_inet = socket.AF_INET
+    visible = _VISIBLE_STATES
+    proxy = netlink.NTF_PROXY
+    states = _STATE_COLUMNS
+    append = entries.append
+    offset = 0
+    end = len(data)
+    while offset + header_size <= end:
+        length, msg_type, _flags, msg_seq, _pid = unpack_header(data, offset)
+        if length < header_size:
+            break
+        if msg_seq == seq:
+            if msg_type == netlink.RTM_NEWNEIGH:
+                family, index, state, flags, _type = unpack_ndmsg(data, offset + header_size)
+                if family == af_inet and state & visible and not flags & proxy:
+                    ip = mac = None
+                    pos = offset + body_offset
+                    stop = offset + length
+                    # The kernel emits NDA_DST and NDA_LLADDR first, so stop
+                    # as soon as both are known.
+                    while pos + 4 <= stop and (ip is None or mac is None):
+                        attr_len, attr_type = unpack_attr(data, pos)
+                        if attr_len < 4:
+                            break
+                        if attr_type == 1:  # NDA_DST
+                            ip = inet_ntoa(data[pos + 4:pos + 8])
+                        elif attr_type == 2:  # NDA_LLADDR
+                            mac = data[pos + 4:pos + attr_len].hex(':')
+                        pos += (attr_len + 3) & ~3
+                    if ip and mac:
+                        iface, hw_type = names.get(index) or (str(index), 'ether')
+                        arp_flag, state_name = states.get(state) or (arp_flags(state), 'UNKNOWN')
+                        append({'ip': ip, 'hw_type': hw_type, 'mac': mac, 'flags': arp_flag,
+                                'iface': iface, 'state': state_name})
+            elif msg_type == netlink.NLMSG_DONE:
+                return True
+            elif msg_type == netlink.NLMSG_ERROR:
+                netlink.check_error(data[offset + header_size:offset + length])
+        offset += (length + 3) & ~3
+    return False
+
+
+def read_neighbors_netlink():
+    with netlink.NetlinkSocket() as nl:
+        names = link_names(nl.dump_parsed(netlink.RTM_GETLINK))
+        seq = nl.request_dump(netlink.RTM_GETNEIGH, socket.AF_INET)
+        entries = []
+        while not decode_neigh_datagram(nl.recv_raw(), seq, names, entries):
+            pass
+    return entries
+
+
+def parse_proc_net_arp(text):
+    """Parse /proc/net/arp; the kernel does not expose NUD states there."""
+    entries = []
+    for line in text.splitlines()[1:]:
+        columns = line.split()
+        if len(columns) < 6:
+            continue
+        flags = int(columns[2], 16)
+        if not flags & ATF_COM:
+            continue
+        hw_type = int(columns[1], 16)
+        entries.append({
+            'ip': columns[0],
+            'hw_type': HW_TYPES.get(hw_type, str(hw_type)),
+            'mac': columns[3],
+            'flags': 'CM' if flags & ATF_PERM else 'C',
+            'iface': columns[5],
+            'state': 'PERMANENT' if flags & ATF_PERM else 'UNKNOWN',
+        })
+    return entries
+
+
+def read_neighbors_proc():
+    with open(PROC_NET_ARP) as f:
+        return parse_proc_net_arp(f.read())
+
+
+def read_neighbors():
+    """Return the ARP table, preferring netlink over /proc/net/arp."""
+    try:
+        return read_neighbors_netlink()
+    except OSError as e:
+        print(f"Netlink neighbour dump failed, reading {PROC_NET_ARP}: {e}")
+        return read_neighbors_proc()
@@ -0,0 +1,383 @@
+"""
+Asyncio (ASGI) variant of both backends in a single process.
+
+Serves the /network-info, /update-network, /jobs, /arp, /interfaces and
+/static endpoints of Network-configuration.py and arp-pythonscript.py from
+one Quart app, reusing their stores, caches and validation.  Collectors run
+concurrently on the event loop: external commands as asyncio subprocesses
+and netlink/file work on a bounded thread pool, all under the per-call
+timeouts and global concurrency cap of ``async_runner``.  Hundreds of idle
+pollers and streams only cost coroutines, not workers.
+
+Quart and Hypercorn are optional dependencies of this variant:
+
+    pip install quart hypercorn
+    python3 asgi_app.py                # listens on 5001 and 5002
+"""
+import asyncio
+import importlib
+import queue
+import time
+
+from quart import Quart, jsonify, make_response, request
+
+import interface_collector
+import netlink
+import networkd_state
+from apply_scheduler import POLL_SECONDS, TERMINAL_STATES, public_job
+from async_runner import CallTimeout, run_blocking, run_command
+from snapshot_cache import SnapshotCache
+from snapshot_stream import KEEPALIVE_SECONDS, SnapshotBroadcaster, format_event
+
+network_configuration = importlib.import_module('Network-configuration')
+arp_backend = importlib.import_module('arp-pythonscript')
+
+# Per-call timeouts (seconds)
+RESOLVECTL_TIMEOUT = 3.0
+NETLINK_TIMEOUT = 5.0
+LEGACY_COLLECTOR_TIMEOUT = 30.0
+BULK_IMPORT_TIMEOUT = 30.0
+# How often an idle stream checks its queue
+STREAM_POLL_SECONDS = 0.25
+
+app = Quart(__name__)
+
+_loop = None
+
+
+async def get_dns_for_all_interfaces():
+    try:
+        _returncode, stdout, _stderr = await run_command(['resolvectl', 'status'], timeout=RESOLVECTL_TIMEOUT)
+        return interface_collector.parse_resolvectl_status(stdout)
+    except (OSError, CallTimeout) as e:
+        print(f"Error fetching DNS information: {e}")
+        return {}
+
+
+async def collect_network_info():
+    """
+    Netlink dump and resolvectl run concurrently; resolvectl only where networkd
+    keeps no state files.  Netplan details come from the shared model.
+    """
+    try:
+        # Reads the state files when they changed, so not on the loop
+        managed = await run_blocking(networkd_state.state.links, timeout=NETLINK_TIMEOUT) is not None
+    except (OSError, CallTimeout) as e:
+        print(f"Error reading networkd state: {e}")
+        managed = False
+    state, dns = await asyncio.gather(
+        run_blocking(netlink.dump_state, timeout=NETLINK_TIMEOUT),
+        asyncio.sleep(0, {}) if managed else get_dns_for_all_interfaces(),
+        return_exceptions=True,
+    )
+    if isinstance(dns, BaseException):
+        dns = {}
+    if isinstance(state, OSError):
+        print(f"Netlink collector unavailable, falling back to subprocesses: {state}")
+        interfaces = await run_blocking(network_configuration.get_available_interfaces_subprocess,
+                                        timeout=LEGACY_COLLECTOR_TIMEOUT)
+    elif isinstance(state, BaseException):
+        raise state
+    else:
+        links, addrs, routes = state
+        resolved = dns
+        dns, leases = await run_blocking(interface_collector.get_dns_and_leases, links, lambda: resolved,
+                                         timeout=NETLINK_TIMEOUT)
+        interfaces = interface_collector.build_network_info(links, addrs, routes, dns, leases)
+    interfaces = await run_blocking(network_configuration.enrich_with_netplan, interfaces)
+    return {"network_info": interfaces}
+
+
+def build_network_info_snapshot():
+    # SnapshotCache builds on a worker thread; the collector itself runs on the loop
+    return asyncio.run_coroutine_threadsafe(collect_network_info(), _loop).result()
+
+
+network_info_cache = SnapshotCache(build_network_info_snapshot, watch_globs=['/etc/netplan/*.yaml'])
+networkd_state.state.subscribe(network_info_cache.invalidate)
+network_info_events = SnapshotBroadcaster(network_info_cache, lambda data: data["network_info"])
+# Applies started from this process invalidate the cache served here
+network_configuration.network_info_cache = network_info_cache
+
+
+async def off_loop(fn, *args):
+    """Run a call that may wait on other requests (cache rebuilds) without taking a runner slot."""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+@app.before_serving
+async def remember_loop():
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+@app.after_request
+async def allow_any_origin(response):
+    # Same policy as the Flask apps' CORS(app, resources={r"/*": {"origins": "*"}})
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
+    return response
+
+
+def event_stream_response(events):
+    headers = {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return make_response(events, 200, headers)
+
+
+# -- Network-configuration.py endpoints ------------------------------------
+
+@app.route('/network-info', methods=['GET'])
+async def network_info():
+    fields = None
+    if 'fields' in request.args:
+        try:
+            fields = interface_collector.parse_fields(request.args['fields'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+    snapshot = await off_loop(network_info_cache.get)
+    if fields is not None:
+        return jsonify({"network_info": {iface: network_configuration.select_fields(record, fields)
+                                         for iface, record in snapshot.data["network_info"].items()}})
+    return network_configuration.network_info_representations.response(app.response_class, request, snapshot)
+
+
+@app.route('/network-info/<iface>', methods=['GET'])
+@app.route('/network-info/interfaces/<iface>', methods=['GET'])
+async def interface_info(iface):
+    try:
+        fields = interface_collector.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    record = await run_blocking(network_configuration.get_interface_info, iface, fields, timeout=NETLINK_TIMEOUT)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Interface not found.'}), 404
+    return jsonify({"network_info": {iface: record}})
+
+
+@app.route('/routes', methods=['GET'])
+async def routes():
+    try:
+        family = network_configuration.parse_family(request.args['family']) if 'family' in request.args else None
+        table = network_configuration.parse_table(request.args['table']) if 'table' in request.args else None
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(await run_blocking(network_configuration.route_table.listing, family, table))
+
+
+@app.route('/routes/lookup', methods=['GET', 'POST'])
+async def routes_lookup():
+    body = await request.get_json(silent=True) if request.method == 'POST' else None
+    try:
+        destinations, src = network_configuration.parse_lookup(request.args, body)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    results = await run_blocking(network_configuration.route_table.lookup, destinations, src)
+    return jsonify({'version': network_configuration.route_table.version, 'results': results})
+
+
+@app.route('/network-info/stream', methods=['GET'])
+async def network_info_stream():
+    """Push the full snapshot, then per-interface deltas as they happen."""
+    subscription, initial = await off_loop(network_info_events.subscribe)
+
+    async def events():
+        try:
+            yield initial.encode()
+            idle_since = time.monotonic()
+            while not subscription.overflowed:
+                try:
+                    event = subscription.events.get_nowait()
+                except queue.Empty:
+                    if time.monotonic() - idle_since > KEEPALIVE_SECONDS:
+                        idle_since = time.monotonic()
+                        yield b": keepalive\n\n"
+                    await asyncio.sleep(STREAM_POLL_SECONDS)
+                    continue
+                idle_since = time.monotonic()
+                yield event.encode()
+        finally:
+            network_info_events.unsubscribe(subscription)
+
+    response = await event_stream_response(events())
+    response.timeout = None
+    return response
+
+
+async def queue_job(kind, interfaces, message):
+    try:
+        job = await run_blocking(network_configuration.apply_scheduler.submit, kind, {'interfaces': interfaces})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'queued', 'message': message, 'job_id': job['id'],
+                    'job_url': f"/jobs/{job['id']}"}), 202
+
+
+@app.route('/update-network', methods=['POST'])
+async def update_network():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected an interface configuration object.'}), 400
+    result = network_configuration.validate_interface_configs([data])[0]
+    if result['status'] == 'error':
+        return jsonify({'status': 'error', 'message': result['message']}), 400
+    return await queue_job('update', [data], 'Network configuration update queued.')
+
+
+@app.route('/update-network/batch', methods=['POST'])
+async def update_network_batch():
+    data, error = network_configuration.check_batch(await request.get_json(silent=True))
+    if error is not None:
+        return jsonify(error), 400
+    return await queue_job('batch', data, f'{len(data)} interface configurations queued.')
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    job = await run_blocking(network_configuration.apply_scheduler.get, job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    return jsonify(public_job(job))
+
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+async def stream_job(job_id):
+    scheduler = network_configuration.apply_scheduler
+    if await run_blocking(scheduler.get, job_id) is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+
+    async def events():
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            job = await run_blocking(scheduler.get, job_id)
+            if job is None:
+                return
+            if job['status'] != last:
+                last = job['status']
+                last_sent = time.monotonic()
+                yield format_event('status', public_job(job)).encode()
+                if last in TERMINAL_STATES:
+                    return
+            elif time.monotonic() - last_sent > KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield b": keepalive\n\n"
+            await asyncio.sleep(POLL_SECONDS)
+
+    response = await event_stream_response(events())
+    response.timeout = None
+    return response
+
+
+# -- arp-pythonscript.py endpoints -----------------------------------------
+
+@app.route('/arp', methods=['GET'])
+async def get_arp_table():
+    if any(param in request.args for param in arp_backend.ARP_QUERY_PARAMS):
+        try:
+            filters = arp_backend.parse_arp_query(request.args)
+            version, entries, next_cursor = await run_blocking(
+                lambda: arp_backend.neighbor_table.query(**filters))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        return jsonify({'version': version, 'entries': entries, 'next_cursor': next_cursor})
+    try:
+        snapshot = await off_loop(arp_backend.neighbor_table.snapshot)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return arp_backend.arp_representations.response(app.response_class, request, snapshot)
+
+
+@app.route('/arp/changes', methods=['GET'])
+async def get_arp_changes():
+    since = request.args.get('since', type=int)
+    epoch = request.args.get('epoch')
+    try:
+        return jsonify(await run_blocking(arp_backend.neighbor_table.changes, since, epoch))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/interfaces', methods=['GET'])
+async def get_network_interfaces():
+    try:
+        links = await run_blocking(netlink.dump_links, timeout=NETLINK_TIMEOUT)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify([link['ifname'] for link in links])
+
+
+@app.route('/static', methods=['GET'])
+async def get_static_arp_entries():
+    try:
+        return jsonify(await run_blocking(arp_backend.static_arp_store.entries))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/static', methods=['POST'])
+async def add_static_arp_entry():
+    data = await request.get_json()
+    ip = data.get('ip')
+    mac = data.get('mac')
+    iface = data.get('iface')
+
+    if ip and mac:
+        result = await run_blocking(arp_backend.add_static_arp, ip, mac, iface)
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(result)
+    return jsonify({"error": "Missing required data (ip, mac)"}), 400
+
+
+@app.route('/static', methods=['DELETE'])
+async def delete_static_arp_entry():
+    data = await request.get_json()
+    ip = data.get('ip')
+
+    if ip:
+        result = await run_blocking(arp_backend.delete_static_arp, ip)
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(result)
+    return jsonify({"error": "Missing required data (ip)"}), 400
+
+
+@app.route('/static/bulk', methods=['POST'])
+async def bulk_static_arp_entries():
+    try:
+        rows, replace = arp_backend.parse_bulk_request(request.mimetype, await request.get_data(as_text=True),
+                                                       await request.get_json(silent=True), request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return jsonify(await run_blocking(arp_backend.bulk_import, rows, replace, timeout=BULK_IMPORT_TIMEOUT))
+    except Exception as e:
+        return jsonify({"error": f"Failed to import ARP entries: {str(e)}"}), 500
+
+
+@app.route('/static/export', methods=['GET'])
+async def export_static_arp_entries():
+    export_format = request.args.get('format', 'json')
+    try:
+        entries = await run_blocking(arp_backend.static_arp_store.entries)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if export_format == 'csv':
+        return await make_response(arp_backend.to_csv(entries), 200, {
+            'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename=static-arp.csv'})
+    if export_format != 'json':
+        return jsonify({'error': "format must be csv or json"}), 400
+    return jsonify(entries)
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    # The UI proxies /api1 to 5001 and /api2 to 5002; one process serves both
+    config.bind = ['0.0.0.0:5001', '0.0.0.0:5002']
+    asyncio.run(serve(app, config))
@@ -0,0 +1,76 @@
+"""
+Bounded execution of commands and blocking calls for the asyncio backend.
+
+Every external command and every blocking call (netlink dumps, file reads)
+goes through one global concurrency cap and a per-call timeout, so a hung
+``resolvectl`` costs one slot for a few seconds instead of a whole worker.
+A command that overruns its timeout is killed; a blocking call that overruns
+keeps its slot until the thread really returns, so the cap stays honest.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import command_runner
+
+# Commands and blocking calls allowed to run at the same time
+MAX_CONCURRENT_CALLS = int(os.environ.get('NETWORK_CONFIG_MAX_CALLS', '16'))
+DEFAULT_TIMEOUT = 5.0
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix='blocking-call')
+_slots = None
+
+
+class CallTimeout(TimeoutError):
+    """Raised when a command or blocking call overruns its timeout."""
+
+
+def _get_slots():
+    # Created on first use so it belongs to the serving event loop
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+    return _slots
+
+
+async def run_command(argv, timeout=DEFAULT_TIMEOUT):
+    """
+    Run ``argv`` and return (returncode, stdout, stderr) as text.
+
+    Executions are accounted in the shared command_runner statistics.
+    """
+    key = command_runner.command_key(argv)
+    async with _get_slots():
+        start = time.monotonic()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except OSError:
+            command_runner.runner.record(key, time.monotonic() - start, failed=True)
+            raise
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            command_runner.runner.record(key, time.monotonic() - start, timed_out=True)
+            raise CallTimeout(f"{' '.join(argv)} timed out after {timeout}s")
+    command_runner.runner.record(key, time.monotonic() - start, failed=proc.returncode != 0)
+    return proc.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+async def run_blocking(fn, *args, timeout=DEFAULT_TIMEOUT):
+    """Run ``fn(*args)`` on the bounded thread pool and return its result."""
+    slots = _get_slots()
+    await slots.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _future: slots.release())
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        raise CallTimeout(f"{getattr(fn, '__name__', fn)} timed out after {timeout}s")
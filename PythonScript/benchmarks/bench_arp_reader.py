@@ -0,0 +1,115 @@
+"""
+Compare the ARP readers on synthetic neighbour tables.
+
+* netlink -- decode an RTM_NEWNEIGH dump and build the /arp records
+* proc    -- parse a /proc/net/arp listing
+* arp -e  -- the old path: fork a process that prints an ``arp -e`` listing
+             (``cat`` of a pre-rendered file stands in for net-tools, which
+             cannot be fed a fake table) and split its columns.  This
+             leaves out net-tools' own parsing and its reverse lookups,
+             so it is a lower bound for the old cost.
+
+    python3 benchmarks/bench_arp_reader.py [--counts 1000,10000,50000]
+"""
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arp_reader  # noqa: E402
+import netlink  # noqa: E402
+
+_HDR = struct.Struct("=IHHII")
+LINKS = [{'index': 2 + i, 'ifname': f'enp{i}s0', 'type': 1} for i in range(4)]
+
+
+def _ip(i):
+    return f"10.{(i >> 16) & 0xFF}.{(i >> 8) & 0xFF}.{i & 0xFF}"
+
+
+def _mac(i):
+    return f"02:00:00:{(i >> 16) & 0xFF:02x}:{(i >> 8) & 0xFF:02x}:{i & 0xFF:02x}"
+
+
+def synthetic_neigh_dump(count):
+    messages = []
+    for i in range(count):
+        state = netlink.NUD_PERMANENT if i % 10 == 0 else netlink.NUD_REACHABLE
+        body = (struct.pack("=BxxxiHBB", socket.AF_INET, 2 + i % 4, state, 0, 1)
+                + netlink.pack_attr(netlink.NDA_DST, socket.inet_aton(_ip(i)))
+                + netlink.pack_attr(netlink.NDA_LLADDR, bytes.fromhex(_mac(i).replace(':', ''))))
+        messages.append(_HDR.pack(_HDR.size + len(body), netlink.RTM_NEWNEIGH, netlink.NLM_F_MULTI, 1, 0) + body)
+    return b"".join(messages)
+
+
+def synthetic_proc_arp(count):
+    lines = ["IP address       HW type     Flags       HW address            Mask     Device"]
+    for i in range(count):
+        flags = '0x6' if i % 10 == 0 else '0x2'
+        lines.append(f"{_ip(i):<16} 0x1         {flags:<11} {_mac(i)}     *        enp{i % 4}s0")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_arp_e(count):
+    lines = ["Address                  HWtype  HWaddress           Flags Mask            Iface"]
+    for i in range(count):
+        flags = 'CM' if i % 10 == 0 else 'C'
+        lines.append(f"{_ip(i):<24} ether   {_mac(i)}   {flags:<5}                 enp{i % 4}s0")
+    return "\n".join(lines) + "\n"
+
+
+def netlink_pass(dump):
+    entries = []
+    arp_reader.decode_neigh_datagram(dump, 1, arp_reader.link_names(LINKS), entries)
+    return entries
+
+
+def arp_e_pass(path):
+    # Mirrors the `arp -e` parsing the backend did before the netlink reader
+    result = subprocess.run(['cat', path], capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stdout.splitlines()[1:]:
+        columns = line.split()
+        if len(columns) >= 5:
+            entries.append({'ip': columns[0], 'hw_type': columns[1], 'mac': columns[2],
+                            'flags': columns[3], 'iface': columns[4]})
+    return entries
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--counts', default='1000,10000,50000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'arp -e ms':>10} {'proc ms':>9} {'netlink ms':>11}")
+    for count in (int(c) for c in args.counts.split(',')):
+        dump = synthetic_neigh_dump(count)
+        proc_text = synthetic_proc_arp(count)
+        with tempfile.NamedTemporaryFile('w', suffix='.arp') as f:
+            f.write(synthetic_arp_e(count))
+            f.flush()
+            assert len(netlink_pass(dump)) == len(arp_reader.parse_proc_net_arp(proc_text)) == count
+            arp_e = best_of(lambda: arp_e_pass(f.name), args.repeat)
+        proc = best_of(lambda: arp_reader.parse_proc_net_arp(proc_text), args.repeat)
+        nl = best_of(lambda: netlink_pass(dump), args.repeat)
+        print(f"{count:>8} {arp_e * 1e3:>10.2f} {proc * 1e3:>9.2f} {nl * 1e3:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Exercise the command runner's hot paths against FakeBackend canned output.
+
+No root and no networkctl/resolvectl are needed.  The fake backend sleeps
+``--latency`` per call to stand in for fork/exec and the tool's own work.
+It reports:
+
+* per-call overhead of the runner over calling the backend directly
+* the per-interface gateway/DNS lookups of the command-based collector,
+  first call and memoised repeat (within READ_CACHE_TTL)
+* throughput of many threads issuing commands under the in-flight cap
+
+    python3 benchmarks/bench_command_runner.py [--interfaces 48] [--latency 0.004]
+"""
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import command_runner  # noqa: E402
+
+NETWORKCTL_STATUS = """\
+● 2: {iface}
+                     Link File: /usr/lib/systemd/network/99-default.link
+                  Network File: /run/systemd/network/10-netplan-{iface}.network
+                         State: routable (configured)
+                       Address: 10.0.0.2
+                       Gateway: 10.0.0.1
+                           DNS: 10.0.0.53
+"""
+
+RESOLVECTL_STATUS = """\
+Link 2 ({iface})
+    Current Scopes: DNS
+Current DNS Server: 10.0.0.53
+       DNS Servers: 10.0.0.53 10.0.0.54
+"""
+
+
+def fake_backend(latency):
+    return command_runner.FakeBackend({
+        'networkctl status': lambda argv: (0, NETWORKCTL_STATUS.format(iface=argv[-1])),
+        'resolvectl status': lambda argv: (0, RESOLVECTL_STATUS.format(iface=argv[-1])),
+        'true': (0, ''),
+    }, latency=latency)
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--interfaces', type=int, default=48)
+    parser.add_argument('--latency', type=float, default=0.004)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Runner overhead, with an instant backend
+    instant = fake_backend(0.0)
+    runner = command_runner.CommandRunner(backend=instant)
+    calls = 10000
+    direct = best_of(lambda: [instant.run(['true'], 1.0) for _ in range(calls)], args.repeat)
+    wrapped = best_of(lambda: [runner.run(['true']) for _ in range(calls)], args.repeat)
+    print(f"runner overhead: {(wrapped - direct) / calls * 1e6:.2f} us/call")
+
+    # Gateway + DNS lookups of the command-based collector
+    command_runner.set_backend(fake_backend(args.latency))
+    app = importlib.import_module('Network-configuration')
+    interfaces = [f"enp{i}s0" for i in range(args.interfaces)]
+
+    def lookups():
+        for iface in interfaces:
+            app.get_gateway_from_networkctl(iface)
+            app.get_dns_for_interface(iface)
+
+    command_runner.runner.clear_cache()
+    start = time.perf_counter()
+    lookups()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    lookups()
+    warm = time.perf_counter() - start
+    print(f"{args.interfaces} interfaces, {2 * args.interfaces} commands: "
+          f"first {cold * 1e3:.1f} ms, memoised repeat {warm * 1e3:.2f} ms")
+
+    # Many threads, bounded in-flight commands
+    runner = command_runner.CommandRunner(backend=fake_backend(args.latency))
+    per_thread = 20
+
+    def worker():
+        for i in range(per_thread):
+            runner.run(['networkctl', 'status', f"enp{i}s0"])
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = args.threads * per_thread
+    print(f"{args.threads} threads x {per_thread} commands, cap {command_runner.MAX_IN_FLIGHT}: "
+          f"{total / elapsed:.0f} commands/s "
+          f"(ideal {command_runner.MAX_IN_FLIGHT / args.latency:.0f})")
+    stats = runner.stats()['networkctl status']
+    print(f"networkctl status: {stats['calls']} calls, {stats['seconds'] / stats['calls'] * 1e3:.2f} ms mean")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost of the 1-second interface counter sampler.
+
+* read     -- one pass over this machine's physical interfaces: the single
+  RTM_GETLINK dump the sampler uses vs the eight sysfs statistics files per
+  interface
+* record   -- appending one sample for ``--interfaces`` synthetic ports to
+  their ring files (in a temporary directory)
+* cpu      -- process CPU time of both per second of wall time, as a share
+  of one core
+* query    -- /network-stats/<iface> series over the last 5 minutes, day and
+  month
+
+    python3 benchmarks/bench_counter_sampler.py [--interfaces 48] [--passes 1000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import counter_sampler  # noqa: E402
+
+
+def per_pass(fn, passes):
+    start = time.perf_counter()
+    for _ in range(passes):
+        fn()
+    return (time.perf_counter() - start) / passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--interfaces', type=int, default=48)
+    parser.add_argument('--passes', type=int, default=1000)
+    args = parser.parse_args()
+
+    shm_dir = tempfile.mkdtemp(prefix='counter-sampler-')
+    try:
+        run(args, shm_dir)
+    finally:
+        shutil.rmtree(shm_dir)
+
+
+def run(args, shm_dir):
+    sampler = counter_sampler.CounterSampler(shm_dir=shm_dir)
+    physical = list(sampler.read_counters())
+    print(f"{len(physical)} physical interfaces here: {', '.join(physical)}")
+    netlink_read = per_pass(sampler.read_counters, args.passes)
+    sysfs_read = per_pass(lambda: [counter_sampler.read_sysfs_counters(ifname) for ifname in physical], args.passes)
+    print(f"  read     netlink {netlink_read * 1e6:8.1f} us/pass   sysfs {sysfs_read * 1e6:8.1f} us/pass")
+
+    names = [f"port{i}" for i in range(args.interfaces)]
+    now = int(time.time()) - args.passes
+    counters = [0] * len(counter_sampler.COUNTERS)
+
+    def record():
+        nonlocal now
+        now += 1
+        for i in range(len(counters)):
+            counters[i] += 1000
+        sampler.record({name: tuple(counters) for name in names}, now)
+    record()
+    record_pass = per_pass(record, args.passes)
+    print(f"  record   {args.interfaces} interfaces {record_pass * 1e6:8.1f} us/pass, "
+          f"{args.interfaces * counter_sampler.FILE_BYTES / 2**20:.1f} MiB of ring files")
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(args.passes):
+        sampler.read_counters()
+        record()
+    cpu = (time.process_time() - cpu_start) / args.passes
+    print(f"  cpu      read + record at 1 Hz: {cpu * 100:.3f}% of a core "
+          f"({(time.perf_counter() - wall_start) / args.passes * 1e3:.2f} ms wall per pass)")
+
+    end = now
+    for label, span in (('5 min', 300), ('1 day', 86400), ('30 days', 30 * 86400)):
+        series = sampler.series(names[0], end - span, end)
+        query = per_pass(lambda: sampler.series(names[0], end - span, end), 100)
+        print(f"  query    {label:<8} {len(series['columns']['time'])} points at {series['resolution']} s "
+              f"resolution: {query * 1e3:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Poll a fleet of local stand-in appliances: one by one vs FleetPoller.
+
+Starts one gunicorn (gthread, keep-alive like server.py) bound to a pair of
+spare ports per stand-in appliance, serving the real Network-configuration
+and arp-pythonscript apps with ``--latency`` ms added per request for the
+WAN, plus ``--dead`` hosts that accept connections and never answer.
+
+* one-by-one -- each appliance's /network-info and /arp in turn, a new
+  connection and a full uncompressed body per request, like checking every
+  box in its own browser tab
+* fleet      -- FleetPoller: concurrent, pooled keep-alive connections,
+  conditional requests, per-host timeout and a round deadline
+
+    python3 benchmarks/bench_fleet.py [--appliances 24] [--latency 40] [--dead 1]
+"""
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fleet_poller  # noqa: E402
+import server  # noqa: E402
+
+
+def with_latency(app, seconds):
+    def delayed(environ, start_response):
+        time.sleep(seconds)
+        return app(environ, start_response)
+    return delayed
+
+
+def spare_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StandIns(server.Server):
+    def __init__(self, options, apps_by_port):
+        self.apps_by_port = apps_by_port
+        super().__init__(options)
+
+    def load(self):
+        return server.PortDispatcher(self.apps_by_port, None)
+
+
+def start_stand_ins(pairs, delay):
+    """Fork a gunicorn serving every (network port, arp port) pair; returns its pid."""
+    pid = os.fork()
+    if pid:
+        return pid
+    network_app = with_latency(importlib.import_module('Network-configuration').app, delay)
+    arp_app = with_latency(importlib.import_module('arp-pythonscript').app, delay)
+    apps_by_port = {}
+    for network_port, arp_port in pairs:
+        apps_by_port[network_port] = network_app
+        apps_by_port[arp_port] = arp_app
+    sys.argv = sys.argv[:1]
+    StandIns({'bind': [f"127.0.0.1:{port}" for port in apps_by_port], 'workers': 1,
+              'worker_class': 'gthread', 'threads': 64, 'keepalive': server.KEEPALIVE,
+              'loglevel': 'warning'}, apps_by_port).run()
+    os._exit(0)
+
+
+def wait_until_up(url):
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def blackhole():
+    """A port that accepts connections and never answers."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(64)
+    held = []
+
+    def accept():
+        while True:
+            held.append(listener.accept()[0])
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def one_by_one(appliances, timeout):
+    received = errors = 0
+    for appliance in appliances:
+        for backend, path in fleet_poller.DOCUMENTS.values():
+            try:
+                with urllib.request.urlopen(appliance.urls[backend] + path, timeout=timeout) as response:
+                    received += len(response.read())
+            except OSError:
+                errors += 1
+    return received, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--appliances', type=int, default=24)
+    parser.add_argument('--dead', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=40, help="ms added to every request")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between fleet rounds")
+    parser.add_argument('--host-timeout', type=float, default=fleet_poller.HOST_TIMEOUT)
+    parser.add_argument('--deadline', type=float, default=fleet_poller.ROUND_DEADLINE)
+    args = parser.parse_args()
+
+    pairs = [(spare_port(), spare_port()) for _ in range(args.appliances)]
+    stand_ins = start_stand_ins(pairs, args.latency / 1000)
+    try:
+        run(args, pairs)
+    finally:
+        os.kill(stand_ins, signal.SIGTERM)
+        os.waitpid(stand_ins, 0)
+
+
+def run(args, pairs):
+    config = [{'name': f"box{i:02d}", 'network_url': f"http://127.0.0.1:{network_port}",
+               'arp_url': f"http://127.0.0.1:{arp_port}"}
+              for i, (network_port, arp_port) in enumerate(pairs)]
+    for network_port, arp_port in pairs:
+        wait_until_up(f"http://127.0.0.1:{network_port}/network-info")
+        wait_until_up(f"http://127.0.0.1:{arp_port}/arp")
+    for i in range(args.dead):
+        port = blackhole()
+        config.append({'name': f"dead{i}", 'network_url': f"http://127.0.0.1:{port}",
+                       'arp_url': f"http://127.0.0.1:{port}"})
+    print(f"{args.appliances} appliances + {args.dead} unresponsive, {args.latency:.0f} ms latency, "
+          f"host timeout {args.host_timeout} s, deadline {args.deadline} s")
+
+    start = time.perf_counter()
+    received, errors = one_by_one(fleet_poller.parse_appliances(config), args.host_timeout)
+    print(f"  {'one-by-one':<12} {time.perf_counter() - start:7.2f} s  {received / 1024:8.1f} KiB  "
+          f"{errors} failed requests")
+
+    poller = fleet_poller.FleetPoller(fleet_poller.parse_appliances(config), host_timeout=args.host_timeout,
+                                      deadline=args.deadline)
+    for round_number in range(args.rounds):
+        if round_number:
+            time.sleep(args.interval)
+        before = dict(poller.pool.stats)
+        result = poller.poll()
+        stats = {key: poller.pool.stats[key] - before[key] for key in before}
+        label = 'fleet cold' if round_number == 0 else 'fleet warm'
+        print(f"  {label:<12} {result['seconds']:7.2f} s  {stats['bytes'] / 1024:8.1f} KiB  "
+              f"{stats['requests']} answered, {stats['not_modified']} not modified, "
+              f"{stats['connections']} new connections, {result['late']} late")
+    statuses = {}
+    for appliance in poller.summary()['appliances']:
+        statuses[appliance['status']] = statuses.get(appliance['status'], 0) + 1
+    print(f"  appliance status: {statuses}")
+
+    ips = [hit['ip'] for hit in poller.index.hits if hit['ip']]
+    if ips:
+        start = time.perf_counter()
+        for _ in range(1000):
+            hits = poller.index.search(ip=ips[0])
+        print(f"  index of {len(poller.index.hits)} entries: ip={ips[0]} -> {len(hits)} hits in "
+              f"{(time.perf_counter() - start) * 1e3:.1f} us/search")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare the netlink interface collector with the old subprocess collector.
+
+The netlink side decodes synthetic RTM_NEWLINK/RTM_NEWADDR/RTM_NEWROUTE dumps
+for N interfaces, so it can be run without N real ports.  The subprocess side
+forks the same 3N+1 commands the old ``get_available_interfaces()`` ran,
+pointed at an interface that exists on this host.
+
+    python3 benchmarks/bench_interface_collector.py [--counts 1,4,12,48]
+"""
+import argparse
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interface_collector  # noqa: E402
+import netlink  # noqa: E402
+
+_HDR = struct.Struct("=IHHII")
+
+
+def _message(msg_type, body):
+    return _HDR.pack(_HDR.size + len(body), msg_type, netlink.NLM_F_MULTI, 1, 0) + body
+
+
+def synthetic_dump(count):
+    """Raw netlink datagrams describing ``count`` ethernet ports."""
+    links, addrs, routes = [], [], []
+    for i in range(count):
+        index = i + 2
+        name = f"enp{i}s0".encode() + b"\0"
+        links.append(_message(netlink.RTM_NEWLINK,
+                              struct.pack("=BxHiII", socket.AF_UNSPEC, 1, index, 0x11043, 0)
+                              + netlink.pack_attr(netlink.IFLA_IFNAME, name)
+                              + netlink.pack_attr(netlink.IFLA_OPERSTATE, bytes([netlink.IF_OPER_UP]))
+                              + netlink.pack_attr(netlink.IFLA_ADDRESS, bytes([2, 0, 0, 0, i >> 8, i & 0xFF]))
+                              + netlink.pack_attr(netlink.IFLA_MTU, struct.pack("=I", 1500))))
+        address = socket.inet_aton(f"10.{i >> 8}.{i & 0xFF}.2")
+        addrs.append(_message(netlink.RTM_NEWADDR,
+                              struct.pack("=BBBBI", socket.AF_INET, 24, 0, 0, index)
+                              + netlink.pack_attr(netlink.IFA_ADDRESS, address)
+                              + netlink.pack_attr(netlink.IFA_LOCAL, address)))
+        routes.append(_message(netlink.RTM_NEWROUTE,
+                               struct.pack("=BBBBBBBBI", socket.AF_INET, 0, 0, 0, netlink.RT_TABLE_MAIN,
+                                           3, 0, netlink.RTN_UNICAST, 0)
+                               + netlink.pack_attr(netlink.RTA_OIF, struct.pack("=i", index))
+                               + netlink.pack_attr(netlink.RTA_GATEWAY, socket.inet_aton(f"10.{i >> 8}.{i & 0xFF}.1"))
+                               + netlink.pack_attr(netlink.RTA_PRIORITY, struct.pack("=I", 100 + i))))
+    return b"".join(links), b"".join(addrs), b"".join(routes)
+
+
+def decode(data):
+    return [netlink.PARSERS[msg_type](payload) for msg_type, _flags, _seq, payload in netlink.parse_messages(data)]
+
+
+def netlink_pass(dumps):
+    links, addrs, routes = (decode(d) for d in dumps)
+    return interface_collector.build_network_info(links, addrs, routes, {}, is_physical=lambda name: True)
+
+
+def subprocess_pass(count, ifname, commands):
+    subprocess.run(['ls', '/sys/class/net'], stdout=subprocess.PIPE)
+    for _ in range(count):
+        for command in commands:
+            subprocess.run(command + [ifname], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--counts', default='1,4,12,48,128')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--ifname', default='lo')
+    args = parser.parse_args()
+
+    commands = [c for c in (['ip', 'addr', 'show'], ['networkctl', 'status'], ['resolvectl', 'status'])
+                if shutil.which(c[0])]
+    print(f"subprocess path forks: {', '.join(' '.join(c) for c in commands)} (+ ls)")
+    live = best_of(lambda: netlink.dump_state(), args.repeat)
+    print(f"live netlink dump on this host: {live * 1e3:.2f} ms\n")
+
+    print(f"{'ifaces':>6} {'forks':>6} {'subprocess ms':>14} {'netlink ms':>11} {'speedup':>8}")
+    for count in (int(c) for c in args.counts.split(',')):
+        dumps = synthetic_dump(count)
+        assert len(netlink_pass(dumps)) == count
+        nl = best_of(lambda: netlink_pass(dumps), args.repeat)
+        sp = best_of(lambda: subprocess_pass(count, args.ifname, commands), args.repeat)
+        forks = count * len(commands) + 1
+        print(f"{count:>6} {forks:>6} {sp * 1e3:>14.2f} {nl * 1e3:>11.3f} {sp / nl:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Size and CPU cost of the /arp representations for a large neighbour table.
+
+Compares re-serialising the entries with jsonify on every poll (the old
+/arp) with serving pre-rendered bytes from SnapshotRepresentations, for each
+format and compression the installed modules allow.
+
+    python3 benchmarks/bench_representations.py [--entries 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+
+import representations  # noqa: E402
+from snapshot_cache import Snapshot  # noqa: E402
+
+
+def neighbour_entries(count):
+    return [{'flags': 'C', 'hw_type': 'ether', 'iface': f"enp{i % 4}s0",
+             'ip': f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}",
+             'mac': f"02:00:00:{i >> 16:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}", 'state': 'REACHABLE'}
+            for i in range(count)]
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def jsonify_body(app, entries):
+    with app.app_context():
+        return jsonify(entries).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    entries = neighbour_entries(args.entries)
+    body = json.dumps(entries, sort_keys=True, separators=(',', ':')).encode()
+    snapshot = Snapshot(1, '1-bench', entries, body)
+
+    app = Flask(__name__)
+    with app.app_context():
+        seconds = per_call(lambda: jsonify(entries).get_data(), args.repeat)
+    size = len(jsonify_body(app, entries))
+    print(f"{args.entries} entries")
+    print(f"  {'jsonify per poll':<24} {size / 1024:8.0f} KiB {seconds * 1e3:8.2f} ms/poll")
+
+    cache = representations.SnapshotRepresentations(representations.columns)
+    for fmt in representations.formats():
+        for encoding in [None] + representations.encodings():
+            start = time.perf_counter()
+            rendered, _applied = cache.get(snapshot, fmt, encoding)
+            first = time.perf_counter() - start
+            seconds = per_call(lambda: cache.get(snapshot, fmt, encoding), args.repeat)
+            label = fmt + (f"+{encoding}" if encoding else '')
+            print(f"  {label:<24} {len(rendered) / 1024:8.0f} KiB {seconds * 1e3:8.3f} ms/poll "
+                  f"(first render {first * 1e3:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Longest-prefix-match lookups of RouteTable against a synthetic routing table.
+
+Loads ``--routes`` random IPv4 prefixes (/8../32, plus a default route) into
+a RouteTable through a fake reader, then resolves ``--lookups`` random
+destinations:
+
+* linear   -- scan every route for the longest matching prefix
+* trie     -- RouteTable.lookup (rules, then the PATRICIA trie per table)
+* kernel   -- one RTM_GETROUTE request per destination on this machine's
+  own (small) table, what answering without a local index would cost
+
+and reports the cost of applying one route notification.
+
+    python3 benchmarks/bench_route_lookup.py [--routes 100000] [--lookups 10000]
+"""
+import argparse
+import ipaddress
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import netlink  # noqa: E402
+from route_table import RouteTable  # noqa: E402
+
+MAIN_RULE = {'family': socket.AF_INET, 'priority': 32766, 'action': netlink.FR_ACT_TO_TBL,
+             'table': netlink.RT_TABLE_MAIN, 'invert': False, 'src': None, 'src_len': 0, 'dst': None,
+             'dst_len': 0, 'tos': 0, 'iif': None, 'oif': None, 'fwmark': None, 'fwmask': None, 'goto': None}
+
+
+def route(dst, dst_len, gateway='192.0.2.1'):
+    return {'family': socket.AF_INET, 'dst_len': dst_len, 'table': netlink.RT_TABLE_MAIN, 'protocol': 4,
+            'scope': 0, 'type': netlink.RTN_UNICAST, 'dst': dst, 'gateway': gateway, 'prefsrc': '192.0.2.2',
+            'oif': 2, 'metric': 0, 'tos': 0, 'cloned': False, 'nexthops': None}
+
+
+def random_routes(count, rng):
+    routes = {(None, 0): route(None, 0)}
+    while len(routes) < count + 1:
+        length = rng.choice((8, 12, 16, 16, 20, 22, 24, 24, 24, 28, 32))
+        network = ipaddress.IPv4Network((rng.getrandbits(32) >> (32 - length) << (32 - length), length))
+        routes[str(network.network_address), length] = route(str(network.network_address), length)
+    return list(routes.values())
+
+
+def linear(table, destinations):
+    results = []
+    for dst in destinations:
+        address = int(ipaddress.ip_address(dst))
+        best = None
+        for key, length, r in table:
+            if (length == 0 or address >> (32 - length) == key >> (32 - length)) and (
+                    best is None or length > best['dst_len']):
+                best = r
+        results.append(best)
+    return results
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--routes', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    routes = random_routes(args.routes, rng)
+    links = [{'index': 2, 'ifname': 'eth0'}]
+    table = RouteTable(reader=lambda: (routes, [MAIN_RULE], links, []))
+    # No route events for a fake table
+    table._watcher_pid = os.getpid()
+    load, _ = timed(table.reload)
+    print(f"{len(routes)} routes loaded in {load:.2f} s")
+
+    destinations = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(args.lookups)]
+    seconds, results = timed(lambda: table.lookup(destinations))
+    print(f"  trie     {seconds / len(destinations) * 1e6:8.2f} us/lookup")
+    sample = destinations[:max(10, min(len(destinations), 2000000 // len(routes)))]
+    flat = [(int(ipaddress.ip_address(r['dst'] or '0.0.0.0')), r['dst_len'], r) for r in routes]
+    seconds, expected = timed(lambda: linear(flat, sample))
+    print(f"  linear   {seconds / len(sample) * 1e6:8.2f} us/lookup ({len(sample)} destinations)")
+    for result, best in zip(results, expected):
+        assert result['route'] == (f"{best['dst']}/{best['dst_len']}" if best['dst'] else 'default'), result
+
+    try:
+        with netlink.NetlinkSocket() as nl:
+            seconds, _ = timed(lambda: [nl.route_get(dst) for dst in destinations])
+        print(f"  kernel   {seconds / len(destinations) * 1e6:8.2f} us/lookup (RTM_GETROUTE, this machine's table)")
+    except OSError as e:
+        print(f"  kernel   skipped: {e}")
+
+    updates = [route(f"198.18.{i // 256}.{i % 256}", 32) for i in range(10000)]
+    seconds, _ = timed(lambda: [table.upsert_route(r) for r in updates])
+    removal, _ = timed(lambda: [table.remove_route(r) for r in updates])
+    print(f"  events   add {seconds / len(updates) * 1e6:.2f} us/route, remove {removal / len(updates) * 1e6:.2f} us/route")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Memory footprint and startup time: two gunicorn services vs server.py.
+
+Starts each layout on spare ports, waits until both apps answer, then sums
+the memory of its process tree:
+
+* separate -- today's units: a Python wrapper importing
+  Network-configuration.py and starting gunicorn (4 gthread workers), plus
+  gunicorn for arp-pythonscript.py (4 sync workers)
+* combined -- server.py, one preloaded gunicorn serving both apps
+
+RSS counts shared pages once per process; USS is memory private to each
+process, PSS splits shared pages between the processes using them, so PSS is
+the fairest total.  Needs gunicorn and psutil; run as root like the services.
+
+    python3 benchmarks/bench_server_footprint.py [--workers 2]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import psutil
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NETWORK_PORT = 15001
+ARP_PORT = 15002
+STARTUP_TIMEOUT = 60
+SETTLE_SECONDS = 2
+
+# Imports the app like the real __main__ does, without its first-boot setup
+WRAPPER = "import importlib, subprocess, sys; importlib.import_module(sys.argv[1]); subprocess.run(sys.argv[2:])"
+
+
+def separate_layout():
+    gunicorn = [sys.executable, '-m', 'gunicorn']
+    return [
+        [sys.executable, '-c', WRAPPER, 'Network-configuration'] + gunicorn + [
+            '-w', '4', '-k', 'gthread', '--threads', '16', '-b', f'127.0.0.1:{NETWORK_PORT}',
+            'Network-configuration:app'],
+        gunicorn + ['-w', '4', '-b', f'127.0.0.1:{ARP_PORT}', 'arp-pythonscript:app'],
+    ]
+
+
+def combined_layout(workers):
+    command = [sys.executable, 'server.py', '--skip-os-setup',
+               '--network-bind', f'127.0.0.1:{NETWORK_PORT}', '--arp-bind', f'127.0.0.1:{ARP_PORT}']
+    if workers:
+        command += ['--workers', str(workers)]
+    return [command]
+
+
+def answers(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def tree(pid):
+    try:
+        parent = psutil.Process(pid)
+        return [parent] + parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def measure(name, commands):
+    start = time.perf_counter()
+    procs = [subprocess.Popen(command, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for command in commands]
+    try:
+        urls = [f'http://127.0.0.1:{NETWORK_PORT}/network-info', f'http://127.0.0.1:{ARP_PORT}/interfaces']
+        while not all(answers(url) for url in urls):
+            if time.perf_counter() - start > STARTUP_TIMEOUT:
+                raise RuntimeError(f"{name} layout did not start within {STARTUP_TIMEOUT}s")
+            time.sleep(0.05)
+        ready = time.perf_counter() - start
+        # Let every worker finish booting and serve a request or two
+        time.sleep(SETTLE_SECONDS)
+        for _ in range(20):
+            for url in urls:
+                answers(url)
+
+        processes = [process for proc in procs for process in tree(proc.pid)]
+        rss = uss = pss = 0
+        for process in processes:
+            try:
+                info = process.memory_full_info()
+            except psutil.NoSuchProcess:
+                continue
+            rss += info.rss
+            uss += info.uss
+            pss += getattr(info, 'pss', 0)
+        interpreters = sum(1 for process in processes if 'python' in os.path.basename(process.exe()))
+        print(f"{name:<9} {interpreters:3d} interpreters  ready in {ready:5.2f} s  "
+              f"RSS {rss / 2**20:6.1f} MiB  USS {uss / 2**20:6.1f} MiB  PSS {pss / 2**20:6.1f} MiB")
+    finally:
+        # The wrapper's gunicorn is its child, not ours, so stop whole trees
+        processes = [process for proc in procs for process in reversed(tree(proc.pid))]
+        for process in processes:
+            try:
+                process.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _gone, alive = psutil.wait_procs(processes, timeout=10)
+        for process in alive:
+            process.kill()
+        for proc in procs:
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=0, help="server.py workers (default: its own sizing)")
+    args = parser.parse_args()
+    measure('separate', separate_layout())
+    measure('combined', combined_layout(args.workers))
+
+
+if __name__ == '__main__':
+    main()
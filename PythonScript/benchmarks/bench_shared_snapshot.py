@@ -0,0 +1,87 @@
+"""
+Serve a snapshot from several worker processes through SharedSnapshot.
+
+Each of ``--workers`` forked processes wraps its own SnapshotCache in a
+SharedSnapshot and answers ``--requests`` reads.  The caches expire every
+``--refresh`` seconds, so the publisher keeps collecting new versions while
+the others read.  Reported per worker: collector runs, versions seen and
+time per read.  Only the publishing worker should collect.
+
+    python3 benchmarks/bench_shared_snapshot.py [--workers 4] [--entries 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shared_snapshot  # noqa: E402
+from snapshot_cache import SnapshotCache  # noqa: E402
+
+
+def make_collector(entries, counts):
+    def collect():
+        counts['builds'] += 1
+        # Stand in for the netlink dumps and the command calls
+        time.sleep(0.02)
+        return {f"10.0.{i // 256}.{i % 256}": {'mac': f"02:00:00:00:{i // 256:02x}:{i % 256:02x}",
+                                             'iface': 'eth0', 'state': 'REACHABLE', 'build': counts['builds'],
+                                             'pid': os.getpid()}
+                for i in range(entries)}
+    return collect
+
+
+def worker(args, shm_dir, lock_dir, out):
+    counts = {'builds': 0}
+    cache = SnapshotCache(make_collector(args.entries, counts), groups=0, fallback_ttl=args.refresh)
+    shared = shared_snapshot.SharedSnapshot('bench', cache, shm_dir, lock_dir)
+    shared.get()
+    versions = set()
+    busy = 0.0
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        versions.add(shared.get().version)
+        busy += time.perf_counter() - start
+        time.sleep(args.think)
+    os.write(out, f"{os.getpid()} {shared._leader} {counts['builds']} {len(versions)} "
+                  f"{busy / args.requests * 1e6:.1f}\n".encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--refresh', type=float, default=0.2)
+    parser.add_argument('--think', type=float, default=0.0005)
+    args = parser.parse_args()
+
+    shm_dir = tempfile.mkdtemp()
+    lock_dir = tempfile.mkdtemp()
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            worker(args, shm_dir, lock_dir, write_fd)
+            os._exit(0)
+        pids.append(pid)
+    os.close(write_fd)
+
+    for pid in pids:
+        os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as results:
+        lines = results.read().split('\n')
+    size = os.path.getsize(os.path.join(shm_dir, 'bench.snap'))
+    print(f"{args.workers} workers, {args.entries} entries, shared file {size / 1024:.0f} KiB")
+    for line in filter(None, lines):
+        pid, leader, builds, versions, per_read = line.split()
+        role = 'publisher' if leader == 'True' else 'reader'
+        print(f"  pid {pid} ({role}): {builds} collections, {versions} versions seen, {per_read} us/read")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Startup time, memory and transfer size of the web UI: vite preview vs static_ui.py.
+
+Starts each server on a spare port against the same built ``dist/``, waits
+until ``/`` answers, then fetches index.html and every file under assets/
+``--rounds`` times the way a browser would (Accept-Encoding: br, gzip) and
+sums the memory of its process tree:
+
+* vite    -- ``vite preview``, what ui.service ran after its npm install and
+             npm run build on every start (``--with-build`` adds the build)
+* python  -- static_ui.py, precompressed files, with /api1 and /api2
+             forwarded to the backend ports
+
+Needs psutil and gunicorn, a built dist/ (build-ui.sh), and node_modules for
+the vite side, which is skipped without it.
+
+    python3 benchmarks/bench_ui_server.py [--rounds 20] [--with-build]
+"""
+import argparse
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import psutil
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(HERE)
+PORT = 15000
+STARTUP_TIMEOUT = 120
+
+
+def assets(dist):
+    names = ['/']
+    for name in sorted(os.listdir(os.path.join(dist, 'assets'))):
+        if not name.endswith(('.gz', '.br')):
+            names.append(f"/assets/{name}")
+    return names
+
+
+def get(path):
+    connection = http.client.HTTPConnection('127.0.0.1', PORT, timeout=2)
+    try:
+        connection.request('GET', path, headers={'Accept-Encoding': 'br, gzip'})
+        response = connection.getresponse()
+        return response.status, len(response.read())
+    finally:
+        connection.close()
+
+
+def tree(pid):
+    try:
+        parent = psutil.Process(pid)
+        return [parent] + parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def measure(name, command, cwd, paths, rounds, extra=0.0):
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if get('/')[0] == 200:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - start > STARTUP_TIMEOUT:
+                raise RuntimeError(f"{name} did not start within {STARTUP_TIMEOUT}s")
+            time.sleep(0.05)
+        ready = time.perf_counter() - start + extra
+
+        transferred = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                transferred += get(path)[1]
+        per_load = (time.perf_counter() - start) / rounds
+
+        rss = pss = 0
+        for process in tree(proc.pid):
+            try:
+                info = process.memory_full_info()
+            except psutil.NoSuchProcess:
+                continue
+            rss += info.rss
+            pss += getattr(info, 'pss', 0)
+        print(f"{name:<7} ready in {ready:6.2f} s  RSS {rss / 2**20:6.1f} MiB  PSS {pss / 2**20:6.1f} MiB  "
+              f"page load {per_load * 1e3:6.1f} ms, {transferred / rounds / 1024:7.1f} KiB")
+    finally:
+        processes = list(reversed(tree(proc.pid)))
+        for process in processes:
+            try:
+                process.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _gone, alive = psutil.wait_procs(processes, timeout=10)
+        for process in alive:
+            process.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--dist', default=os.path.join(ROOT, 'dist'))
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--with-build', action='store_true', help="count npm run build in vite's startup")
+    args = parser.parse_args()
+
+    paths = assets(args.dist)
+    print(f"{len(paths)} files per page load from {args.dist}")
+
+    vite = os.path.join(ROOT, 'node_modules', '.bin', 'vite')
+    if os.path.exists(vite) and shutil.which('node'):
+        build = 0.0
+        if args.with_build:
+            start = time.perf_counter()
+            subprocess.run([vite, 'build', '--outDir', args.dist], cwd=ROOT, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            build = time.perf_counter() - start
+            # The build replaced the precompressed files
+            subprocess.run([sys.executable, os.path.join(HERE, 'static_ui.py'), '--precompress', '--dist', args.dist],
+                           check=True, stdout=subprocess.DEVNULL)
+        measure('vite', [vite, 'preview', '--port', str(PORT), '--strictPort', '--outDir', args.dist],
+                ROOT, paths, args.rounds, build)
+    else:
+        print("vite      skipped: no node_modules (run npm ci first)")
+    measure('python', [sys.executable, 'static_ui.py', '--bind', f'127.0.0.1:{PORT}', '--dist', args.dist],
+            HERE, paths, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
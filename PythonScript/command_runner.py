@@ -0,0 +1,216 @@
+"""
+Shared runner for the external commands both services execute.
+
+Every command goes through ``run()``, which adds:
+
+* a per-call timeout (the child is killed when it expires)
+* a cap on concurrently running commands across the process's threads
+* optional short-TTL memoisation of read-only commands, keyed by argv
+* per-command counters and latency histograms, see ``stats()``
+
+The process-spawning part is a pluggable backend, so the hot paths can be
+exercised with ``FakeBackend`` canned output, without root or the real tools.
+"""
+import bisect
+import os
+import subprocess
+import threading
+import time
+
+import metrics
+
+DEFAULT_TIMEOUT = 10.0
+MAX_IN_FLIGHT = int(os.environ.get('NETWORK_CONFIG_MAX_COMMANDS', '8'))
+# Upper bounds (seconds) of the latency histogram buckets; the last is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class SubprocessBackend:
+    """Runs commands for real."""
+
+    def run(self, argv, timeout):
+        return subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+
+
+class FakeBackend:
+    """
+    Answers commands from canned output.
+
+    ``responses`` maps an argv tuple, or a command key as from
+    ``command_key``, to a (returncode, stdout) pair or to a callable taking
+    the argv and returning one.  ``latency`` seconds are slept per call to
+    stand in for fork/exec and the tool's own work.
+    """
+
+    def __init__(self, responses, latency=0.0):
+        self.responses = responses
+        self.latency = latency
+        self.calls = []
+
+    def run(self, argv, timeout):
+        self.calls.append(list(argv))
+        response = self.responses.get(tuple(argv), self.responses.get(command_key(argv)))
+        if response is None:
+            raise FileNotFoundError(2, 'No such file or directory', argv[0])
+        if callable(response):
+            response = response(argv)
+        if self.latency:
+            if self.latency > timeout:
+                time.sleep(timeout)
+                raise subprocess.TimeoutExpired(argv, timeout)
+            time.sleep(self.latency)
+        returncode, stdout = response
+        return subprocess.CompletedProcess(argv, returncode, stdout, '')
+
+
+def command_key(argv):
+    """Name a command for stats: the program plus its subcommand, ignoring sudo."""
+    words = [word for word in argv if word != 'sudo']
+    if not words:
+        return ''
+    key = os.path.basename(words[0])
+    if len(words) > 1 and not words[1].startswith('-') and '/' not in words[1]:
+        key += ' ' + words[1]
+    return key
+
+
+class _CommandStats:
+    __slots__ = ('calls', 'errors', 'timeouts', 'cache_hits', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self):
+        cumulative = []
+        total = 0
+        for count in self.buckets:
+            total += count
+            cumulative.append(total)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'cache_hits': self.cache_hits,
+            'seconds': round(self.seconds, 6),
+            # Cumulative counts per upper bound, in bucket order
+            'histogram': [[bound, count] for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], cumulative)],
+        }
+
+
+class CommandRunner:
+    def __init__(self, backend=None, max_in_flight=MAX_IN_FLIGHT, default_timeout=DEFAULT_TIMEOUT):
+        self.backend = backend or SubprocessBackend()
+        self.default_timeout = default_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._memo = {}     # argv tuple -> (expires at, CompletedProcess)
+        self._stats = {}
+        # Callables(key, seconds, failed, timed_out) told about every execution
+        self.observers = []
+
+    def run(self, argv, timeout=None, check=False, cache_ttl=None):
+        """
+        Run ``argv`` and return a ``subprocess.CompletedProcess`` with text output.
+
+        Raises ``subprocess.TimeoutExpired`` when the command overruns and,
+        with ``check``, ``subprocess.CalledProcessError`` on a non-zero exit.
+        ``cache_ttl`` (seconds) lets read-only commands reuse a recent result.
+        """
+        key = command_key(argv)
+        memo_key = tuple(argv)
+        if cache_ttl:
+            with self._lock:
+                cached = self._memo.get(memo_key)
+                hit = cached is not None and cached[0] > time.monotonic()
+                if hit:
+                    self._stats_for(key).cache_hits += 1
+            metrics.cache_lookup('commands', hit)
+            if hit:
+                return self._checked(cached[1], check)
+
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._slots:
+            # Latency covers execution only, not the wait for a slot
+            start = time.monotonic()
+            try:
+                result = self.backend.run(list(argv), timeout)
+            except subprocess.TimeoutExpired:
+                self.record(key, time.monotonic() - start, timed_out=True)
+                raise
+            except OSError:
+                self.record(key, time.monotonic() - start, failed=True)
+                raise
+        self.record(key, time.monotonic() - start, failed=result.returncode != 0)
+
+        if cache_ttl and result.returncode == 0:
+            with self._lock:
+                self._memo[memo_key] = (time.monotonic() + cache_ttl, result)
+        return self._checked(result, check)
+
+    @staticmethod
+    def _checked(result, check):
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+        return result
+
+    def _stats_for(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _CommandStats()
+        return stats
+
+    def record(self, key, seconds, failed=False, timed_out=False):
+        """Account one execution of ``key``; also used by the asyncio runner."""
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.errors += failed or timed_out
+            stats.timeouts += timed_out
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        metrics.observe_command(key, seconds, failed, timed_out)
+        for observer in self.observers:
+            observer(key, seconds, failed, timed_out)
+
+    def clear_cache(self):
+        """Forget memoised output, e.g. after the configuration changed."""
+        with self._lock:
+            self._memo.clear()
+
+    def stats(self):
+        """Return {command key: counters and cumulative latency histogram}."""
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in sorted(self._stats.items())}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# Shared by every module of the process
+runner = CommandRunner()
+
+
+def run(argv, timeout=None, check=False, cache_ttl=None):
+    return runner.run(argv, timeout=timeout, check=check, cache_ttl=cache_ttl)
+
+
+def stats():
+    return runner.stats()
+
+
+def clear_cache():
+    runner.clear_cache()
+
+
+def set_backend(backend):
+    """Swap how commands are executed (e.g. a FakeBackend); returns the previous backend."""
+    previous = runner.backend
+    runner.backend = backend
+    runner.clear_cache()
+    return previous
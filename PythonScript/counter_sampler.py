@@ -0,0 +1,329 @@
+"""
+Per-interface traffic counters sampled once a second into ring buffers.
+
+One worker per service, the holder of ``lock_path``, samples rx/tx bytes,
+packets, errors and drops of every physical interface.  The counters come
+from a single RTM_GETLINK dump (IFLA_STATS64) per second rather than eight
+``/sys/class/net/<if>/statistics`` reads per port; sysfs is only read when
+netlink is not usable.  If the sampling worker dies another one takes over.
+
+Each interface has a fixed-size file in ``/dev/shm``, viewed as an array of
+unsigned 64-bit words, holding three rings:
+
+    resolution   slots   covers
+    1 s          3600    1 hour
+    1 min        1440    1 day
+    1 h           720    30 days
+
+A slot is a timestamp and the eight counters, so a file is always
+``FILE_BYTES`` (about 405 KiB) and at most ``MAX_INTERFACES`` files exist.
+The coarser rings keep the first sample of each minute or hour; counters
+are cumulative, so the difference between any two slots is the exact
+traffic in between and rates can be computed for any step.  Counter resets
+(link re-created, driver reload) are folded in so stored values only grow.
+
+Reads are seqlock style like ``shared_snapshot``; every worker can answer.
+History survives service restarts, not reboots.
+"""
+import bisect
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+import netlink
+from interface_collector import is_physical_interface
+
+SHM_DIR = '/dev/shm/network-configuration/stats'
+LOCK_PATH = '/run/network-configuration/counter-sampler.lock'
+SYS_CLASS_NET = '/sys/class/net'
+
+# In rtnl_link_stats64 order; also the sysfs statistics file names
+COUNTERS = ('rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes',
+            'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped')
+_STATS64 = struct.Struct(f"={len(COUNTERS)}Q")
+
+# (seconds per slot, slots)
+LEVELS = ((1, 3600), (60, 1440), (3600, 720))
+MAX_INTERFACES = 64
+
+FORMAT = 0x4e43535401           # "NCST" v1
+# format, seq, then the number of samples ever written to each level
+HEADER_WORDS = 2 + len(LEVELS)
+SLOT_WORDS = 1 + len(COUNTERS)
+LEVEL_OFFSETS = tuple(HEADER_WORDS + SLOT_WORDS * sum(slots for _step, slots in LEVELS[:i])
+                      for i in range(len(LEVELS)))
+FILE_WORDS = HEADER_WORDS + SLOT_WORDS * sum(slots for _step, slots in LEVELS)
+FILE_BYTES = 8 * FILE_WORDS
+
+SAMPLE_SECONDS = 1.0
+# Upper bound on points in one /network-stats answer, and the default
+MAX_POINTS = 3600
+DEFAULT_POINTS = 300
+READ_RETRIES = 100
+
+
+def read_sysfs_counters(ifname):
+    values = []
+    for counter in COUNTERS:
+        with open(os.path.join(SYS_CLASS_NET, ifname, 'statistics', counter)) as f:
+            values.append(int(f.read()))
+    return tuple(values)
+
+
+class CounterSampler:
+    def __init__(self, shm_dir=SHM_DIR, lock_path=LOCK_PATH, is_physical=is_physical_interface):
+        self.shm_dir = shm_dir
+        self.lock_path = lock_path
+        self._is_physical = is_physical
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        # Sampling worker only
+        self._nl = None
+        self._physical = {}     # ifname -> is physical
+        self._rings = {}        # ifname -> [mmap, words, last raw counters, totals]
+        self._warned_full = False
+
+    def path(self, ifname):
+        return os.path.join(self.shm_dir, f"{ifname}.ring")
+
+    # -- sampling -----------------------------------------------------------
+
+    def read_counters(self):
+        """{ifname: counters} for every physical interface."""
+        try:
+            if self._nl is None:
+                self._nl = netlink.NetlinkSocket()
+            payloads = self._nl.dump(netlink.RTM_GETLINK)
+        except OSError as e:
+            if self._nl is not None:
+                self._nl.close()
+                self._nl = None
+            print(f"Netlink link statistics unavailable, reading sysfs: {e}")
+            return {ifname: read_sysfs_counters(ifname)
+                    for ifname in os.listdir(SYS_CLASS_NET) if self._physical_name(ifname)}
+        counters = {}
+        for _type, payload in payloads:
+            _index, ifname, stats = netlink.parse_link_stats(payload)
+            if stats is not None and self._physical_name(ifname):
+                counters[ifname] = _STATS64.unpack_from(stats)
+        return counters
+
+    def _physical_name(self, ifname):
+        physical = self._physical.get(ifname)
+        if physical is None:
+            physical = self._physical[ifname] = self._is_physical(ifname)
+        return physical
+
+    def _open_ring(self, ifname):
+        os.makedirs(self.shm_dir, exist_ok=True)
+        fd = os.open(self.path(ifname), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != FILE_BYTES:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, FILE_BYTES)
+            mm = mmap.mmap(fd, FILE_BYTES)
+        finally:
+            os.close(fd)
+        words = memoryview(mm).cast('Q')
+        if words[0] != FORMAT:
+            words[:HEADER_WORDS] = memoryview(bytes(8 * HEADER_WORDS)).cast('Q')
+            words[0] = FORMAT
+        # Continue from the stored totals so they keep growing across restarts
+        totals = list(_latest(words, 0)[1:]) if words[2] else [0] * len(COUNTERS)
+        return [mm, words, None, totals]
+
+    def record(self, samples, now):
+        """Append one sample per interface: {ifname: raw counters} taken at ``now`` (seconds)."""
+        for ifname, raw in samples.items():
+            ring = self._rings.get(ifname)
+            if ring is None:
+                if len(self._rings) >= MAX_INTERFACES:
+                    if not self._warned_full:
+                        print(f"Counter sampler is full ({MAX_INTERFACES} interfaces); not sampling {ifname}")
+                        self._warned_full = True
+                    continue
+                ring = self._rings[ifname] = self._open_ring(ifname)
+            _mm, words, previous, totals = ring
+            if previous is not None:
+                for i, value in enumerate(raw):
+                    # A counter that went backwards was reset and counts from zero
+                    totals[i] += value - previous[i] if value >= previous[i] else value
+            ring[2] = raw
+            if previous is None and words[2]:
+                continue  # first reading after a restart only sets the baseline
+            self._append(words, now, totals)
+
+    @staticmethod
+    def _append(words, now, totals):
+        seq = words[1]
+        words[1] = seq + 1
+        for level, (step, slots) in enumerate(LEVELS):
+            count = words[2 + level]
+            if count and _latest(words, level)[0] // step == now // step:
+                continue
+            offset = LEVEL_OFFSETS[level] + (count % slots) * SLOT_WORDS
+            words[offset] = now
+            words[offset + 1:offset + SLOT_WORDS] = memoryview(_STATS64.pack(*totals)).cast('Q')
+            words[2 + level] = count + 1
+        words[1] = seq + 2
+
+    def sample(self):
+        self.record(self.read_counters(), int(time.time()))
+
+    # -- leader election ----------------------------------------------------
+
+    def ensure_thread(self):
+        # Started lazily so each gunicorn worker gets its own candidate thread
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True, name='counter-sampler').start()
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Blocks until this worker becomes the one that samples
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            print(f"Counter sampler unavailable: {e}")
+            return
+        while True:
+            # On the second boundary, so every slot is one second apart
+            time.sleep(SAMPLE_SECONDS - time.time() % SAMPLE_SECONDS)
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling interface counters: {e}")
+
+    # -- reading ------------------------------------------------------------
+
+    def interfaces(self):
+        try:
+            names = os.listdir(self.shm_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.ring')] for name in names if name.endswith('.ring'))
+
+    def _map(self, ifname):
+        try:
+            fd = os.open(self.path(ifname), os.O_RDONLY)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            if os.fstat(fd).st_size != FILE_BYTES:
+                return None
+            return mmap.mmap(fd, FILE_BYTES, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+    def latest(self):
+        """{ifname: {counter: per-second rate over the last second}}."""
+        rates = {}
+        for ifname in self.interfaces():
+            rows = self.read(ifname, 0, 0, math.inf, last=2)
+            if rows is not None and len(rows) == 2 and rows[1][0] > rows[0][0]:
+                rates[ifname] = _rates(rows[0], rows[1])
+        return rates
+
+    def read(self, ifname, level, start, end, last=None):
+        """Rows (time, *counters) of one level with start <= time <= end, plus the row before start."""
+        mm = None if '/' in ifname else self._map(ifname)
+        if mm is None:
+            return None
+        with mm:
+            words = memoryview(mm).cast('Q')
+            try:
+                if words[0] != FORMAT:
+                    return None
+                for _ in range(READ_RETRIES):
+                    seq = words[1]
+                    if seq & 1:
+                        time.sleep(0)
+                        continue
+                    rows = _level_rows(words, level, start, end, last)
+                    if words[1] == seq:
+                        return rows
+                return None
+            finally:
+                words.release()
+
+    def series(self, ifname, start, end, step=None):
+        """
+        Per-second rates of every counter for each ``step`` seconds from
+        ``start`` to ``end``, read from the finest ring that still covers
+        ``start``.  Returns None for an unknown interface; raises ValueError
+        for an unusable range or step.
+        """
+        if end <= start:
+            raise ValueError("from must be before to")
+        if step is None:
+            step = max(1, math.ceil((end - start) / DEFAULT_POINTS))
+        if step < 1:
+            raise ValueError("step must be at least 1 second")
+        if (end - start) / step > MAX_POINTS:
+            raise ValueError(f"at most {MAX_POINTS} points; use a larger step")
+
+        now = time.time()
+        usable = [level for level, (level_step, _slots) in enumerate(LEVELS) if level_step <= step]
+        level = next((level for level in usable if now - LEVELS[level][0] * LEVELS[level][1] <= start), usable[-1])
+        resolution = LEVELS[level][0]
+
+        first = start // step * step
+        boundaries = list(range(first, end + step, step))
+        rows = self.read(ifname, level, first - step - resolution, boundaries[-1])
+        if rows is None:
+            return None
+        times = [row[0] for row in rows]
+
+        def at(boundary):
+            # The last sample at or before the boundary, if it is recent enough
+            i = bisect.bisect_right(times, boundary) - 1
+            return rows[i] if i >= 0 and times[i] > boundary - step - resolution else None
+
+        samples = [at(boundary) for boundary in boundaries]
+        columns = {'time': boundaries[:-1]}
+        columns.update({counter: [] for counter in COUNTERS})
+        for before, after in zip(samples, samples[1:]):
+            rates = _rates(before, after) if before and after and after[0] > before[0] else {}
+            for counter in COUNTERS:
+                columns[counter].append(rates.get(counter))
+        return {'iface': ifname, 'from': first, 'to': boundaries[-1], 'step': step, 'resolution': resolution,
+                'unit': 'per second', 'columns': columns}
+
+
+def _latest(words, level):
+    count = words[2 + level]
+    slots = LEVELS[level][1]
+    offset = LEVEL_OFFSETS[level] + ((count - 1) % slots) * SLOT_WORDS
+    return tuple(words[offset:offset + SLOT_WORDS])
+
+
+def _level_rows(words, level, start, end, last=None):
+    count = words[2 + level]
+    slots = LEVELS[level][1]
+    available = min(count, slots)
+    oldest = count - available
+    base = LEVEL_OFFSETS[level]
+
+    def slot(j):
+        return base + ((oldest + j) % slots) * SLOT_WORDS
+
+    if last is not None:
+        lo, hi = max(0, available - last), available
+    else:
+        # Slots are in time order from the oldest one
+        positions = range(available)
+        lo = max(0, bisect.bisect_left(positions, start, key=lambda j: words[slot(j)]) - 1)
+        hi = bisect.bisect_right(positions, end, key=lambda j: words[slot(j)])
+    return [tuple(words[slot(j):slot(j) + SLOT_WORDS]) for j in range(lo, hi)]
+
+
+def _rates(before, after):
+    elapsed = after[0] - before[0]
+    return {counter: round((after[i + 1] - before[i + 1]) / elapsed, 3) for i, counter in enumerate(COUNTERS)}
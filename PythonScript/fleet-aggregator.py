@@ -0,0 +1,101 @@
+import subprocess
+from flask import Flask, jsonify, request
+from flask_cors import CORS
+import argparse
+import os
+
+import request_timing
+from fleet_poller import SEARCH_LIMIT, FleetPoller, load_config
+
+# Appliances to poll, see fleet_poller for the format
+FLEET_CONFIG = os.environ.get('FLEET_CONFIG', '/etc/network-configuration/fleet.json')
+
+app = Flask(__name__)
+CORS(app, resources={r"/*": {"origins": "*"}})
+# Server-Timing on every response, cProfile on request from localhost
+request_timing.install(app)
+
+def load_fleet(path):
+    try:
+        return load_config(path)
+    except FileNotFoundError:
+        print(f"No fleet config at {path}; serving an empty fleet")
+    except (OSError, ValueError) as e:
+        print(f"Invalid fleet config {path}: {e}")
+    return []
+
+fleet = FleetPoller(load_fleet(FLEET_CONFIG))
+
+@app.before_request
+def start_polling():
+    fleet.ensure_polling()
+    # The first request of a new process waits for one round instead of an empty view
+    fleet.wait_for_first_round()
+
+# API endpoint summarising every appliance: status, errors, data age and counts
+@app.route('/fleet', methods=['GET'])
+def fleet_summary():
+    return jsonify(fleet.summary())
+
+# API endpoint to poll every appliance now instead of waiting for the next round
+@app.route('/fleet/refresh', methods=['POST'])
+def fleet_refresh():
+    fleet.poll()
+    return jsonify(fleet.summary())
+
+# API endpoint merging /network-info of every appliance
+@app.route('/fleet/network-info', methods=['GET'])
+def fleet_network_info():
+    return jsonify({name: {'status': document['status'],
+                           'network_info': (document['data'] or {}).get('network_info') or {}}
+                    for name, document in fleet.documents('network_info').items()})
+
+# API endpoint merging /arp of every appliance, optionally for one appliance
+@app.route('/fleet/arp', methods=['GET'])
+def fleet_arp():
+    appliance = request.args.get('appliance')
+    documents = fleet.documents('arp')
+    if appliance is not None and appliance not in documents:
+        return jsonify({'error': 'Appliance not found.'}), 404
+    entries = []
+    for name, document in documents.items():
+        if appliance is None or name == appliance:
+            entries.extend({'appliance': name, **entry} for entry in document['data'] or [])
+    return jsonify(entries)
+
+# API endpoint finding an IP (address, CIDR or prefix), MAC (full or prefix) or text across the fleet
+@app.route('/fleet/search', methods=['GET'])
+def fleet_search():
+    ip = request.args.get('ip')
+    mac = request.args.get('mac')
+    q = request.args.get('q')
+    if not (ip or mac or q):
+        return jsonify({'error': 'Give at least one of ip, mac or q'}), 400
+    try:
+        hits = fleet.index.search(ip=ip, mac=mac, q=q, limit=request.args.get('limit', SEARCH_LIMIT, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'count': len(hits), 'hits': hits})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Poll many appliances and serve a merged, searchable fleet view.")
+    parser.add_argument('--config', default=FLEET_CONFIG)
+    parser.add_argument('--bind', default='0.0.0.0:5003')
+    args = parser.parse_args()
+
+    try:
+        load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Cannot use fleet config {args.config}: {e}")
+        raise SystemExit(1)
+
+    script_filename = os.path.basename(__file__).replace('.py', '')
+    # One worker: the poller, its connection pool and the merged view live in-process
+    subprocess.run([
+        'gunicorn',
+        '-w', '1',
+        '-k', 'gthread',
+        '--threads', '16',
+        '-b', args.bind,
+        f"{script_filename}:app",
+    ], env={**os.environ, 'FLEET_CONFIG': args.config})
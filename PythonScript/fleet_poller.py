@@ -0,0 +1,411 @@
+"""
+Concurrent poller behind fleet-aggregator.py.
+
+Each round fetches ``/network-info`` and ``/arp`` from every appliance in
+parallel:
+
+* connections are kept alive and reused per host (``ConnectionPool``), so a
+  warm round costs no TCP handshakes
+* documents are requested with If-None-Match; an unchanged one comes back as
+  an empty 304 and the previous copy is kept
+* every request has a per-host timeout and the round has an overall
+  deadline; an appliance that misses it keeps its last good data, marked
+  stale, and does not hold up the others
+* the merged view is indexed by IP and MAC after each round, so searches do
+  not rescan the fleet
+
+Appliances come from a JSON config, either a list or {"appliances": [...]}
+of:
+
+* ``"10.0.0.5"`` -- a host running the two backends on 5001 and 5002
+* ``"http://10.0.0.5:5000"`` -- a UI server (static_ui.py) with /api1, /api2
+* ``{"name": ..., "host": ...}``, ``{"name": ..., "url": ...}`` or
+  ``{"name": ..., "network_url": ..., "arp_url": ...}``
+"""
+import bisect
+import concurrent.futures
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from neighbor_index import ip_to_int, normalize_mac_prefix, parse_ip_prefix
+
+NETWORK_PORT = 5001
+ARP_PORT = 5002
+# Seconds allowed per request to one appliance, and for a whole round
+HOST_TIMEOUT = 3.0
+ROUND_DEADLINE = 5.0
+POLL_INTERVAL = 10.0
+MAX_CONCURRENCY = 32
+MAX_IDLE_PER_HOST = 2
+SEARCH_LIMIT = 1000
+
+# document -> (backend, path)
+DOCUMENTS = {
+    'network_info': ('network', '/network-info'),
+    'arp': ('arp', '/arp'),
+}
+ACCEPT_ENCODING = 'zstd, gzip' if zstandard is not None else 'gzip'
+
+
+class FleetConfigError(ValueError):
+    """Raised for an appliance list that cannot be used."""
+
+
+class Appliance:
+    def __init__(self, name, network_url, arp_url):
+        self.name = name
+        self.urls = {'network': network_url.rstrip('/'), 'arp': arp_url.rstrip('/')}
+        # document -> {'etag', 'data', 'updated', 'error'}
+        self.documents = {document: {'etag': None, 'data': None, 'updated': None, 'error': None}
+                          for document in DOCUMENTS}
+
+
+def parse_appliance(item):
+    if isinstance(item, str):
+        item = {'url': item} if '://' in item else {'host': item}
+    if not isinstance(item, dict):
+        raise FleetConfigError(f"Expected a host, URL or object, got {item!r}")
+    if item.get('network_url') and item.get('arp_url'):
+        network_url, arp_url = item['network_url'], item['arp_url']
+    elif item.get('url'):
+        base = item['url'].rstrip('/')
+        network_url, arp_url = f"{base}/api1", f"{base}/api2"
+    elif item.get('host'):
+        host = item['host']
+        network_url, arp_url = f"http://{host}:{NETWORK_PORT}", f"http://{host}:{ARP_PORT}"
+    else:
+        raise FleetConfigError(f"Appliance needs host, url or network_url and arp_url: {item!r}")
+    for url in (network_url, arp_url):
+        try:
+            parts = urlsplit(url)
+            parts.port
+        except ValueError as e:
+            raise FleetConfigError(f"Invalid URL {url!r}: {e}")
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FleetConfigError(f"Unsupported URL {url!r}")
+    name = item.get('name') or item.get('host') or urlsplit(network_url).netloc
+    return Appliance(name, network_url, arp_url)
+
+
+def parse_appliances(config):
+    """Build Appliance objects from a loaded fleet config."""
+    if isinstance(config, dict):
+        config = config.get('appliances')
+    if not isinstance(config, list):
+        raise FleetConfigError("Expected a list of appliances")
+    appliances = [parse_appliance(item) for item in config]
+    names = [appliance.name for appliance in appliances]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise FleetConfigError(f"Duplicate appliance names: {', '.join(duplicates)}")
+    return appliances
+
+
+def load_config(path):
+    with open(path) as f:
+        return parse_appliances(json.load(f))
+
+
+def decode_body(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port)."""
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST):
+        self.max_idle_per_host = max_idle_per_host
+        self._lock = threading.Lock()
+        self._idle = {}
+        self.stats = {'connections': 0, 'requests': 0, 'not_modified': 0, 'bytes': 0}
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self._count(connections=1)
+        return connection_class(host, port), False
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def get(self, url, headers, timeout):
+        """GET ``url`` and return (status, headers, raw body)."""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        while True:
+            connection, reused = self._checkout(key)
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request('GET', path or '/', headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine):
+                connection.close()
+                # The server closed an idle connection; retry on another one
+                if reused:
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+            self._count(requests=1, bytes=len(body), not_modified=int(response.status == 304))
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(key, connection)
+            return response.status, response.headers, body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def fetch_document(pool, url, state, timeout):
+    """Refresh one document ``state`` dict with a conditional GET."""
+    headers = {'Accept': 'application/json', 'Accept-Encoding': ACCEPT_ENCODING}
+    if state['etag'] and state['data'] is not None:
+        headers['If-None-Match'] = state['etag']
+    status, response_headers, body = pool.get(url, headers, timeout)
+    if status == 304:
+        return state['etag'], state['data']
+    if status != 200:
+        raise ValueError(f"HTTP {status} from {url}")
+    data = json.loads(decode_body(body, response_headers.get('Content-Encoding')))
+    return response_headers.get('ETag'), data
+
+
+class FleetIndex:
+    """IP and MAC lookups over the interfaces and ARP entries of every appliance."""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.ip_order = sorted((hit['ip_int'], i) for i, hit in enumerate(hits) if hit['ip_int'] is not None)
+        self.mac_order = sorted((hit['mac'], i) for i, hit in enumerate(hits) if hit['mac'])
+
+    @classmethod
+    def build(cls, appliances, stale):
+        hits = []
+        for appliance in appliances:
+            network_info = appliance.documents['network_info']['data'] or {}
+            for iface, record in sorted((network_info.get('network_info') or {}).items()):
+                hits.append(_hit(appliance.name, 'interface', iface, record.get('IP Address'), None,
+                                 appliance.name in stale))
+            for entry in appliance.documents['arp']['data'] or []:
+                hits.append(_hit(appliance.name, 'arp', entry.get('iface'), entry.get('ip'), entry.get('mac'),
+                                 appliance.name in stale))
+        return cls(hits)
+
+    def search(self, ip=None, mac=None, q=None, limit=SEARCH_LIMIT):
+        """
+        Hits matching every given filter: ``ip`` is an address, CIDR or dotted
+        prefix, ``mac`` a full or partial MAC, ``q`` a substring of the
+        appliance, interface, IP or MAC.  Raises ValueError for a bad filter
+        or a ``limit`` below 1.
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        selected = None
+        if ip:
+            low, high = parse_ip_prefix(ip)
+            start = bisect.bisect_left(self.ip_order, (low, -1))
+            end = bisect.bisect_right(self.ip_order, (high, len(self.hits)))
+            selected = {i for _ip, i in self.ip_order[start:end]}
+        if mac:
+            prefix = normalize_mac_prefix(mac)
+            if not prefix:
+                raise ValueError("mac must contain hex digits")
+            matches = set()
+            for position in range(bisect.bisect_left(self.mac_order, (prefix, -1)), len(self.mac_order)):
+                value, i = self.mac_order[position]
+                if not value.startswith(prefix):
+                    break
+                matches.add(i)
+            selected = matches if selected is None else selected & matches
+        candidates = range(len(self.hits)) if selected is None else sorted(selected)
+        results = []
+        needle = q.lower() if q else None
+        for i in candidates:
+            hit = self.hits[i]
+            if needle and not any(needle in (hit[field] or '').lower()
+                                  for field in ('appliance', 'interface', 'ip', 'mac')):
+                continue
+            if len(results) >= limit:
+                break
+            results.append({key: value for key, value in hit.items() if key != 'ip_int'})
+        return results
+
+
+def _hit(appliance, source, interface, ip, mac, stale):
+    try:
+        ip_int = ip_to_int(ip) if ip else None
+    except OSError:
+        # "No IP" and other placeholders
+        ip, ip_int = None, None
+    return {'appliance': appliance, 'source': source, 'interface': interface, 'ip': ip,
+            'mac': mac.lower() if mac else None, 'stale': stale, 'ip_int': ip_int}
+
+
+class FleetPoller:
+    def __init__(self, appliances, host_timeout=HOST_TIMEOUT, deadline=ROUND_DEADLINE,
+                 interval=POLL_INTERVAL, max_workers=MAX_CONCURRENCY):
+        self.appliances = {appliance.name: appliance for appliance in appliances}
+        self.host_timeout = host_timeout
+        self.deadline = deadline
+        self.interval = interval
+        self.max_workers = max_workers
+        self.pool = ConnectionPool()
+        self._lock = threading.Lock()
+        self._round_lock = threading.Lock()
+        self._in_flight = set()     # (appliance name, document)
+        self._executor = None
+        self._executor_pid = None
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+        self._first_round_lock = threading.Lock()
+        self.index = FleetIndex([])
+        self.last_round = None      # {'started', 'seconds', 'complete', 'late'}
+
+    def _get_executor(self):
+        # Pools don't survive a fork; each process makes its own
+        with self._start_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix='fleet')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _fetch(self, appliance, document, deadline):
+        backend, path = DOCUMENTS[document]
+        state = appliance.documents[document]
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("round deadline passed before the request started")
+            etag, data = fetch_document(self.pool, appliance.urls[backend] + path, state,
+                                        min(self.host_timeout, remaining))
+            with self._lock:
+                if data is not state['data']:
+                    state.update(etag=etag, data=data)
+                state.update(updated=time.time(), error=None)
+        except Exception as e:
+            with self._lock:
+                state['error'] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        finally:
+            with self._lock:
+                self._in_flight.discard((appliance.name, document))
+
+    def poll(self):
+        """Run one round, returning once every appliance answered or the deadline passed."""
+        with self._round_lock:
+            started = time.time()
+            start = time.monotonic()
+            deadline = start + self.deadline
+            executor = self._get_executor()
+            futures = []
+            with self._lock:
+                for appliance in self.appliances.values():
+                    for document in DOCUMENTS:
+                        key = (appliance.name, document)
+                        # A request still waiting on its timeout is not sent again
+                        if key in self._in_flight:
+                            continue
+                        self._in_flight.add(key)
+                        futures.append(executor.submit(self._fetch, appliance, document, deadline))
+            _done, late = concurrent.futures.wait(futures, timeout=self.deadline)
+            with self._lock:
+                for appliance in self.appliances.values():
+                    for document in DOCUMENTS:
+                        if (appliance.name, document) in self._in_flight:
+                            appliance.documents[document]['error'] = "no answer before the round deadline"
+                stale = {name for name, appliance in self.appliances.items()
+                         if any(state['error'] for state in appliance.documents.values())}
+                self.index = FleetIndex.build(self.appliances.values(), stale)
+                self.last_round = {'started': started, 'seconds': round(time.monotonic() - start, 4),
+                                   'complete': not late, 'late': len(late)}
+            return self.last_round
+
+    def ensure_polling(self):
+        """Start the background round thread of this process, if it is not running."""
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True, name='fleet-poller').start()
+
+    def wait_for_first_round(self):
+        """Run the first round of this process unless it has been done already."""
+        with self._first_round_lock:
+            if self.last_round is None:
+                self.poll()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Fleet poll failed: {e}")
+
+    def status(self, appliance):
+        states = appliance.documents.values()
+        if all(state['updated'] is None for state in states):
+            return 'error' if any(state['error'] for state in states) else 'pending'
+        return 'stale' if any(state['error'] for state in states) else 'ok'
+
+    def summary(self):
+        now = time.time()
+        with self._lock:
+            appliances = []
+            for name, appliance in sorted(self.appliances.items()):
+                network_info = (appliance.documents['network_info']['data'] or {}).get('network_info') or {}
+                updated = [state['updated'] for state in appliance.documents.values() if state['updated']]
+                appliances.append({
+                    'name': name,
+                    'urls': appliance.urls,
+                    'status': self.status(appliance),
+                    'errors': {document: state['error'] for document, state in appliance.documents.items()
+                               if state['error']},
+                    'age_seconds': round(now - min(updated), 1) if updated else None,
+                    'interfaces': len(network_info),
+                    'arp_entries': len(appliance.documents['arp']['data'] or []),
+                })
+            return {'appliances': appliances, 'last_round': self.last_round, 'connections': dict(self.pool.stats)}
+
+    def documents(self, document):
+        """{appliance: {'status', 'data'}} for one document type."""
+        with self._lock:
+            return {name: {'status': self.status(appliance), 'data': appliance.documents[document]['data']}
+                    for name, appliance in sorted(self.appliances.items())}
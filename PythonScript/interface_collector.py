@@ -0,0 +1,193 @@
+"""
+Interface collector backed by rtnetlink.
+
+Builds the same ``network_info`` records as the original subprocess based
+``get_available_interfaces()`` but reads links, addresses and default routes
+from one netlink socket instead of forking ``ip``/``networkctl`` per interface.
+DNS servers and DHCP leases come from networkd's state files (see
+``networkd_state``), or from a single ``resolvectl`` call for all links where
+networkd keeps no state.
+
+``get_interface()`` collects a single interface, running only the lookups
+the requested fields need.
+"""
+import errno
+import os
+import re
+import socket
+
+import command_runner
+import netlink
+import networkd_state
+from request_timing import stage
+
+SYS_CLASS_NET = '/sys/class/net'
+RESOLVECTL_TIMEOUT = 3.0
+# Rebuilds triggered by a burst of link events share one resolvectl call
+RESOLVECTL_CACHE_TTL = 1.0
+
+# Fields of a network_info record, in response order
+FIELDS = ("Status", "IP Address", "Subnet Mask", "DHCP Status", "Gateway", "DNS", "DHCP Lease")
+# Short names accepted by ?fields= besides the record field names
+_FIELD_ALIASES = {"ip": "IP Address", "subnet": "Subnet Mask", "mask": "Subnet Mask", "dhcp": "DHCP Status",
+                  "lease": "DHCP Lease"}
+
+_RESOLVECTL_LINK = re.compile(r'^Link \d+ \((?P<ifname>[^)]+)\)')
+
+
+def is_physical_interface(ifname):
+    """Physical interfaces are the ones backed by a device in sysfs."""
+    return os.path.exists(os.path.join(SYS_CLASS_NET, ifname, 'device'))
+
+
+def parse_resolvectl_status(output):
+    """Split ``resolvectl status`` output into {ifname: [dns servers]}."""
+    dns = {}
+    current = None
+    for line in output.splitlines():
+        match = _RESOLVECTL_LINK.match(line)
+        if match:
+            current = dns.setdefault(match.group('ifname'), [])
+            continue
+        if current is not None and "DNS Servers:" in line:
+            current.extend(line.split("DNS Servers:")[1].strip().split())
+    return dns
+
+
+def get_dns_for_all_interfaces():
+    """Fetch per-link DNS servers with one resolvectl call."""
+    try:
+        result = command_runner.run(['resolvectl', 'status'], timeout=RESOLVECTL_TIMEOUT, cache_ttl=RESOLVECTL_CACHE_TTL)
+        return parse_resolvectl_status(result.stdout)
+    except Exception as e:
+        print(f"Error fetching DNS information: {e}")
+        return {}
+
+
+def get_dns_for_interface(ifname):
+    """Fetch the DNS servers of one link with ``resolvectl status <ifname>``."""
+    try:
+        result = command_runner.run(['resolvectl', 'status', ifname], timeout=RESOLVECTL_TIMEOUT,
+                                    cache_ttl=RESOLVECTL_CACHE_TTL)
+        return parse_resolvectl_status(result.stdout)
+    except Exception as e:
+        print(f"Error fetching DNS for {ifname}: {e}")
+        return {}
+
+
+def get_dns_and_leases(links, resolvectl=get_dns_for_all_interfaces):
+    """
+    ({ifname: dns servers}, {ifname: lease}) of decoded links: from networkd's
+    state files when it keeps them, else DNS from ``resolvectl()`` and no leases.
+    """
+    current = networkd_state.state.by_name({link['index']: link['ifname'] for link in links})
+    if current is None:
+        return resolvectl(), {}
+    return current
+
+
+def _field_key(name):
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+
+def parse_fields(value):
+    """
+    Map a comma separated ?fields= value to record field names.
+
+    Accepts the field names in any case, with or without spaces or
+    underscores ("ip_address"), and the aliases ip, subnet, mask, dhcp and
+    lease.
+    An empty value means every field; raises ValueError for unknown names.
+    """
+    if not value:
+        return FIELDS
+    known = {_field_key(field): field for field in FIELDS}
+    known.update(_FIELD_ALIASES)
+    selected = set()
+    for name in value.split(','):
+        field = known.get(_field_key(name))
+        if field is None:
+            raise ValueError(f"Unknown field {name.strip()!r}; expected some of {', '.join(FIELDS)}")
+        selected.add(field)
+    return tuple(field for field in FIELDS if field in selected)
+
+
+def default_gateways(routes):
+    """Map ifindex -> gateway of its best main-table default route.
+
+    IPv4 gateways win over IPv6 ones, then the lowest metric wins.
+    """
+    best = {}
+    for route in routes:
+        if (route['dst_len'] != 0 or route['table'] != netlink.RT_TABLE_MAIN
+                or route['type'] != netlink.RTN_UNICAST or not route['gateway']
+                or route['oif'] is None):
+            continue
+        rank = (route['family'] != socket.AF_INET, route['metric'])
+        current = best.get(route['oif'])
+        if current is None or rank < current[0]:
+            best[route['oif']] = (rank, route['gateway'])
+    return {index: gateway for index, (_rank, gateway) in best.items()}
+
+
+def build_network_info(links, addrs, routes, dns, leases=None, is_physical=is_physical_interface):
+    """Assemble ``network_info`` records from decoded netlink dumps."""
+    ipv4 = {}
+    for addr in addrs:
+        # Keep the first IPv4 address per link, like the first "inet" line
+        # of `ip addr show`.
+        if addr['family'] == socket.AF_INET and addr['index'] not in ipv4:
+            ipv4[addr['index']] = addr
+    gateways = default_gateways(routes)
+
+    interfaces = {}
+    for link in links:
+        ifname = link['ifname']
+        if not is_physical(ifname):
+            continue
+        addr = ipv4.get(link['index'])
+        servers = dns.get(ifname)
+        interfaces[ifname] = {
+            "Status": "Up" if link['operstate'] == "UP" else "Down",
+            "IP Address": addr['address'] if addr else "No IP",
+            "Subnet Mask": str(addr['prefixlen']) if addr else "No Subnet",
+            "DHCP Status": "Unknown",  # Will fetch from Netplan
+            "Gateway": gateways.get(link['index'], "N/A"),
+            "DNS": ', '.join(servers) if servers else "N/A",
+            "DHCP Lease": (leases or {}).get(ifname),
+        }
+    return interfaces
+
+
+def get_available_interfaces():
+    """Collect every physical interface from one netlink session."""
+    with stage('netlink'):
+        links, addrs, routes = netlink.dump_state()
+    dns, leases = get_dns_and_leases(links)
+    # Dominated by the per-link sysfs lookups of is_physical_interface
+    with stage('sysfs'):
+        return build_network_info(links, addrs, routes, dns, leases)
+
+
+def get_interface(ifname, fields=FIELDS, is_physical=is_physical_interface):
+    """
+    Collect ``fields`` of one physical interface, or None if there is no such interface.
+
+    Only one link lookup is always made; the address dump, route dump and
+    DNS/lease lookup run only for the fields that need them.
+    """
+    if not is_physical(ifname):
+        return None
+    with stage('netlink'):
+        try:
+            link, addrs, routes = netlink.dump_link_state(
+                ifname, addrs="IP Address" in fields or "Subnet Mask" in fields, routes="Gateway" in fields)
+        except netlink.NetlinkError as e:
+            if e.errno == errno.ENODEV:
+                return None
+            raise
+    dns, leases = {}, {}
+    if "DNS" in fields or "DHCP Lease" in fields:
+        dns, leases = get_dns_and_leases([link], resolvectl=lambda: get_dns_for_interface(ifname) if "DNS" in fields else {})
+    record = build_network_info([link], addrs, routes, dns, leases, is_physical=lambda _ifname: True)[ifname]
+    return {field: record[field] for field in fields}
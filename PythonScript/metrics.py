@@ -0,0 +1,156 @@
+"""
+Prometheus metrics for the Flask apps.
+
+``install(app, service)`` adds a ``/metrics`` endpoint in the Prometheus
+text format and records per-route request latency.  The other modules report
+through the functions below (collector stages, commands, cache lookups, ARP
+table size, netplan applies); they are no-ops until ``install`` ran.
+
+Gunicorn workers are separate processes, so values are kept in
+prometheus_client's multiprocess mode: each worker writes its own files under
+METRICS_DIR/<service> and ``/metrics`` sums them, whichever worker answers.
+The directory is emptied when the service starts.
+
+prometheus_client is optional (``apt install python3-prometheus-client``);
+without it ``/metrics`` answers 503 and nothing is recorded.
+"""
+import atexit
+import os
+import shutil
+import time
+
+from flask import g, jsonify, request
+
+METRICS_DIR = '/run/network-configuration/metrics'
+
+# Buckets (seconds) per kind of measurement
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+APPLY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_metrics = None
+
+
+def metrics_dir(service):
+    return os.path.join(METRICS_DIR, service)
+
+
+def reset(service):
+    """Drop the values of previous runs; call before the workers start."""
+    shutil.rmtree(metrics_dir(service), ignore_errors=True)
+
+
+def _create(service):
+    # Multiprocess mode is chosen when prometheus_client is first imported
+    directory = metrics_dir(service)
+    os.makedirs(directory, exist_ok=True)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = directory
+    import prometheus_client
+    from prometheus_client import multiprocess
+
+    from command_runner import LATENCY_BUCKETS
+
+    atexit.register(lambda: multiprocess.mark_process_dead(os.getpid()))
+    return {
+        'client': prometheus_client,
+        'multiprocess': multiprocess,
+        'directory': directory,
+        'requests': prometheus_client.Histogram(
+            'network_config_http_request_duration_seconds', 'HTTP request latency by route.',
+            ['method', 'route', 'status'], buckets=REQUEST_BUCKETS),
+        'stages': prometheus_client.Histogram(
+            'network_config_collector_stage_seconds', 'Time spent per collector stage within a request.',
+            ['stage'], buckets=STAGE_BUCKETS),
+        'commands': prometheus_client.Histogram(
+            'network_config_command_duration_seconds', 'External command latency.',
+            ['command'], buckets=LATENCY_BUCKETS),
+        'command_results': prometheus_client.Counter(
+            'network_config_commands_total', 'External commands executed (processes forked).',
+            ['command', 'result']),
+        'cache': prometheus_client.Counter(
+            'network_config_cache_lookups_total', 'Cache lookups by cache and result (hit or miss).',
+            ['cache', 'result']),
+        'arp_entries': prometheus_client.Gauge(
+            'network_config_arp_entries', 'Entries in the ARP table.',
+            ['kind'], multiprocess_mode='livemax'),
+        'apply': prometheus_client.Histogram(
+            'network_config_netplan_apply_seconds', 'Duration of netplan applies by path.',
+            ['path'], buckets=APPLY_BUCKETS),
+        'apply_failures': prometheus_client.Counter(
+            'network_config_netplan_apply_failures_total', 'Failed netplan applies by path.',
+            ['path']),
+    }
+
+
+def observe_stage(stage, seconds):
+    if _metrics is not None:
+        _metrics['stages'].labels(stage).observe(seconds)
+
+
+def observe_command(key, seconds, failed=False, timed_out=False):
+    if _metrics is not None:
+        _metrics['commands'].labels(key).observe(seconds)
+        result = 'timeout' if timed_out else 'error' if failed else 'ok'
+        _metrics['command_results'].labels(key, result).inc()
+
+
+def cache_lookup(cache, hit):
+    if _metrics is not None:
+        _metrics['cache'].labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def set_arp_entries(kind, count):
+    if _metrics is not None:
+        _metrics['arp_entries'].labels(kind).set(count)
+
+
+def observe_apply(path, seconds, failed=False):
+    if _metrics is not None:
+        _metrics['apply'].labels(path).observe(seconds)
+        if failed:
+            _metrics['apply_failures'].labels(path).inc()
+
+
+def install(app, service, before_scrape=None):
+    """
+    Record request metrics for ``app`` and serve them on ``/metrics``.
+
+    ``before_scrape`` is called before rendering, to refresh gauges.
+    """
+    global _metrics
+    if _metrics is None:
+        try:
+            _metrics = _create(service)
+        except ImportError:
+            print("prometheus_client is not installed; /metrics is disabled")
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if _metrics is None or 'metrics_start' not in g:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        _metrics['requests'].labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - g.metrics_start)
+        # Stages recorded by request_timing for this request; commands have their own histogram
+        for stage, seconds in g.get('request_timings', {}).items():
+            if not stage.startswith('cmd-'):
+                observe_stage(stage, seconds)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if _metrics is None:
+            return jsonify({'error': 'prometheus_client is not installed'}), 503
+        if before_scrape is not None:
+            try:
+                before_scrape()
+            except Exception as e:
+                print(f"Error refreshing metrics: {e}")
+        client = _metrics['client']
+        registry = client.CollectorRegistry()
+        _metrics['multiprocess'].MultiProcessCollector(registry, path=_metrics['directory'])
+        return app.response_class(client.generate_latest(registry), mimetype=client.CONTENT_TYPE_LATEST)
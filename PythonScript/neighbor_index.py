@@ -0,0 +1,254 @@
+"""
+Secondary indexes over the neighbour table.
+
+``NeighborIndex`` keeps hash indexes by interface and by static/dynamic flag,
+plus three sorted orders (by IP, by MAC, by interface then IP).  Queries walk
+the order matching the requested sort key from a bisected start position, or
+materialise a small candidate set from the most selective index, so paging
+through a 50k-entry table never needs a full scan per request.
+"""
+import base64
+import ipaddress
+import json
+import re
+import socket
+from bisect import bisect_left, bisect_right, insort
+
+SORT_KEYS = ('ip', 'mac', 'iface')
+FLAG_FILTERS = ('static', 'dynamic')
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+# Materialise-and-sort is used when an index narrows the candidates to less
+# than this fraction of the range the sorted walk would have to cover.
+_SELECTIVE_FRACTION = 0.25
+
+_HEX = re.compile(r'[^0-9a-f]')
+
+
+def ip_to_int(ip):
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+
+def is_static(entry):
+    return 'M' in entry['flags']
+
+
+def normalize_mac_prefix(prefix):
+    """Accept aa:bb:cc, AA-BB-CC or aabbcc and return the colon form."""
+    digits = _HEX.sub('', prefix.lower())
+    return ':'.join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+def parse_ip_prefix(value):
+    """Parse a CIDR, a single address or a dotted prefix such as ``10.1``."""
+    if '/' not in value:
+        octets = [octet for octet in value.split('.') if octet != '']
+        if len(octets) < 4:
+            value = '.'.join(octets + ['0'] * (4 - len(octets))) + f"/{8 * len(octets)}"
+    network = ipaddress.IPv4Network(value, strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort='ip'):
+    """The position tuple in a cursor for ``sort``; raises QueryError unless it has that shape."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        position = tuple(json.loads(base64.urlsafe_b64decode(padded)))
+    except (ValueError, TypeError):
+        raise QueryError("invalid cursor")
+    types = _CURSOR_TYPES[sort]
+    if len(position) != len(types) or not all(
+            type(value) is expected for value, expected in zip(position, types)):
+        raise QueryError("cursor does not match the sort key")
+    return position
+
+
+# Element types of the position tuple a cursor holds for each sort key
+_CURSOR_TYPES = {
+    'ip': (int, str, str),
+    'mac': (str, int, str, str),
+    'iface': (str, int, str),
+}
+
+# Table key (iface, ip) for a position tuple of each sorted order
+_KEY_OF = {
+    'ip': lambda position: (position[1], position[2]),
+    'mac': lambda position: (position[2], position[3]),
+    'iface': lambda position: (position[0], position[2]),
+}
+
+
+class QueryError(ValueError):
+    """Raised for malformed query parameters."""
+
+
+class NeighborIndex:
+    def __init__(self):
+        self.by_iface = {}
+        self.by_flag = {'static': set(), 'dynamic': set()}
+        # Sorted position tuples, see _KEY_OF for recovering the table key
+        self.ip_order = []      # (ip_int, iface, ip)
+        self.mac_order = []     # (mac, ip_int, iface, ip)
+        self.iface_order = []   # (iface, ip_int, ip)
+
+    @staticmethod
+    def positions(entry):
+        ip_int = ip_to_int(entry['ip'])
+        iface, ip, mac = entry['iface'], entry['ip'], entry['mac']
+        return (ip_int, iface, ip), (mac, ip_int, iface, ip), (iface, ip_int, ip)
+
+    @staticmethod
+    def _flag(entry):
+        return 'static' if is_static(entry) else 'dynamic'
+
+    def add(self, key, entry):
+        self.by_iface.setdefault(entry['iface'], set()).add(key)
+        self.by_flag[self._flag(entry)].add(key)
+        ip_pos, mac_pos, iface_pos = self.positions(entry)
+        insort(self.ip_order, ip_pos)
+        insort(self.mac_order, mac_pos)
+        insort(self.iface_order, iface_pos)
+
+    def discard(self, key, entry):
+        keys = self.by_iface.get(entry['iface'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_iface[entry['iface']]
+        self.by_flag[self._flag(entry)].discard(key)
+        for order, position in zip((self.ip_order, self.mac_order, self.iface_order), self.positions(entry)):
+            i = bisect_left(order, position)
+            if i < len(order) and order[i] == position:
+                del order[i]
+
+    def rebuild(self, entries):
+        """Rebuild every index from a {key: entry} mapping in one sort."""
+        self.__init__()
+        ip_order, mac_order, iface_order = [], [], []
+        for key, entry in entries.items():
+            self.by_iface.setdefault(entry['iface'], set()).add(key)
+            self.by_flag[self._flag(entry)].add(key)
+            ip_pos, mac_pos, iface_pos = self.positions(entry)
+            ip_order.append(ip_pos)
+            mac_order.append(mac_pos)
+            iface_order.append(iface_pos)
+        self.ip_order = sorted(ip_order)
+        self.mac_order = sorted(mac_order)
+        self.iface_order = sorted(iface_order)
+
+    def query(self, entries, iface=None, flags=None, prefix=None, mac=None,
+              sort='ip', limit=DEFAULT_LIMIT, cursor=None):
+        """
+        Return (page, next_cursor) for the given filters.
+
+        ``entries`` is the table's {key: entry} mapping; ``prefix`` is an
+        (first, last) integer range from ``parse_ip_prefix`` and ``mac`` a
+        normalised MAC prefix.
+        """
+        if sort not in SORT_KEYS:
+            raise QueryError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        if flags is not None and flags not in FLAG_FILTERS:
+            raise QueryError(f"flags must be one of {', '.join(FLAG_FILTERS)}")
+        limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+        after = decode_cursor(cursor, sort) if cursor else None
+
+        order, order_name, lo, hi = self._sorted_range(sort, iface, prefix, mac)
+        key_of = _KEY_OF[order_name]
+        # Decided before applying the cursor so every page uses the same plan
+        candidates = self._selective_candidates(iface, flags, prefix, mac, hi - lo)
+
+        def matches(key):
+            entry = entries[key]
+            if iface is not None and entry['iface'] != iface:
+                return None
+            if flags is not None and self._flag(entry) != flags:
+                return None
+            if prefix is not None and not prefix[0] <= ip_to_int(entry['ip']) <= prefix[1]:
+                return None
+            if mac is not None and not entry['mac'].startswith(mac):
+                return None
+            return entry
+
+        try:
+            if candidates is not None:
+                positions = sorted(self._position_for(sort, entries[key]) for key in candidates)
+                start = bisect_right(positions, after) if after is not None else 0
+                walk = (_KEY_OF[sort](position) for position in positions[start:])
+            else:
+                if after is not None:
+                    if order_name != sort:
+                        # Cursors always hold the sort key's position;
+                        # translate (ip_int, iface, ip) to the iface order.
+                        after = (after[1], after[0], after[2])
+                    lo = max(lo, bisect_right(order, after))
+                walk = (key_of(order[i]) for i in range(lo, hi))
+        except (TypeError, IndexError):
+            raise QueryError("cursor does not match the sort key")
+
+        page = []
+        for key in walk:
+            entry = matches(key)
+            if entry is None:
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(list(self._position_for(sort, page[-1])))
+            page.append(entry)
+        return page, None
+
+    def _position_for(self, sort, entry):
+        return self.positions(entry)[SORT_KEYS.index(sort)]
+
+    def _sorted_range(self, sort, iface, prefix, mac):
+        """
+        Pick a sorted order for ``sort`` and narrow it with aligned filters.
+
+        Returns (order, order name, lo, hi).
+        """
+        if sort == 'ip' and iface is not None:
+            # Within one interface the iface order is already sorted by IP
+            order = self.iface_order
+            first, last = (prefix if prefix is not None else (0, 2 ** 32 - 1))
+            return order, 'iface', bisect_left(order, (iface, first)), bisect_right(order, (iface, last, '\uffff'))
+        if sort == 'ip':
+            order = self.ip_order
+            if prefix is None:
+                return order, 'ip', 0, len(order)
+            return order, 'ip', bisect_left(order, (prefix[0],)), bisect_right(order, (prefix[1], '\uffff'))
+        if sort == 'mac':
+            order = self.mac_order
+            if mac is None:
+                return order, 'mac', 0, len(order)
+            return order, 'mac', bisect_left(order, (mac,)), bisect_left(order, (mac + '\uffff',))
+        order = self.iface_order
+        if iface is None:
+            return order, 'iface', 0, len(order)
+        return order, 'iface', bisect_left(order, (iface,)), bisect_right(order, (iface, 2 ** 32))
+
+    def _selective_candidates(self, iface, flags, prefix, mac, walk_size):
+        """Return a key collection much smaller than the sorted walk, if an index offers one."""
+        options = []  # (size, producer of the keys)
+        if iface is not None:
+            keys = self.by_iface.get(iface, ())
+            options.append((len(keys), lambda: keys))
+        if flags is not None:
+            keys = self.by_flag[flags]
+            options.append((len(keys), lambda: keys))
+        if mac is not None:
+            mac_lo = bisect_left(self.mac_order, (mac,))
+            mac_hi = bisect_left(self.mac_order, (mac + '\uffff',))
+            options.append((mac_hi - mac_lo, lambda: [_KEY_OF['mac'](p) for p in self.mac_order[mac_lo:mac_hi]]))
+        if prefix is not None:
+            ip_lo = bisect_left(self.ip_order, (prefix[0],))
+            ip_hi = bisect_right(self.ip_order, (prefix[1], '\uffff'))
+            options.append((ip_hi - ip_lo, lambda: [_KEY_OF['ip'](p) for p in self.ip_order[ip_lo:ip_hi]]))
+        if not options:
+            return None
+        size, produce = min(options, key=lambda option: option[0])
+        if size >= walk_size * _SELECTIVE_FRACTION:
+            return None
+        return produce()
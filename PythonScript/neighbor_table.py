@@ -0,0 +1,461 @@
+"""
+In-memory ARP table kept current by rtnetlink neighbour notifications.
+
+Every mutation bumps a monotonically increasing ``version`` and is appended
+to a bounded change log, so clients can ask for what happened since the
+version they already have instead of downloading the whole table.  When the
+requested version has been compacted out of the log, or belongs to another
+table instance (``epoch``), the answer is a full resync.  The epoch is drawn
+on the first kernel read in each process, so workers forked from a preloaded
+master never share one while numbering their versions independently.
+
+With ``share_as`` the gunicorn workers answer from one table: the worker
+holding the ``SharedSnapshot`` lock listens for neighbour events and
+publishes the table (the /arp body, ETag ``<version>-<epoch>``) after each
+change; the others keep a mirror synced from the published body, logging the
+differences under the leader's version.  Every worker therefore reports the
+same epoch and versions, and a delta computed from a mirror's coarser log is
+still exact for any ``since`` it accepts.  A worker that takes over after the
+leader dies starts a new epoch.  Each publication carries the keys changed
+since a few publications back, which a follower that mirrored any of those
+applies instead of parsing the whole table.
+
+Active neighbours flip between REACHABLE, STALE, DELAY and PROBE all the
+time.  A change of ``state`` alone is therefore not a change of its own: it
+is held back and published, under one version, at most every
+STATE_COALESCE_SECONDS, together with any real change to the entry.
+"""
+import errno
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+
+import arp_reader
+import netlink
+import shared_snapshot
+from neighbor_index import NeighborIndex
+from request_timing import stage
+from snapshot_cache import Snapshot
+
+# Change log entries kept for delta queries
+CHANGE_LOG_SIZE = 65536
+# Max table age when neighbour events cannot be received
+FALLBACK_TTL = 2.0
+# Syncs touching more entries than this rebuild the indexes in one sort
+BULK_REINDEX_THRESHOLD = 1024
+# How long NUD state-only changes are held back before they get a version
+STATE_COALESCE_SECONDS = 30.0
+# Publications a follower may lag behind and still apply the published delta
+DELTA_PUBLICATIONS = 16
+# Deltas touching more than this share of the table are left out; parsing it is as cheap
+DELTA_MAX_SHARE = 0.25
+
+
+def entry_key(entry):
+    return entry['iface'], entry['ip']
+
+
+def state_only(previous, entry):
+    """True when ``entry`` differs from ``previous`` in nothing but its NUD state."""
+    return dict(previous, state=None) == dict(entry, state=None)
+
+
+class NeighborTable:
+    def __init__(self, reader=arp_reader.read_neighbors, log_size=CHANGE_LOG_SIZE, share_as=None):
+        """
+        reader   -- callable returning the kernel's neighbour entries
+        log_size -- change log entries kept for delta queries
+        share_as -- SharedSnapshot name to publish the table under, or None for a per-process table
+        """
+        self._reader = reader
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self.epoch = None
+        self.version = 0
+        self._entries = {}
+        self._added_at = {}
+        self._index = NeighborIndex()
+        self._log = deque(maxlen=log_size)
+        # Deltas are only complete for versions >= this one
+        self._oldest_complete = 0
+        # key -> entry whose state changed, not yet given a version
+        self._pending_states = {}
+        self._pending_since = 0.0
+
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._live_pid = None
+        self._watcher_pid = None
+        self._watching = False
+        self._start_lock = threading.Lock()
+        self._link_names = {}
+
+        self._snapshot = None
+        self._snapshot_delta = b''
+        # Versions recently published, oldest first; the next delta starts at the oldest
+        self._published = deque(maxlen=DELTA_PUBLICATIONS)
+        self._following = False
+        self._shared = shared_snapshot.SharedSnapshot(share_as, self, versioned=True) if share_as else None
+
+    # -- mutation ---------------------------------------------------------
+
+    def _record(self, key):
+        if len(self._log) == self._log.maxlen:
+            self._oldest_complete = self._log[0][0]
+        self._log.append((self.version, key))
+        self._changed.notify_all()
+
+    def upsert(self, entry, reindex=True, version=None):
+        with self._lock:
+            key = entry_key(entry)
+            previous = self._entries.get(key)
+            if previous == entry:
+                self._pending_states.pop(key, None)
+                return
+            if version is None and previous is not None and state_only(previous, entry):
+                self._hold_state(key, entry)
+                return
+            self._pending_states.pop(key, None)
+            self.version = version if version is not None else self.version + 1
+            if previous is None:
+                self._added_at[key] = self.version
+            elif reindex:
+                self._index.discard(key, previous)
+            self._entries[key] = entry
+            if reindex:
+                self._index.add(key, entry)
+            self._record(key)
+
+    def remove(self, key, reindex=True, version=None):
+        with self._lock:
+            self._pending_states.pop(key, None)
+            previous = self._entries.pop(key, None)
+            if previous is None:
+                return
+            self.version = version if version is not None else self.version + 1
+            del self._added_at[key]
+            if reindex:
+                self._index.discard(key, previous)
+            self._record(key)
+
+    def _hold_state(self, key, entry):
+        if not self._pending_states:
+            self._pending_since = time.monotonic()
+        self._pending_states[key] = entry
+
+    def _flush_states(self):
+        """Give the held-back state changes one version once they are old enough."""
+        with self._lock:
+            if not self._pending_states or time.monotonic() - self._pending_since < STATE_COALESCE_SECONDS:
+                return
+            self.version += 1
+            for key, entry in self._pending_states.items():
+                # The indexes do not look at the state
+                self._entries[key] = entry
+                self._record(key)
+            self._pending_states.clear()
+
+    def sync(self, entries, version=None):
+        """
+        Replace the table contents, logging only the differences; with
+        ``version`` (mirroring the leader) they are all logged under it.
+        """
+        with self._lock:
+            fresh = {entry_key(entry): entry for entry in entries}
+            removed = [key for key in self._entries if key not in fresh]
+            updated = [entry for key, entry in fresh.items() if self._entries.get(key) != entry]
+            if version is None:
+                # The kernel's view is complete: hold back exactly its state-only differences
+                held = {entry_key(entry): entry for entry in updated if entry_key(entry) in self._entries
+                        and state_only(self._entries[entry_key(entry)], entry)}
+                if held and not self._pending_states:
+                    self._pending_since = time.monotonic()
+                self._pending_states = held
+                if held:
+                    updated = [entry for entry in updated if entry_key(entry) not in held]
+            reindex = len(removed) + len(updated) <= BULK_REINDEX_THRESHOLD
+            for key in removed:
+                self.remove(key, reindex, version)
+            for entry in updated:
+                self.upsert(entry, reindex, version)
+            if not reindex:
+                self._index.rebuild(self._entries)
+            if version is not None:
+                self.version = version
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+
+    def reload(self):
+        with stage('netlink'):
+            entries = self._reader()
+        self.sync(entries)
+
+    # -- keeping current --------------------------------------------------
+
+    def _ensure_live(self, watch=True):
+        """Bring the table up to date from the kernel in this process."""
+        if self._live_pid != os.getpid() or self._following:
+            # First kernel read in this process, or taking over from the
+            # previous leader: its versions are a new history
+            with self._lock:
+                if self._live_pid != os.getpid() or self._following:
+                    self.epoch = uuid.uuid4().hex[:12]
+                    self._log.clear()
+                    self._oldest_complete = self.version
+                    self._pending_states.clear()
+                    self._published.clear()
+                    self._loaded = False
+                    self._following = False
+                    self._live_pid = os.getpid()
+        if watch:
+            self._ensure_watcher()
+        if not self._loaded or (not self._watching and time.monotonic() - self._loaded_at > FALLBACK_TTL):
+            self.reload()
+        self._flush_states()
+
+    def _ensure_current(self):
+        if self._shared is not None:
+            snapshot = self._shared.get()
+            if not self._shared.leader:
+                self._follow(snapshot)
+                return
+        self._ensure_live()
+
+    def _follow(self, snapshot):
+        """Mirror the table the leader published."""
+        version, epoch = snapshot.version, snapshot.etag.rsplit('-', 1)[-1]
+        with self._lock:
+            if epoch == self.epoch and (version <= self.version or not self._following):
+                return  # already mirrored, or this worker's own fallback snapshot
+        # This worker's own fallback Snapshot has no delta
+        delta = getattr(snapshot, 'delta', b'')
+        if delta and self._apply_delta(delta, version, epoch):
+            return
+        with stage('parse'):
+            entries = snapshot.data
+        with self._lock:
+            if epoch != self.epoch:
+                # Another leader's history: deltas are complete from here on
+                self.epoch = epoch
+                self._log.clear()
+                self._oldest_complete = version
+                self._following = True
+            elif version <= self.version:
+                return
+            self.sync(entries, version)
+
+    def _apply_delta(self, delta, version, epoch):
+        """Catch up from the published delta; False when it does not start at or before this mirror."""
+        with stage('parse'):
+            delta = json.loads(delta)
+        with self._lock:
+            if (not self._following or epoch != self.epoch or delta['version'] != version
+                    or not delta['since'] <= self.version < version):
+                return False
+            for iface, ip in delta['removed']:
+                self.remove((iface, ip), version=version)
+            for entry in delta['entries']:
+                self.upsert(entry, version=version)
+            self.version = version
+            return True
+
+    def _delta_since_published(self):
+        """
+        JSON of the entries changed since the oldest recent publication,
+        or b'' when the log does not reach back that far or it is not much
+        smaller than the table.  Called with the lock held.
+        """
+        if not self._published or self._published[0] < self._oldest_complete:
+            return b''
+        since = self._published[0]
+        limit = len(self._entries) * DELTA_MAX_SHARE
+        touched = set()
+        for version, key in reversed(self._log):
+            if version <= since:
+                break
+            touched.add(key)
+            if len(touched) > limit:
+                return b''
+        entries, removed = [], []
+        for key in touched:
+            entry = self._entries.get(key)
+            if entry is None:
+                removed.append(key)
+            else:
+                entries.append(entry)
+        return json.dumps({'epoch': self.epoch, 'since': since, 'version': self.version,
+                           'entries': entries, 'removed': removed}, separators=(',', ':')).encode()
+
+    # -- SnapshotCache interface, for SharedSnapshot ----------------------
+
+    @property
+    def generation(self):
+        return self.version
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def wait_for_invalidation(self, generation, timeout):
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != generation, timeout)
+            return self.version
+
+    def get(self):
+        """The table as a Snapshot: the /arp JSON body, ETag ``<version>-<epoch>``."""
+        leader = self._shared is None or self._shared.leader
+        if leader or not self._following:
+            # A follower only gets here before anything was published
+            self._ensure_live(watch=leader)
+        with self._lock:
+            etag = f"{self.version}-{self.epoch}"
+            if self._snapshot is not None and self._snapshot.etag == etag:
+                return self._snapshot
+            version, entries = self.version, list(self._entries.values())
+            delta = b''
+            if self._shared is not None and self._shared.leader:
+                # Taken at the same version as the body
+                delta = self._delta_since_published()
+                self._published.append(version)
+        with stage('serialize'):
+            body = json.dumps(entries, sort_keys=True, separators=(',', ':')).encode()
+        snapshot = Snapshot(version, etag, entries, body)
+        with self._lock:
+            self._snapshot, self._snapshot_delta = snapshot, delta
+        return snapshot
+
+    def delta(self, snapshot):
+        """What SharedSnapshot publishes alongside ``snapshot`` for followers to apply."""
+        with self._lock:
+            return self._snapshot_delta if self._snapshot is snapshot else b''
+
+    def snapshot(self):
+        """Current Snapshot, the published one when the table is shared."""
+        return self._shared.get() if self._shared is not None else self.get()
+
+    # -- queries ----------------------------------------------------------
+
+    def entries(self):
+        """Return (version, list of records)."""
+        self._ensure_current()
+        with self._lock:
+            return self.version, list(self._entries.values())
+
+    def query(self, **filters):
+        """Return (version, page, next_cursor); see NeighborIndex.query for filters."""
+        self._ensure_current()
+        with self._lock:
+            page, next_cursor = self._index.query(self._entries, **filters)
+            return self.version, page, next_cursor
+
+    def __len__(self):
+        return len(self._entries)
+
+    def changes(self, since, epoch=None):
+        """
+        Describe what changed after version ``since``.
+
+        Returns a full listing when the client's version cannot be served
+        from the change log.
+        """
+        self._ensure_current()
+        with self._lock:
+            if (since is None or epoch != self.epoch or since > self.version
+                    or since < self._oldest_complete):
+                return {
+                    'epoch': self.epoch,
+                    'version': self.version,
+                    'full': True,
+                    'entries': list(self._entries.values()),
+                }
+
+            touched = set()
+            for version, key in reversed(self._log):
+                if version <= since:
+                    break
+                touched.add(key)
+
+            added, changed, removed = [], [], []
+            for key in touched:
+                entry = self._entries.get(key)
+                if entry is None:
+                    removed.append({'iface': key[0], 'ip': key[1]})
+                elif self._added_at[key] > since:
+                    added.append(entry)
+                else:
+                    changed.append(entry)
+            return {
+                'epoch': self.epoch,
+                'version': self.version,
+                'full': False,
+                'added': added,
+                'changed': changed,
+                'removed': removed,
+            }
+
+    # -- kernel notifications --------------------------------------------
+
+    def _ensure_watcher(self):
+        # Started lazily so each gunicorn worker gets its own listener; the
+        # lock keeps concurrent first requests from starting two
+        pid = os.getpid()
+        if self._watcher_pid == pid:
+            return
+        with self._start_lock:
+            if self._watcher_pid == pid:
+                return
+            try:
+                sock = netlink.NetlinkSocket(groups=netlink.RTMGRP_NEIGH | netlink.RTMGRP_LINK, rcvbuf=4 << 20)
+            except OSError as e:
+                print(f"Neighbour events unavailable, re-reading the table every {FALLBACK_TTL}s: {e}")
+                self._watching = False
+            else:
+                self._watching = True
+                threading.Thread(target=self._watch, args=(sock,), daemon=True, name='neighbor-watcher').start()
+            self._watcher_pid = pid
+
+    def _names_for(self, index):
+        if index not in self._link_names:
+            self._link_names = arp_reader.link_names(netlink.dump_links())
+        return self._link_names
+
+    def _handle(self, msg_type, payload):
+        if msg_type in (netlink.RTM_NEWLINK, netlink.RTM_DELLINK):
+            # Renamed or removed links: forget the cached names
+            self._link_names = {}
+            return
+        if msg_type not in (netlink.RTM_NEWNEIGH, netlink.RTM_DELNEIGH):
+            return
+        neigh = netlink.parse_neigh(payload)
+        if neigh['family'] != socket.AF_INET or neigh['flags'] & netlink.NTF_PROXY:
+            return
+        names = self._names_for(neigh['index'])
+        entry = arp_reader.neighbor_entry(neigh, names) if msg_type == netlink.RTM_NEWNEIGH else None
+        if entry is not None:
+            self.upsert(entry)
+        else:
+            # Deleted, or no longer in a state the ARP table shows
+            iface = names.get(neigh['index'], (str(neigh['index']),))[0]
+            self.remove((iface, neigh['dst']))
+
+    def _watch(self, sock):
+        while True:
+            try:
+                data = sock.recv_raw(1 << 20)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Notifications were dropped; a dump brings us back in sync
+                    self.reload()
+                    continue
+                print(f"Neighbour watcher stopped: {e}")
+                self._watching = False
+                return
+            for msg_type, _flags, _seq, payload in netlink.parse_messages(data):
+                try:
+                    self._handle(msg_type, payload)
+                except Exception as e:
+                    print(f"Error handling neighbour event: {e}")
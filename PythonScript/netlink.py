@@ -0,0 +1,627 @@
+"""
+Minimal rtnetlink client used by the collectors.
+
+Only the pieces of the protocol this project needs are implemented: dump
+requests for links, addresses, routes, policy rules and neighbours, change notifications, and decoders
+that turn the kernel messages into plain dicts.  Everything is done over a single NETLINK_ROUTE
+socket, so no external commands are forked.
+"""
+import os
+import socket
+import struct
+
+NETLINK_ROUTE = 0
+SOL_NETLINK = 270
+NETLINK_ADD_MEMBERSHIP = 1
+# Kernel applies the filter fields of dump requests (Linux 4.20+)
+NETLINK_GET_STRICT_CHK = 12
+
+# Netlink message types and flags (linux/netlink.h)
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLMSG_OVERRUN = 4
+
+NLM_F_REQUEST = 0x01
+NLM_F_MULTI = 0x02
+NLM_F_ACK = 0x04
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# rtnetlink message types (linux/rtnetlink.h)
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+RTM_NEWRULE = 32
+RTM_DELRULE = 33
+RTM_GETRULE = 34
+
+# Multicast groups for change notifications (legacy RTMGRP_* bitmask)
+RTMGRP_LINK = 0x1
+RTMGRP_NEIGH = 0x4
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV4_RULE = 0x80
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+# Groups past the legacy bitmask are joined with NetlinkSocket.add_membership
+RTNLGRP_IPV6_RULE = 19
+
+# Link attributes (linux/if_link.h)
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_OPERSTATE = 16
+IFLA_STATS64 = 23
+
+IF_OPER_UP = 6
+OPERSTATES = {
+    0: "UNKNOWN",
+    1: "NOTPRESENT",
+    2: "DOWN",
+    3: "LOWERLAYERDOWN",
+    4: "TESTING",
+    5: "DORMANT",
+    6: "UP",
+}
+
+# Address attributes (linux/if_addr.h)
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+
+# Route attributes (linux/rtnetlink.h)
+RTA_DST = 1
+RTA_SRC = 2
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_MULTIPATH = 9
+RTA_TABLE = 15
+
+RT_TABLE_UNSPEC = 0
+RT_TABLE_DEFAULT = 253
+RT_TABLE_MAIN = 254
+RT_TABLE_LOCAL = 255
+TABLE_NAMES = {RT_TABLE_DEFAULT: "default", RT_TABLE_MAIN: "main", RT_TABLE_LOCAL: "local"}
+
+RTN_UNICAST = 1
+RTN_LOCAL = 2
+RTN_BROADCAST = 3
+RTN_ANYCAST = 4
+RTN_MULTICAST = 5
+RTN_BLACKHOLE = 6
+RTN_UNREACHABLE = 7
+RTN_PROHIBIT = 8
+RTN_THROW = 9
+ROUTE_TYPES = {
+    RTN_UNICAST: "unicast",
+    RTN_LOCAL: "local",
+    RTN_BROADCAST: "broadcast",
+    RTN_ANYCAST: "anycast",
+    RTN_MULTICAST: "multicast",
+    RTN_BLACKHOLE: "blackhole",
+    RTN_UNREACHABLE: "unreachable",
+    RTN_PROHIBIT: "prohibit",
+    RTN_THROW: "throw",
+}
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_SITE = 200
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+RT_SCOPE_NOWHERE = 255
+SCOPES = {RT_SCOPE_UNIVERSE: "global", RT_SCOPE_SITE: "site", RT_SCOPE_LINK: "link", RT_SCOPE_HOST: "host",
+          RT_SCOPE_NOWHERE: "nowhere"}
+# Route protocols as `ip route` names them (/etc/iproute2/rt_protos)
+PROTOCOLS = {1: "redirect", 2: "kernel", 3: "boot", 4: "static", 9: "ra", 16: "dhcp", 186: "bgp", 187: "isis",
+             188: "ospf", 189: "rip", 192: "eigrp"}
+# Cached clones (IPv6 PMTU exceptions), not configured routes
+RTM_F_CLONED = 0x200
+
+IFF_UP = 0x1
+
+# Policy rule attributes and actions (linux/fib_rules.h)
+FRA_DST = 1
+FRA_SRC = 2
+FRA_IIFNAME = 3
+FRA_GOTO = 4
+FRA_PRIORITY = 6
+FRA_FWMARK = 10
+FRA_TABLE = 15
+FRA_FWMASK = 16
+FRA_OIFNAME = 17
+
+FR_ACT_TO_TBL = 1
+FR_ACT_GOTO = 2
+FR_ACT_NOP = 3
+FR_ACT_BLACKHOLE = 6
+FR_ACT_UNREACHABLE = 7
+FR_ACT_PROHIBIT = 8
+RULE_ACTIONS = {
+    FR_ACT_TO_TBL: "lookup",
+    FR_ACT_GOTO: "goto",
+    FR_ACT_NOP: "nop",
+    FR_ACT_BLACKHOLE: "blackhole",
+    FR_ACT_UNREACHABLE: "unreachable",
+    FR_ACT_PROHIBIT: "prohibit",
+}
+FIB_RULE_INVERT = 0x2
+
+# Neighbour attributes and states (linux/neighbour.h)
+NDA_DST = 1
+NDA_LLADDR = 2
+
+NUD_INCOMPLETE = 0x01
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NUD_DELAY = 0x08
+NUD_PROBE = 0x10
+NUD_FAILED = 0x20
+NUD_NOARP = 0x40
+NUD_PERMANENT = 0x80
+NUD_NONE = 0x00
+
+NUD_STATES = {
+    NUD_NONE: "NONE",
+    NUD_INCOMPLETE: "INCOMPLETE",
+    NUD_REACHABLE: "REACHABLE",
+    NUD_STALE: "STALE",
+    NUD_DELAY: "DELAY",
+    NUD_PROBE: "PROBE",
+    NUD_FAILED: "FAILED",
+    NUD_NOARP: "NOARP",
+    NUD_PERMANENT: "PERMANENT",
+}
+
+NTF_PROXY = 0x08
+
+NLMSGHDR = struct.Struct("=IHHII")
+RTATTR = struct.Struct("=HH")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTMSG = struct.Struct("=BBBBBBBBI")
+# struct fib_rule_hdr has the same layout as rtmsg
+_FIB_RULE_HDR = _RTMSG
+_RTNEXTHOP = struct.Struct("=HBBi")
+NDMSG = struct.Struct("=BxxxiHBB")
+
+# Size of the fixed header that follows nlmsghdr in each dump request; only
+# its leading family byte is filled in.
+_REQUEST_HEADER_SIZE = {
+    RTM_GETLINK: _IFINFOMSG.size,
+    RTM_GETADDR: _IFADDRMSG.size,
+    RTM_GETROUTE: _RTMSG.size,
+    RTM_GETNEIGH: NDMSG.size,
+    RTM_GETRULE: _FIB_RULE_HDR.size,
+}
+
+
+class NetlinkError(OSError):
+    """Raised when the kernel answers a request with an error message."""
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_attrs(data, offset=0):
+    """Decode a run of rtattr structures into a {type: bytes} dict."""
+    attrs = {}
+    end = len(data)
+    while offset + 4 <= end:
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < 4:
+            break
+        # Strip NLA_F_NESTED / NLA_F_NET_BYTEORDER
+        attrs[attr_type & 0x3FFF] = data[offset + 4:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def pack_attr(attr_type, value):
+    """Encode a single rtattr, padding it to the netlink alignment."""
+    length = 4 + len(value)
+    return RTATTR.pack(length, attr_type) + value + b"\0" * (_align(length) - length)
+
+
+def check_error(payload):
+    """Raise NetlinkError for a non-zero NLMSG_ERROR payload."""
+    error = struct.unpack_from("=i", payload)[0]
+    if error:
+        raise NetlinkError(-error, os.strerror(-error))
+
+
+def parse_messages(data):
+    """Split a netlink datagram into (type, flags, seq, payload) tuples."""
+    offset = 0
+    end = len(data)
+    while offset + NLMSGHDR.size <= end:
+        length, msg_type, flags, seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, flags, seq, data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def _cstring(value):
+    return value.split(b"\0", 1)[0].decode()
+
+
+def _ip(family, value):
+    return socket.inet_ntop(family, value)
+
+
+def parse_link(payload):
+    """Decode an RTM_NEWLINK payload."""
+    family, link_type, index, flags, _change = _IFINFOMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, _IFINFOMSG.size)
+    operstate = attrs.get(IFLA_OPERSTATE, b"\0")[0]
+    link = {
+        "index": index,
+        "ifname": _cstring(attrs.get(IFLA_IFNAME, b"")),
+        "type": link_type,
+        "flags": flags,
+        "operstate": OPERSTATES.get(operstate, "UNKNOWN"),
+    }
+    if IFLA_ADDRESS in attrs:
+        link["address"] = attrs[IFLA_ADDRESS].hex(":")
+    if IFLA_MTU in attrs:
+        link["mtu"] = struct.unpack("=I", attrs[IFLA_MTU])[0]
+    return link
+
+
+def parse_link_stats(payload):
+    """Decode (index, ifname, IFLA_STATS64 bytes or None) from an RTM_NEWLINK payload."""
+    _family, _type, index, _flags, _change = _IFINFOMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, _IFINFOMSG.size)
+    return index, _cstring(attrs.get(IFLA_IFNAME, b"")), attrs.get(IFLA_STATS64)
+
+
+def parse_addr(payload):
+    """Decode an RTM_NEWADDR payload."""
+    family, prefixlen, flags, scope, index = _IFADDRMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, _IFADDRMSG.size)
+    # IFA_LOCAL is the interface address on point-to-point links, IFA_ADDRESS
+    # is the peer there; on broadcast links both are the same.
+    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+    return {
+        "family": family,
+        "index": index,
+        "prefixlen": prefixlen,
+        "scope": scope,
+        "address": _ip(family, raw) if raw else None,
+        "label": _cstring(attrs[IFA_LABEL]) if IFA_LABEL in attrs else None,
+    }
+
+
+def parse_multipath(family, value):
+    """Decode RTA_MULTIPATH into [{'oif', 'gateway', 'weight'}]."""
+    nexthops = []
+    offset = 0
+    while offset + _RTNEXTHOP.size <= len(value):
+        length, _flags, hops, index = _RTNEXTHOP.unpack_from(value, offset)
+        if length < _RTNEXTHOP.size:
+            break
+        attrs = parse_attrs(value[offset:offset + length], _RTNEXTHOP.size)
+        nexthops.append({
+            "oif": index,
+            "gateway": _ip(family, attrs[RTA_GATEWAY]) if RTA_GATEWAY in attrs else None,
+            "weight": hops + 1,
+        })
+        offset += _align(length)
+    return nexthops
+
+
+def parse_route(payload):
+    """Decode an RTM_NEWROUTE payload."""
+    (family, dst_len, src_len, tos, table, protocol,
+     scope, route_type, flags) = _RTMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, _RTMSG.size)
+    if RTA_TABLE in attrs:
+        table = struct.unpack("=I", attrs[RTA_TABLE])[0]
+    route = {
+        "family": family,
+        "dst_len": dst_len,
+        "table": table,
+        "protocol": protocol,
+        "scope": scope,
+        "type": route_type,
+        "dst": _ip(family, attrs[RTA_DST]) if RTA_DST in attrs else None,
+        "gateway": _ip(family, attrs[RTA_GATEWAY]) if RTA_GATEWAY in attrs else None,
+        "prefsrc": _ip(family, attrs[RTA_PREFSRC]) if RTA_PREFSRC in attrs else None,
+        "oif": struct.unpack("=i", attrs[RTA_OIF])[0] if RTA_OIF in attrs else None,
+        "metric": struct.unpack("=I", attrs[RTA_PRIORITY])[0] if RTA_PRIORITY in attrs else 0,
+        "tos": tos,
+        "cloned": bool(flags & RTM_F_CLONED),
+        "nexthops": parse_multipath(family, attrs[RTA_MULTIPATH]) if RTA_MULTIPATH in attrs else None,
+    }
+    return route
+
+
+def parse_rule(payload):
+    """Decode an RTM_NEWRULE payload."""
+    (family, dst_len, src_len, tos, table, _res1,
+     _res2, action, flags) = _FIB_RULE_HDR.unpack_from(payload)
+    attrs = parse_attrs(payload, _FIB_RULE_HDR.size)
+    if FRA_TABLE in attrs:
+        table = struct.unpack("=I", attrs[FRA_TABLE])[0]
+
+    def u32(attr):
+        return struct.unpack("=I", attrs[attr])[0] if attr in attrs else None
+
+    return {
+        "family": family,
+        "priority": u32(FRA_PRIORITY) or 0,
+        "action": action,
+        "table": table,
+        "invert": bool(flags & FIB_RULE_INVERT),
+        "src": _ip(family, attrs[FRA_SRC]) if FRA_SRC in attrs else None,
+        "src_len": src_len,
+        "dst": _ip(family, attrs[FRA_DST]) if FRA_DST in attrs else None,
+        "dst_len": dst_len,
+        "tos": tos,
+        "iif": _cstring(attrs[FRA_IIFNAME]) if FRA_IIFNAME in attrs else None,
+        "oif": _cstring(attrs[FRA_OIFNAME]) if FRA_OIFNAME in attrs else None,
+        "fwmark": u32(FRA_FWMARK),
+        "fwmask": u32(FRA_FWMASK),
+        "goto": u32(FRA_GOTO),
+    }
+
+
+def parse_neigh(payload):
+    """Decode an RTM_NEWNEIGH payload."""
+    family, index, state, flags, _type = NDMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, NDMSG.size)
+    lladdr = attrs.get(NDA_LLADDR)
+    return {
+        "family": family,
+        "index": index,
+        "state": state,
+        "flags": flags,
+        "dst": _ip(family, attrs[NDA_DST]) if NDA_DST in attrs else None,
+        "lladdr": lladdr.hex(":") if lladdr else None,
+    }
+
+
+PARSERS = {
+    RTM_NEWLINK: parse_link,
+    RTM_DELLINK: parse_link,
+    RTM_NEWADDR: parse_addr,
+    RTM_DELADDR: parse_addr,
+    RTM_NEWROUTE: parse_route,
+    RTM_DELROUTE: parse_route,
+    RTM_NEWNEIGH: parse_neigh,
+    RTM_DELNEIGH: parse_neigh,
+    RTM_NEWRULE: parse_rule,
+    RTM_DELRULE: parse_rule,
+}
+
+
+class NetlinkSocket:
+    """A NETLINK_ROUTE socket that can issue dump and change requests."""
+
+    def __init__(self, groups=0, rcvbuf=1 << 20):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, NETLINK_ROUTE)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            self.sock.bind((0, groups))
+        except OSError:
+            self.sock.close()
+            raise
+        self.seq = 0
+
+    def close(self):
+        self.sock.close()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, msg_type, flags, body):
+        self.seq += 1
+        header = NLMSGHDR.pack(NLMSGHDR.size + len(body), msg_type, flags, self.seq, 0)
+        self.sock.send(header + body)
+        return self.seq
+
+    def recv_raw(self, bufsize=1 << 16):
+        return self.sock.recv(bufsize)
+
+    def add_membership(self, group):
+        """Join a multicast group by number, for groups the bind() bitmask cannot express."""
+        self.sock.setsockopt(SOL_NETLINK, NETLINK_ADD_MEMBERSHIP, group)
+
+    def enable_strict_check(self):
+        """Have the kernel filter dumps by the request header; False if it cannot."""
+        try:
+            self.sock.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
+            return True
+        except OSError:
+            return False
+
+    def request_dump(self, msg_type, family=socket.AF_UNSPEC, body=None):
+        """Send a dump request and return its sequence number."""
+        if body is None:
+            body = bytes([family]) + b"\0" * (_REQUEST_HEADER_SIZE[msg_type] - 1)
+        return self.send(msg_type, NLM_F_REQUEST | NLM_F_DUMP, body)
+
+    def dump(self, msg_type, family=socket.AF_UNSPEC, body=None):
+        """Run a dump request and return the raw payloads of every reply."""
+        seq = self.request_dump(msg_type, family, body)
+        payloads = []
+        while True:
+            data = self.recv_raw()
+            for reply_type, _flags, reply_seq, payload in parse_messages(data):
+                if reply_seq != seq:
+                    continue
+                if reply_type == NLMSG_DONE:
+                    return payloads
+                if reply_type == NLMSG_ERROR:
+                    check_error(payload)
+                    continue
+                payloads.append((reply_type, payload))
+
+    def dump_parsed(self, msg_type, family=socket.AF_UNSPEC, body=None):
+        return [PARSERS[reply_type](payload) for reply_type, payload in self.dump(msg_type, family, body)]
+
+    def dump_link(self, msg_type, index):
+        """
+        Dump the addresses (RTM_GETADDR) or main-table routes (RTM_GETROUTE)
+        of one link.
+
+        With strict checking enabled the kernel only sends that link's
+        entries; older kernels send everything, which is filtered here.
+        """
+        if msg_type == RTM_GETADDR:
+            body = _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, index)
+            return [addr for addr in self.dump_parsed(msg_type, body=body) if addr['index'] == index]
+        body = (_RTMSG.pack(socket.AF_UNSPEC, 0, 0, 0, RT_TABLE_MAIN, 0, 0, 0, 0)
+                + pack_attr(RTA_OIF, struct.pack("=i", index)))
+        return [route for route in self.dump_parsed(msg_type, body=body)
+                if route['oif'] == index and route['table'] == RT_TABLE_MAIN]
+
+    def execute(self, requests, batch_bytes=32 << 10):
+        """
+        Run (msg_type, flags, body) change requests and return their errnos.
+
+        Requests are packed back to back into datagrams of up to
+        ``batch_bytes`` so thousands of changes cost a handful of syscalls.
+        Every request is sent with NLM_F_ACK; the result list holds 0 for
+        success or the positive errno reported by the kernel, in order.
+        """
+        results = [None] * len(requests)
+        start = 0
+        while start < len(requests):
+            chunk = []
+            size = 0
+            pending = {}
+            for i in range(start, len(requests)):
+                msg_type, flags, body = requests[i]
+                length = NLMSGHDR.size + len(body)
+                if chunk and size + length > batch_bytes:
+                    break
+                self.seq += 1
+                pending[self.seq] = i
+                chunk.append(NLMSGHDR.pack(length, msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, self.seq, 0)
+                             + body + b"\0" * (_align(length) - length))
+                size += _align(length)
+            start += len(chunk)
+            self.sock.send(b"".join(chunk))
+            while pending:
+                for reply_type, _flags, reply_seq, payload in parse_messages(self.recv_raw()):
+                    if reply_type == NLMSG_ERROR and reply_seq in pending:
+                        results[pending.pop(reply_seq)] = -struct.unpack_from("=i", payload)[0]
+        return results
+
+    def request(self, msg_type, flags, body):
+        """Run a single change request, raising NetlinkError on failure."""
+        error = self.execute([(msg_type, flags, body)])[0]
+        if error:
+            raise NetlinkError(error, os.strerror(error))
+
+    def get(self, msg_type, body):
+        """Run a single (non-dump) get request and return the parsed reply."""
+        seq = self.send(msg_type, NLM_F_REQUEST, body)
+        while True:
+            for reply_type, _flags, reply_seq, payload in parse_messages(self.recv_raw()):
+                if reply_seq != seq:
+                    continue
+                if reply_type == NLMSG_ERROR:
+                    check_error(payload)
+                elif reply_type in PARSERS:
+                    return PARSERS[reply_type](payload)
+
+    def route_get(self, dst):
+        """Ask the kernel which route it would use for the IPv4 address ``dst``."""
+        body = _RTMSG.pack(socket.AF_INET, 32, 0, 0, 0, 0, 0, 0, 0) + pack_attr(RTA_DST, socket.inet_aton(dst))
+        return self.get(RTM_GETROUTE, body)
+
+    def link_get(self, ifname):
+        """Look up one link by name; raises NetlinkError (ENODEV) if there is none."""
+        body = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + pack_attr(IFLA_IFNAME, ifname.encode() + b"\0")
+        return self.get(RTM_GETLINK, body)
+
+
+def pack_neigh(index, ip, mac=None, state=NUD_PERMANENT):
+    """Build an RTM_NEWNEIGH/RTM_DELNEIGH body for an IPv4 neighbour."""
+    body = NDMSG.pack(socket.AF_INET, index, state, 0, 0) + pack_attr(NDA_DST, socket.inet_aton(ip))
+    if mac is not None:
+        body += pack_attr(NDA_LLADDR, bytes.fromhex(mac.replace(":", "")))
+    return body
+
+
+def pack_addr(index, ip, prefixlen):
+    """Build an RTM_NEWADDR/RTM_DELADDR body for an IPv4 address."""
+    address = socket.inet_aton(ip)
+    body = (_IFADDRMSG.pack(socket.AF_INET, prefixlen, 0, RT_SCOPE_UNIVERSE, index)
+            + pack_attr(IFA_LOCAL, address) + pack_attr(IFA_ADDRESS, address))
+    if prefixlen < 31:
+        host_bits = (1 << (32 - prefixlen)) - 1
+        broadcast = int.from_bytes(address, "big") | host_bits
+        body += pack_attr(IFA_BROADCAST, broadcast.to_bytes(4, "big"))
+    return body
+
+
+def pack_route(dst, dst_len, gateway=None, index=None, metric=None, protocol=RTPROT_STATIC):
+    """Build an RTM_NEWROUTE/RTM_DELROUTE body for an IPv4 route in the main table."""
+    scope = RT_SCOPE_UNIVERSE if gateway else RT_SCOPE_LINK
+    body = _RTMSG.pack(socket.AF_INET, dst_len, 0, 0, RT_TABLE_MAIN, protocol, scope, RTN_UNICAST, 0)
+    if dst_len:
+        body += pack_attr(RTA_DST, socket.inet_aton(dst))
+    if gateway:
+        body += pack_attr(RTA_GATEWAY, socket.inet_aton(gateway))
+    if index is not None:
+        body += pack_attr(RTA_OIF, struct.pack("=i", index))
+    if metric is not None:
+        body += pack_attr(RTA_PRIORITY, struct.pack("=I", metric))
+    return body
+
+
+def pack_link_flags(index, flags, change):
+    """Build an RTM_NEWLINK body that sets the ``change`` bits of a link's flags to ``flags``."""
+    return _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def dump_links():
+    with NetlinkSocket() as nl:
+        return nl.dump_parsed(RTM_GETLINK)
+
+
+def dump_state():
+    """Fetch links, addresses and routes over a single socket."""
+    with NetlinkSocket() as nl:
+        return (
+            nl.dump_parsed(RTM_GETLINK),
+            nl.dump_parsed(RTM_GETADDR),
+            nl.dump_parsed(RTM_GETROUTE),
+        )
+
+
+def dump_link_state(ifname, addrs=True, routes=True):
+    """Fetch one link and, if asked for, only its addresses and routes."""
+    with NetlinkSocket() as nl:
+        nl.enable_strict_check()
+        link = nl.link_get(ifname)
+        return (
+            link,
+            nl.dump_link(RTM_GETADDR, link['index']) if addrs else [],
+            nl.dump_link(RTM_GETROUTE, link['index']) if routes else [],
+        )
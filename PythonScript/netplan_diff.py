@@ -0,0 +1,127 @@
+"""
+Semantic diff of netplan configurations and the apply path it allows.
+
+``plan_apply`` compares the merged netplan views before and after an edit:
+
+* ``noop``   -- no interface settings changed; nothing is written or applied
+* ``narrow`` -- only static IPv4 addresses, simple routes or DNS changed; the
+                YAML is written and rendered with ``netplan generate``, the
+                address/route delta goes to the kernel over netlink and
+                ``networkctl reload`` reconfigures just the matching links
+* ``full``   -- anything else needs a global ``netplan apply``
+"""
+import ipaddress
+
+import netlink
+
+NOOP = 'noop'
+NARROW = 'narrow'
+FULL = 'full'
+
+# Settings whose changes can be applied without a global netplan apply
+NARROW_KEYS = frozenset(('addresses', 'routes', 'nameservers'))
+# Netplan's values for settings an interface may leave out
+_DEFAULTS = {'dhcp4': False, 'dhcp6': False}
+# Route keys the narrow path knows how to program
+_ROUTE_KEYS = frozenset(('to', 'via', 'metric'))
+
+
+class NotNarrow(ValueError):
+    """Raised when a change cannot be expressed as netlink address/route updates."""
+
+
+def interface_changes(before, after, device_type='ethernets'):
+    """Return {iface: sorted changed setting keys} between two merged netplan views."""
+    old = ((before.get('network') or {}).get(device_type)) or {}
+    new = ((after.get('network') or {}).get(device_type)) or {}
+    changes = {}
+    for iface in set(old) | set(new):
+        old_settings = old.get(iface) or {}
+        new_settings = new.get(iface) or {}
+        keys = sorted(key for key in set(old_settings) | set(new_settings)
+                      if old_settings.get(key, _DEFAULTS.get(key)) != new_settings.get(key, _DEFAULTS.get(key)))
+        if keys or (iface in old) != (iface in new):
+            changes[iface] = keys
+    return changes
+
+
+def _addresses(settings):
+    addresses = set()
+    for address in settings.get('addresses') or []:
+        if not isinstance(address, str):
+            raise NotNarrow('address options')
+        interface = ipaddress.ip_interface(address)
+        if interface.version != 4:
+            raise NotNarrow('IPv6 address')
+        addresses.add((str(interface.ip), interface.network.prefixlen))
+    return addresses
+
+
+def _routes(settings):
+    routes = set()
+    for route in settings.get('routes') or []:
+        if not isinstance(route, dict) or set(route) - _ROUTE_KEYS or 'to' not in route:
+            raise NotNarrow('route options')
+        to = '0.0.0.0/0' if route['to'] == 'default' else route['to']
+        network = ipaddress.ip_network(to, strict=False)
+        if network.version != 4:
+            raise NotNarrow('IPv6 route')
+        via = route.get('via')
+        if via is not None and ipaddress.ip_address(via).version != 4:
+            raise NotNarrow('IPv6 gateway')
+        routes.add((str(network.network_address), network.prefixlen, via, route.get('metric')))
+    return routes
+
+
+def netlink_delta(index, old_settings, new_settings):
+    """
+    Build the netlink requests turning ``old_settings`` into ``new_settings``.
+
+    Returns (requests, deletions) where ``deletions`` flags the requests
+    whose "already gone" errors are harmless.
+    """
+    old_addresses, new_addresses = _addresses(old_settings), _addresses(new_settings)
+    old_routes, new_routes = _routes(old_settings), _routes(new_settings)
+    replace = netlink.NLM_F_CREATE | netlink.NLM_F_REPLACE
+    requests = [(netlink.RTM_NEWLINK, 0, netlink.pack_link_flags(index, netlink.IFF_UP, netlink.IFF_UP))]
+    deletions = [False]
+    # New addresses first so new gateways are reachable, old routes before
+    # the addresses they may depend on, new routes last.
+    for ip, prefixlen in sorted(new_addresses - old_addresses):
+        requests.append((netlink.RTM_NEWADDR, replace, netlink.pack_addr(index, ip, prefixlen)))
+        deletions.append(False)
+    for dst, dst_len, via, metric in sorted(old_routes - new_routes, key=str):
+        requests.append((netlink.RTM_DELROUTE, 0, netlink.pack_route(dst, dst_len, via, index, metric)))
+        deletions.append(True)
+    for ip, prefixlen in sorted(old_addresses - new_addresses):
+        requests.append((netlink.RTM_DELADDR, 0, netlink.pack_addr(index, ip, prefixlen)))
+        deletions.append(True)
+    for dst, dst_len, via, metric in sorted(new_routes - old_routes, key=str):
+        requests.append((netlink.RTM_NEWROUTE, replace, netlink.pack_route(dst, dst_len, via, index, metric)))
+        deletions.append(False)
+    return requests, deletions
+
+
+def plan_apply(before, after, device_type='ethernets'):
+    """
+    Pick the apply path for the change from ``before`` to ``after``.
+
+    Returns (path, changes) with ``changes`` as from interface_changes.
+    """
+    changes = interface_changes(before, after, device_type)
+    if not changes:
+        return NOOP, changes
+    old = ((before.get('network') or {}).get(device_type)) or {}
+    new = ((after.get('network') or {}).get(device_type)) or {}
+    for iface, keys in changes.items():
+        old_settings, new_settings = old.get(iface), new.get(iface)
+        if old_settings is None or new_settings is None or not set(keys) <= NARROW_KEYS:
+            return FULL, changes
+        if old_settings.get('dhcp4') or new_settings.get('dhcp4') or new_settings.get('dhcp6'):
+            return FULL, changes
+        try:
+            _addresses(old_settings), _addresses(new_settings)
+            _routes(old_settings), _routes(new_settings)
+        except ValueError:
+            return FULL, changes
+    return NARROW, changes
@@ -0,0 +1,195 @@
+"""
+Cached, merged model of the netplan configuration.
+
+Each ``/etc/netplan/*.yaml`` file is parsed once and kept until its
+(inode, mtime, size) signature changes, using libyaml's C loader and dumper
+when PyYAML was built with them.  The merged view follows netplan's own
+rules for files processed in lexical order: later scalars win, mappings are
+merged key by key and sequences are concatenated.  Every interface also
+records the file that defines it last, so edits are written back to that
+file rather than to whichever file happens to sort first.
+"""
+import copy
+import glob
+import os
+import threading
+
+import yaml
+
+import metrics
+
+NETPLAN_GLOB = '/etc/netplan/*.yaml'
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Device sections an interface name can be defined under
+DEVICE_TYPES = ('ethernets', 'bonds', 'bridges', 'vlans', 'wifis', 'tunnels')
+
+
+def merge_netplan(base, override):
+    """Merge two parsed netplan documents the way netplan combines files."""
+    if isinstance(base, dict) and isinstance(override, dict):
+        merged = dict(base)
+        for key, value in override.items():
+            merged[key] = merge_netplan(base[key], value) if key in base else value
+        return merged
+    if isinstance(base, list) and isinstance(override, list):
+        return base + override
+    return override
+
+
+def _signature(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class NetplanModel:
+    def __init__(self, pattern=NETPLAN_GLOB):
+        self.pattern = pattern
+        self._lock = threading.Lock()
+        self._files = {}    # path -> (signature, parsed document)
+        self._merged = None
+
+    def _refresh(self):
+        """Reparse files whose signature changed. Caller holds the lock."""
+        paths = sorted(glob.glob(self.pattern))
+        changed = set(self._files) != set(paths)
+        for path in paths:
+            try:
+                signature = _signature(path)
+            except FileNotFoundError:
+                continue
+            cached = self._files.get(path)
+            hit = cached is not None and cached[0] == signature
+            metrics.cache_lookup('netplan_files', hit)
+            if hit:
+                continue
+            try:
+                with open(path) as f:
+                    document = yaml.load(f, Loader=Loader) or {}
+            except (OSError, yaml.YAMLError) as e:
+                print(f"Error reading Netplan configuration {path}: {e}")
+                document = {}
+            self._files[path] = (signature, document)
+            changed = True
+        for path in set(self._files) - set(paths):
+            del self._files[path]
+        if changed or self._merged is None:
+            self._merged = self._build_merged(paths)
+
+    def _build_merged(self, paths):
+        merged = {}
+        owners = {}
+        for path in paths:
+            if path not in self._files:
+                continue
+            document = self._files[path][1]
+            merged = merge_netplan(merged, document)
+            network = document.get('network') or {}
+            for device_type in DEVICE_TYPES:
+                for iface in network.get(device_type) or {}:
+                    owners[iface] = (path, device_type)
+        return merged, owners
+
+    def paths(self):
+        with self._lock:
+            self._refresh()
+            return sorted(self._files)
+
+    def merged(self):
+        """Return the merged document; treat it as read-only."""
+        with self._lock:
+            self._refresh()
+            return self._merged[0]
+
+    def interfaces(self, device_type='ethernets'):
+        """Merged {iface: settings} for one device type; treat it as read-only."""
+        return (self.merged().get('network') or {}).get(device_type) or {}
+
+    def owner(self, iface):
+        """Return (path, device type) of the file that defines ``iface`` last, or None."""
+        with self._lock:
+            self._refresh()
+            return self._merged[1].get(iface)
+
+    def edit(self):
+        """Start a set of changes against copies of the current files."""
+        with self._lock:
+            self._refresh()
+            documents = {path: copy.deepcopy(document) for path, (_signature, document) in self._files.items()}
+            owners = dict(self._merged[1])
+            base = self._merged[0]
+        return NetplanEdit(self, documents, owners, base)
+
+    def _store(self, path, document):
+        with self._lock:
+            self._files[path] = (_signature(path), document)
+            self._merged = None
+
+
+class NetplanEdit:
+    """Mutable copies of the netplan files; ``write`` saves the touched ones."""
+
+    def __init__(self, model, documents, owners, base):
+        self._model = model
+        self.documents = documents
+        self._owners = owners
+        self._touched = set()
+        # Merged view the edit started from; treat it as read-only
+        self.base = base
+
+    @property
+    def paths(self):
+        return sorted(self.documents)
+
+    def merged(self):
+        """Merged view of the edited documents."""
+        merged = {}
+        for path in self.paths:
+            merged = merge_netplan(merged, self.documents[path])
+        return merged
+
+    def interface_config(self, iface, device_type='ethernets'):
+        """
+        Return the mutable settings of ``iface`` in the file that owns it.
+
+        Interfaces not defined anywhere yet are added to the first file.
+        """
+        if not self.documents:
+            raise FileNotFoundError('No Netplan configuration files found.')
+        path, owned_type = self._owners.get(iface, (self.paths[0], device_type))
+        self._owners[iface] = (path, owned_type)
+        self._touched.add(path)
+        document = self.documents[path]
+        section = document.setdefault('network', {}).setdefault(owned_type, {})
+        if section.get(iface) is None:
+            section[iface] = {}
+        return section[iface]
+
+    def checkpoint(self):
+        return copy.deepcopy(self.documents), set(self._touched), dict(self._owners)
+
+    def rollback(self, checkpoint):
+        documents, touched, owners = checkpoint
+        self.documents, self._touched, self._owners = documents, touched, owners
+
+    def write(self):
+        """Atomically rewrite each touched file, keeping its permissions."""
+        for path in sorted(self._touched):
+            document = self.documents[path]
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o600
+            tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+            with os.fdopen(fd, 'w') as f:
+                yaml.dump(document, f, Dumper=Dumper, default_flow_style=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self._model._store(path, document)
+        touched = sorted(self._touched)
+        self._touched = set()
+        return touched
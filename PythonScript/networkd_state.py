@@ -0,0 +1,275 @@
+"""
+Link, DNS and DHCP lease state from systemd-networkd's state files.
+
+networkd and resolved keep machine-readable ``KEY=VALUE`` files per link
+index, which say the same as ``networkctl status`` / ``resolvectl status``
+without forking either or scraping their text:
+
+    /run/systemd/netif/links/<ifindex>    DNS=, OPER_STATE=, DHCP_LEASE=, ...
+    /run/systemd/netif/leases/<ifindex>   ADDRESS=, SERVER_ADDRESS=, ROUTER=, LIFETIME=, ...
+    /run/systemd/resolve/netif/<ifindex>  SERVERS= set at runtime (resolvectl dns)
+
+``NetworkdState`` parses them once and keeps the result until inotify
+reports a change in one of those directories, so reads cost a generation
+check.  Without inotify it compares the directories' mtimes on each read.
+``links()`` returns None when networkd does not manage the machine, and
+callers fall back to the commands.
+
+A lease's expiry is its file's mtime plus LIFETIME: networkd rewrites the
+file whenever it acquires or renews the lease.
+"""
+import ctypes
+import errno
+import os
+import socket
+import struct
+import threading
+
+RUN_SYSTEMD = '/run/systemd'
+LINKS_DIR = 'netif/links'
+LEASES_DIR = 'netif/leases'
+RESOLVE_LINKS_DIR = 'resolve/netif'
+# Parents are watched too so directories created later are picked up
+WATCH_DIRS = ('netif', LINKS_DIR, LEASES_DIR, 'resolve', RESOLVE_LINKS_DIR)
+# The only entries of RUN_SYSTEMD itself that matter; its other churn is ignored
+ROOT_ENTRIES = (b'netif', b'resolve')
+
+# <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+except (OSError, AttributeError):
+    _inotify_init1 = None
+
+
+def parse_state_file(text):
+    """Parse a networkd/resolved state file into {KEY: value}."""
+    values = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        values[key] = value.strip('"')
+    return values
+
+
+def _read_dir(path):
+    """{ifindex: parsed state} for the numeric files of one state directory."""
+    states = {}
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return states
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(path, name)) as f:
+                values = parse_state_file(f.read())
+                values['_mtime'] = os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            continue  # replaced or removed while listing
+        states[int(name)] = values
+    return states
+
+
+def parse_lease(values):
+    """The lease details of a parsed lease file, with ``Expires`` in epoch seconds (or None)."""
+    lifetime = values.get('LIFETIME')
+    lifetime = int(lifetime) if lifetime and lifetime.isdigit() else None
+    routers = values.get('ROUTER', '').split()
+    return {
+        "Address": values.get('ADDRESS') or None,
+        "Server": values.get('SERVER_ADDRESS') or None,
+        "Router": routers[0] if routers else None,
+        "Lifetime": lifetime,
+        "Expires": int(values['_mtime']) + lifetime if lifetime is not None else None,
+    }
+
+
+def build_links(links, leases, resolve_links):
+    """Combine the parsed files into {ifindex: {'dns': [...], 'lease': {...} or None, ...}}."""
+    state = {}
+    for index, values in links.items():
+        # Servers set at runtime through resolved take precedence, like resolvectl shows them
+        servers = resolve_links.get(index, {}).get('SERVERS') or values.get('DNS', '')
+        lease = leases.get(index)
+        state[index] = {
+            'oper_state': values.get('OPER_STATE'),
+            'admin_state': values.get('ADMIN_STATE'),
+            'dns': servers.split(),
+            'lease': parse_lease(lease) if lease else None,
+        }
+    return state
+
+
+class NetworkdState:
+    def __init__(self, root=RUN_SYSTEMD):
+        self.root = root
+        self._dirs = [os.path.join(root, path) for path in WATCH_DIRS]
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._links = None
+        self._links_generation = -1
+        self._signature = None
+        self._subscribers = []
+
+        self._watcher_pid = None
+        self._watching = False
+        self._start_lock = threading.Lock()
+        self._root_wd = None
+
+    def subscribe(self, callback):
+        """Call ``callback()`` from the watcher thread whenever the state files change."""
+        self._subscribers.append(callback)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+        for callback in self._subscribers:
+            callback()
+
+    def links(self):
+        """{ifindex: link state}, or None when networkd keeps no state here."""
+        self._ensure_watcher()
+        if not self._watching:
+            self._check_dirs()
+        with self._lock:
+            if self._links_generation == self._generation:
+                return self._links
+            generation = self._generation
+        links = build_links(*(_read_dir(os.path.join(self.root, path))
+                              for path in (LINKS_DIR, LEASES_DIR, RESOLVE_LINKS_DIR)))
+        # No link files at all: networkd is not running, or not managing anything
+        links = links or None
+        with self._lock:
+            self._links = links
+            self._links_generation = generation
+        return links
+
+    def by_name(self, ifnames):
+        """
+        ({ifname: dns servers}, {ifname: lease}) for {ifindex: ifname}, or
+        None when networkd keeps no state here.
+        """
+        links = self.links()
+        if links is None:
+            return None
+        dns, leases = {}, {}
+        for index, ifname in ifnames.items():
+            link = links.get(index)
+            if link is not None:
+                dns[ifname] = link['dns']
+                leases[ifname] = link['lease']
+        return dns, leases
+
+    def link(self, ifname):
+        """State of one link by name; None if unknown or not managed by networkd."""
+        links = self.links()
+        if links is None:
+            return None
+        try:
+            return links.get(socket.if_nametoindex(ifname))
+        except OSError:
+            return None
+
+    def _check_dirs(self):
+        signature = []
+        for path in self._dirs:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_ino, st.st_mtime_ns))
+        signature = tuple(signature)
+        if signature != self._signature:
+            self._signature = signature
+            self.invalidate()
+
+    def _ensure_watcher(self):
+        # Gunicorn forks workers after import, so the inotify thread is
+        # started lazily in whichever process actually reads the state; the
+        # lock keeps concurrent first requests from starting two.
+        pid = os.getpid()
+        if self._watcher_pid == pid:
+            return
+        with self._start_lock:
+            if self._watcher_pid == pid:
+                return
+            self._start_watcher()
+            self._watcher_pid = pid
+
+    def _start_watcher(self):
+        if _inotify_init1 is None:
+            print("inotify unavailable, checking networkd state directories on every read")
+            self._watching = False
+            return
+        fd = _inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            print(f"inotify unavailable, checking networkd state directories on every read: "
+                  f"{os.strerror(ctypes.get_errno())}")
+            self._watching = False
+            return
+        self._add_watches(fd)
+        self._watching = True
+        self.invalidate()
+        threading.Thread(target=self._watch, args=(fd,), daemon=True, name='networkd-state-watcher').start()
+
+    def _add_watches(self, fd):
+        # Adding an existing watch again is harmless; missing directories are retried on the next event
+        for path in self._dirs:
+            if _inotify_add_watch(fd, os.fsencode(path), WATCH_MASK) < 0 and ctypes.get_errno() not in (
+                    errno.ENOENT, errno.ENOTDIR):
+                print(f"Cannot watch {path}: {os.strerror(ctypes.get_errno())}")
+        # The root only for netif/ and resolve/ appearing; events are filtered by name in _watch
+        wd = _inotify_add_watch(fd, os.fsencode(self.root), IN_CREATE | IN_MOVED_TO | IN_ONLYDIR)
+        self._root_wd = wd if wd >= 0 else None
+
+    def _watch(self, fd):
+        while True:
+            try:
+                data = os.read(fd, 1 << 16)
+            except OSError as e:
+                print(f"networkd state watcher stopped: {e}")
+                self._watching = False
+                self.invalidate()
+                return
+            rewatch = changed = False
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if wd == self._root_wd:
+                    if name in ROOT_ENTRIES:
+                        rewatch = changed = True
+                    continue
+                changed = True
+                if mask & (IN_ISDIR | IN_IGNORED | IN_DELETE_SELF):
+                    rewatch = True
+            if rewatch:
+                self._add_watches(fd)
+            if changed:
+                self.invalidate()
+
+
+# Shared by the collectors of one process
+state = NetworkdState()
@@ -0,0 +1,153 @@
+"""
+Content-negotiated encodings of a snapshot, built once per version.
+
+A snapshot body is JSON.  ``SnapshotRepresentations`` also offers:
+
+* ``columnar`` -- compact JSON with one array per field instead of one
+                  object per row, so keys are not repeated for every entry
+* ``msgpack``  -- MessagePack of the snapshot data (needs ``msgpack``)
+
+each optionally compressed with zstd (needs ``zstandard``) or gzip.  The
+format comes from ``?format=`` or the Accept header, the compression from
+Accept-Encoding.  Every (format, compression) pair is rendered the first
+time it is asked for and then served as the same bytes until the snapshot
+version changes, so pollers cost no serialisation or compression at all.
+"""
+import gzip
+import json
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = 'json'
+COLUMNAR = 'columnar'
+MSGPACK = 'msgpack'
+
+MEDIA_TYPES = {
+    JSON: 'application/json',
+    COLUMNAR: 'application/vnd.network-config.columnar+json',
+    MSGPACK: 'application/msgpack',
+}
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Snapshot versions whose renderings are kept, for clients still on the previous one
+KEEP_VERSIONS = 2
+
+
+class FormatUnavailable(ValueError):
+    """Raised when a requested format needs a module that is not installed."""
+
+
+def columns(records):
+    """Turn a list of records into {'count': n, 'columns': {field: [values]}}."""
+    fields = sorted({field for record in records for field in record})
+    return {'count': len(records), 'columns': {field: [record.get(field) for record in records]
+                                               for field in fields}}
+
+
+def formats():
+    """Formats this installation can produce."""
+    return [JSON, COLUMNAR] + ([MSGPACK] if msgpack is not None else [])
+
+
+def encodings():
+    """Content codings this installation can produce, preferred first."""
+    return (['zstd'] if zstandard is not None else []) + ['gzip']
+
+
+def negotiate(args, accept_mimetypes, accept_encodings):
+    """
+    Pick (format, encoding) for a request; encoding is None for identity.
+
+    Raises ValueError for an unknown ``?format=`` and FormatUnavailable for
+    one this installation cannot produce.
+    """
+    requested = args.get('format')
+    if requested:
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+        if requested not in formats():
+            raise FormatUnavailable(f"{requested} is not available on this server")
+        fmt = requested
+    else:
+        offered = [MEDIA_TYPES[fmt] for fmt in formats()]
+        if msgpack is not None:
+            offered.append('application/x-msgpack')
+        match = accept_mimetypes.best_match(offered, default=MEDIA_TYPES[JSON])
+        fmt = MSGPACK if 'msgpack' in match else next(fmt for fmt, media in MEDIA_TYPES.items() if media == match)
+    encoding = accept_encodings.best_match(encodings() + ['identity'], default='identity')
+    return fmt, None if encoding == 'identity' else encoding
+
+
+class SnapshotRepresentations:
+    def __init__(self, to_columnar):
+        """to_columnar -- maps snapshot data to its columnar layout"""
+        self._to_columnar = to_columnar
+        self._lock = threading.Lock()
+        self._rendered = {}     # etag -> {(format, encoding): (body, encoding applied)}
+
+    def _render(self, snapshot, fmt):
+        if fmt == COLUMNAR:
+            return json.dumps(self._to_columnar(snapshot.data), separators=(',', ':')).encode()
+        if fmt == MSGPACK:
+            return msgpack.packb(snapshot.data)
+        return snapshot.body
+
+    @staticmethod
+    def _compress(body, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+    def get(self, snapshot, fmt, encoding=None):
+        """Return (body, encoding actually applied) for ``snapshot`` in ``fmt``."""
+        with self._lock:
+            rendered = self._rendered.get(snapshot.etag)
+            if rendered is None:
+                rendered = self._rendered[snapshot.etag] = {}
+                while len(self._rendered) > KEEP_VERSIONS:
+                    del self._rendered[next(iter(self._rendered))]
+            cached = rendered.get((fmt, encoding))
+        if cached is not None:
+            return cached
+
+        # Racing requests may both render; either result is the same bytes
+        plain = rendered.get((fmt, None))
+        if plain is None:
+            plain = rendered[(fmt, None)] = (self._render(snapshot, fmt), None)
+        result = plain
+        if encoding is not None and len(plain[0]) >= COMPRESS_MIN_BYTES:
+            result = rendered[(fmt, encoding)] = (self._compress(plain[0], encoding), encoding)
+        return result
+
+    def response(self, response_class, request, snapshot):
+        """Build the (possibly 304) response for ``snapshot`` negotiated from ``request``."""
+        try:
+            fmt, encoding = negotiate(request.args, request.accept_mimetypes, request.accept_encodings)
+        except ValueError as e:
+            status = 406 if isinstance(e, FormatUnavailable) else 400
+            return response_class(json.dumps({'error': str(e)}), status=status, mimetype='application/json')
+        body, encoding = self.get(snapshot, fmt, encoding)
+        etag = snapshot.etag if fmt == JSON else f"{snapshot.etag}.{fmt}"
+        if encoding is not None:
+            etag = f"{etag}.{encoding}"
+        if request.if_none_match.contains(etag):
+            response = response_class(status=304)
+        else:
+            response = response_class(body, mimetype=MEDIA_TYPES[fmt])
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        return response
@@ -0,0 +1,183 @@
+"""
+Per-request stage timings and opt-in profiling for the Flask apps.
+
+``install(app)`` makes every response carry a ``Server-Timing`` header with
+the time spent in each named stage plus the whole request (``app``).  Code on
+the request path marks stages with ``with stage('netlink'):``; commands run
+through ``command_runner`` are added as ``cmd-<program>-<subcommand>``
+stages automatically, and JSON encoding is timed as ``serialize``.
+
+A request from localhost carrying ``X-Profile: 1`` (or ``?profile=1``) is
+also run under cProfile.  Requests relayed by a proxy on this machine (the
+UI's ``/api1`` and ``/api2``) carry ``X-Forwarded-For`` and are not local.  The profile is stored in PROFILE_DIR, shared by all
+workers, and its id is returned in the ``X-Profile-Id`` header; fetch it from
+``/profiles/<id>`` (pstats format, or ``?format=text`` for a summary).
+"""
+import contextlib
+import contextvars
+import cProfile
+import io
+import ipaddress
+import os
+import pstats
+import re
+import time
+import uuid
+
+from flask import abort, g, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
+
+import command_runner
+
+PROFILE_DIR = '/run/network-configuration/profiles'
+# Oldest profiles are deleted beyond this many
+MAX_PROFILES = 50
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TEXT_LINES = 40
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+_timings = contextvars.ContextVar('request_timings', default=None)
+_observing_commands = False
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+_TOKEN_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def add(name, seconds):
+    """Add ``seconds`` to stage ``name`` of the current request, if any."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+
+
+def server_timing(timings):
+    """Format {stage: seconds} as a Server-Timing header value."""
+    return ', '.join(f"{_TOKEN_UNSAFE.sub('-', name)};dur={seconds * 1e3:.2f}"
+                     for name, seconds in timings.items())
+
+
+def is_local(address):
+    try:
+        return ipaddress.ip_address(address or '').is_loopback
+    except ValueError:
+        return False
+
+
+def is_local_request(req):
+    """True for a request made on this machine, not one a local proxy relayed for a remote client."""
+    if not is_local(req.remote_addr):
+        return False
+    forwarded = req.headers.get('X-Forwarded-For')
+    return forwarded is None or all(is_local(hop.strip()) for hop in forwarded.split(','))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that accounts encoding time to the ``serialize`` stage."""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def _store_profile(profile, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    path = os.path.join(profile_dir, f"{profile_id}.prof")
+    profile.dump_stats(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+    profiles = sorted((entry for entry in os.scandir(profile_dir) if entry.name.endswith('.prof')),
+                      key=lambda entry: entry.stat().st_mtime)
+    for entry in profiles[:-MAX_PROFILES]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+    return profile_id
+
+
+def install(app, profile_dir=PROFILE_DIR):
+    """Add Server-Timing headers and the profiling hook and endpoints to ``app``."""
+    global _observing_commands
+    app.json = TimedJSONProvider(app)
+    # Once per process, however many apps it serves
+    if not _observing_commands:
+        _observing_commands = True
+        command_runner.runner.observers.append(lambda key, seconds, *_outcome: add(f"cmd-{key}", seconds))
+
+    @app.before_request
+    def start_timing():
+        g.request_start = time.perf_counter()
+        g.request_timings = {}
+        g.request_timings_token = _timings.set(g.request_timings)
+        g.profile = None
+        wanted = request.headers.get(PROFILE_HEADER) == '1' or request.args.get('profile') == '1'
+        if wanted and is_local_request(request):
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    @app.after_request
+    def add_server_timing(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        if g.profile is not None:
+            g.profile.disable()
+            try:
+                profile_id = _store_profile(g.profile, profile_dir)
+                response.headers['X-Profile-Id'] = profile_id
+            except OSError as e:
+                print(f"Failed to store profile: {e}")
+            g.profile = None
+        timings = dict(g.request_timings)
+        timings['app'] = elapsed
+        response.headers['Server-Timing'] = server_timing(timings)
+        return response
+
+    @app.teardown_request
+    def stop_timing(_error=None):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            # Streaming or failed requests may not have gone through after_request
+            profile.disable()
+        token = g.pop('request_timings_token', None)
+        if token is not None:
+            _timings.reset(token)
+
+    @app.route('/profiles', methods=['GET'])
+    def list_profiles():
+        if not is_local_request(request):
+            abort(403)
+        try:
+            entries = [entry for entry in os.scandir(profile_dir) if entry.name.endswith('.prof')]
+        except FileNotFoundError:
+            entries = []
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return jsonify([{'id': entry.name[:-len('.prof')], 'created': entry.stat().st_mtime,
+                         'url': f"/profiles/{entry.name[:-len('.prof')]}"} for entry in entries])
+
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        if not is_local_request(request):
+            abort(403)
+        path = os.path.join(profile_dir, f"{profile_id}.prof")
+        if not _PROFILE_ID.match(profile_id) or not os.path.exists(path):
+            return jsonify({'error': 'Profile not found.'}), 404
+        if request.args.get('format') == 'text':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in PROFILE_SORT_KEYS:
+                return jsonify({'error': f"sort must be one of {', '.join(PROFILE_SORT_KEYS)}"}), 400
+            out = io.StringIO()
+            pstats.Stats(path, stream=out).sort_stats(sort).print_stats(PROFILE_TEXT_LINES)
+            return app.response_class(out.getvalue(), mimetype='text/plain')
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{profile_id}.prof")
@@ -0,0 +1,178 @@
+"""
+Longest-prefix-match index over routing table prefixes.
+
+``PrefixTrie`` is a path-compressed binary (PATRICIA) trie keyed by address
+integers: each node stores one prefix and the branches below it differ in the
+first bit past that prefix, so a table of N prefixes has fewer than 2N nodes
+and a lookup visits at most one node per prefix length on its path instead of
+one per address bit.  Prefixes are inserted and removed one at a time, which
+is what keeps the route table current from route notifications without
+rebuilding anything.
+
+Nodes are slots in parallel arrays rather than objects: a large table is a
+handful of arrays the garbage collector never has to walk, and a lookup step
+is a few indexing operations.
+"""
+import socket
+from array import array
+
+FAMILY_BITS = {socket.AF_INET: 32, socket.AF_INET6: 128}
+NO_NODE = -1
+
+
+def parse_address(value):
+    """Return (family, address int) for an IPv4 or IPv6 address string; raises ValueError."""
+    value = value.strip()
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            return family, int.from_bytes(socket.inet_pton(family, value), 'big')
+        except OSError:
+            continue
+    raise ValueError(f"Not an IP address: {value!r}")
+
+
+class PrefixTrie:
+    def __init__(self, bits):
+        self.bits = bits
+        # Per node: prefix length, the prefix's top ``length`` bits, both children
+        self._length = array('B', [0])
+        self._top = [0]
+        self._children = (array('l', [NO_NODE]), array('l', [NO_NODE]))
+        # Entries stored under exactly this prefix, or None for a branch-only node
+        self._values = [None]
+        self._free = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _node(self, key, length, values):
+        top = key >> (self.bits - length)
+        if self._free:
+            node = self._free.pop()
+            self._length[node], self._top[node], self._values[node] = length, top, values
+            self._children[0][node] = self._children[1][node] = NO_NODE
+            return node
+        self._length.append(length)
+        self._top.append(top)
+        self._values.append(values)
+        self._children[0].append(NO_NODE)
+        self._children[1].append(NO_NODE)
+        return len(self._values) - 1
+
+    def _walk(self, key, length):
+        """Nodes from the root towards key/length; the last one holds it exactly if it exists."""
+        bits, lengths, tops, children = self.bits, self._length, self._top, self._children
+        path = [0]
+        node = 0
+        while lengths[node] < length:
+            node = children[(key >> (bits - 1 - lengths[node])) & 1][node]
+            if node == NO_NODE or lengths[node] > length or key >> (bits - lengths[node]) != tops[node]:
+                break
+            path.append(node)
+        return path
+
+    def get(self, key, length):
+        """The dict stored for exactly ``key``/``length``, or None."""
+        node = self._walk(key, length)[-1]
+        return self._values[node] if self._length[node] == length else None
+
+    def setdefault(self, key, length):
+        """The dict stored for ``key``/``length``, inserting an empty one if needed."""
+        bits, lengths, tops, children = self.bits, self._length, self._top, self._children
+        key = key >> (bits - length) << (bits - length) if length else 0
+        node = 0
+        while True:
+            node_length = lengths[node]
+            if node_length == length:
+                if self._values[node] is None:
+                    self._values[node] = {}
+                    self._size += 1
+                return self._values[node]
+            bit = (key >> (bits - 1 - node_length)) & 1
+            child = children[bit][node]
+            if child == NO_NODE:
+                leaf = self._node(key, length, {})
+                children[bit][node] = leaf
+                self._size += 1
+                return self._values[leaf]
+            child_length = lengths[child]
+            child_key = tops[child] << (bits - child_length)
+            common = min(length, child_length, bits - (key ^ child_key).bit_length())
+            if common == child_length:
+                node = child
+                continue
+            # Split the edge to ``child`` at the first differing bit (or at the new prefix)
+            middle = self._node(key >> (bits - common) << (bits - common) if common else 0, common,
+                                {} if common == length else None)
+            children[(child_key >> (bits - 1 - common)) & 1][middle] = child
+            children[bit][node] = middle
+            if common == length:
+                self._size += 1
+                return self._values[middle]
+            leaf = self._node(key, length, {})
+            children[(key >> (bits - 1 - common)) & 1][middle] = leaf
+            self._size += 1
+            return self._values[leaf]
+
+    def discard(self, key, length):
+        """Remove the prefix ``key``/``length`` and its dict, if present."""
+        path = self._walk(key, length)
+        node = path[-1]
+        if self._length[node] != length or self._values[node] is None:
+            return
+        self._values[node] = None
+        self._size -= 1
+        # Drop nodes that no longer store or branch anything
+        children = self._children
+        while len(path) > 1:
+            node = path.pop()
+            if self._values[node] is not None:
+                break
+            below = [child[node] for child in children if child[node] != NO_NODE]
+            if len(below) == 2:
+                break
+            parent = path[-1]
+            side = 0 if children[0][parent] == node else 1
+            children[side][parent] = below[0] if below else NO_NODE
+            self._free.append(node)
+            if below:
+                break
+
+    def lookup(self, key, accept=None):
+        """
+        Dicts of every stored prefix containing ``key``, longest first.
+
+        With ``accept(values)``, only the longest dict it accepts is returned
+        (or none), which is the usual longest-match lookup.
+        """
+        bits, lengths, tops, children, values = self.bits, self._length, self._top, self._children, self._values
+        matches = []
+        node = 0
+        while True:
+            if values[node]:
+                matches.append(values[node])
+            node_length = lengths[node]
+            if node_length == bits:
+                break
+            child = children[(key >> (bits - 1 - node_length)) & 1][node]
+            if child == NO_NODE or key >> (bits - lengths[child]) != tops[child]:
+                break
+            node = child
+        matches.reverse()
+        if accept is None:
+            return matches
+        for match in matches:
+            if accept(match):
+                return [match]
+        return []
+
+    def items(self):
+        """(key, length, dict) for every stored prefix, in address order."""
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            length = self._length[node]
+            if self._values[node]:
+                yield self._top[node] << (self.bits - length), length, self._values[node]
+            stack.extend(child[node] for child in reversed(self._children) if child[node] != NO_NODE)
@@ -0,0 +1,393 @@
+"""
+Routing tables and policy rules kept current by rtnetlink notifications.
+
+``RouteTable`` dumps every route (all tables, IPv4 and IPv6) and rule once,
+then applies route and rule notifications one by one: each route lives in a
+``PrefixTrie`` per (family, table), so an added or removed route touches one
+trie path instead of triggering a new dump.  Notifications lost to a full
+socket buffer (ENOBUFS) trigger a full reload, as for the neighbour table.
+
+``lookup()`` answers what ``ip route get <dst>`` would for locally sent
+traffic: the rules are walked by priority, a matching ``lookup`` rule
+consults its table's trie for the longest prefix, and the first route found
+gives the interface, gateway and source address.  Rules that select on
+packet marks or output interfaces don't apply to such traffic.  Without a
+preferred source on the route, the first address of the output interface
+that covers the gateway (or the destination) is used, else its first
+global one: the kernel's choice for IPv4, an approximation of RFC 6724
+for IPv6.
+"""
+import errno
+import ipaddress
+import os
+import socket
+import threading
+import time
+
+import netlink
+from request_timing import stage
+from route_index import FAMILY_BITS, PrefixTrie, parse_address
+
+# Max table age when route notifications cannot be received
+FALLBACK_TTL = 2.0
+# Destinations accepted by one batched lookup
+MAX_LOOKUPS = 10000
+
+FAMILY_NAMES = {socket.AF_INET: 'inet', socket.AF_INET6: 'inet6'}
+# Local delivery is reported on the loopback device, like `ip route get`
+LOOPBACK = 'lo'
+WATCH_GROUPS = (netlink.RTMGRP_LINK | netlink.RTMGRP_IPV4_IFADDR | netlink.RTMGRP_IPV6_IFADDR
+                | netlink.RTMGRP_IPV4_ROUTE | netlink.RTMGRP_IPV6_ROUTE | netlink.RTMGRP_IPV4_RULE)
+
+
+def read_routing_state():
+    """Dump routes, rules, links and addresses over one socket."""
+    with netlink.NetlinkSocket() as nl:
+        return (
+            nl.dump_parsed(netlink.RTM_GETROUTE),
+            nl.dump_parsed(netlink.RTM_GETRULE),
+            nl.dump_parsed(netlink.RTM_GETLINK),
+            nl.dump_parsed(netlink.RTM_GETADDR),
+        )
+
+
+def route_key(route):
+    return (route['family'], route['table'], route['dst'], route['dst_len'], route['tos'], route['metric'])
+
+
+def parse_table(value):
+    """Accept a table name (main, local, default) or number; raises ValueError."""
+    for number, name in netlink.TABLE_NAMES.items():
+        if value == name:
+            return number
+    table = int(value)
+    if not 0 < table < 1 << 32:
+        raise ValueError(f"Invalid table {value!r}")
+    return table
+
+
+def parse_family(value):
+    for family, name in FAMILY_NAMES.items():
+        if value in (name, f"ipv{4 if family == socket.AF_INET else 6}"):
+            return family
+    raise ValueError(f"Invalid family {value!r}; expected inet or inet6")
+
+
+def _prefix(family, address, length):
+    if address is None:
+        return 'default' if length == 0 else f"{'0.0.0.0' if family == socket.AF_INET else '::'}/{length}"
+    return f"{address}/{length}"
+
+
+def _rule_selects(family, selector, length, address):
+    if selector is None or length == 0:
+        return True
+    shift = FAMILY_BITS[family] - length
+    return parse_address(selector)[1] >> shift == address >> shift
+
+
+def rule_matches(rule, dst, src):
+    """Whether ``rule`` selects locally sent traffic to ``dst`` from ``src`` (ints; src may be None)."""
+    family = rule['family']
+    matches = (_rule_selects(family, rule['dst'], rule['dst_len'], dst)
+               and _rule_selects(family, rule['src'], rule['src_len'], src or 0)
+               and rule['tos'] == 0
+               and rule['iif'] in (None, LOOPBACK)
+               and rule['oif'] is None
+               and (rule['fwmark'] is None or rule['fwmark'] & (rule['fwmask'] or 0xffffffff) == 0))
+    return matches != rule['invert']
+
+
+def best_route(values):
+    """The route the kernel prefers among those for one prefix: TOS-agnostic, lowest metric."""
+    candidates = [route for route in values.values() if route['tos'] == 0]
+    return min(candidates, key=lambda route: route['metric']) if candidates else None
+
+
+class RouteTable:
+    def __init__(self, reader=read_routing_state):
+        self._reader = reader
+        self._lock = threading.RLock()
+        self.version = 0
+        self._tries = {}
+        self._rules = []
+        self._link_names = {}
+        self._addresses = {}
+        self._addresses_stale = False
+
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._watcher_pid = None
+        self._start_lock = threading.Lock()
+        self._watching = False
+
+    # -- mutation ---------------------------------------------------------
+
+    def _trie(self, family, table):
+        trie = self._tries.get((family, table))
+        if trie is None:
+            trie = self._tries[family, table] = PrefixTrie(FAMILY_BITS[family])
+        return trie
+
+    def upsert_route(self, route):
+        if route['family'] not in FAMILY_BITS or route['cloned']:
+            return
+        with self._lock:
+            key = parse_address(route['dst'])[1] if route['dst'] else 0
+            self._trie(route['family'], route['table']).setdefault(key, route['dst_len'])[route_key(route)] = route
+            self.version += 1
+
+    def remove_route(self, route):
+        if route['family'] not in FAMILY_BITS:
+            return
+        with self._lock:
+            trie = self._tries.get((route['family'], route['table']))
+            key = parse_address(route['dst'])[1] if route['dst'] else 0
+            values = trie.get(key, route['dst_len']) if trie is not None else None
+            if values is None or values.pop(route_key(route), None) is None:
+                return
+            if not values:
+                trie.discard(key, route['dst_len'])
+            self.version += 1
+
+    def upsert_rule(self, rule):
+        if rule['family'] not in FAMILY_BITS:
+            return
+        with self._lock:
+            if rule not in self._rules:
+                self._rules.append(rule)
+                self._rules.sort(key=lambda rule: rule['priority'])
+                self.version += 1
+
+    def remove_rule(self, rule):
+        with self._lock:
+            if rule in self._rules:
+                self._rules.remove(rule)
+                self.version += 1
+
+    def _set_addresses(self, addrs):
+        addresses = {}
+        for addr in addrs:
+            if addr['family'] in FAMILY_BITS and addr['address']:
+                addresses.setdefault(addr['index'], []).append(addr)
+        self._addresses = addresses
+        self._addresses_stale = False
+
+    def reload(self):
+        with stage('netlink'):
+            routes, rules, links, addrs = self._reader()
+        with self._lock:
+            self._tries = {}
+            self._rules = []
+            for route in routes:
+                self.upsert_route(route)
+            for rule in rules:
+                self.upsert_rule(rule)
+            self._link_names = {link['index']: link['ifname'] for link in links}
+            self._set_addresses(addrs)
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+
+    # -- queries ----------------------------------------------------------
+
+    def _ensure_current(self):
+        self._ensure_watcher()
+        if not self._loaded or (not self._watching and time.monotonic() - self._loaded_at > FALLBACK_TTL):
+            self.reload()
+        elif self._addresses_stale:
+            with netlink.NetlinkSocket() as nl:
+                addrs = nl.dump_parsed(netlink.RTM_GETADDR)
+            with self._lock:
+                self._set_addresses(addrs)
+
+    def _name(self, index):
+        return self._link_names.get(index, str(index)) if index is not None else None
+
+    def describe(self, route):
+        """A route as the /routes endpoint shows it."""
+        record = {
+            'family': FAMILY_NAMES[route['family']],
+            'table': netlink.TABLE_NAMES.get(route['table'], route['table']),
+            'dst': _prefix(route['family'], route['dst'], route['dst_len']),
+            'type': netlink.ROUTE_TYPES.get(route['type'], route['type']),
+            'protocol': netlink.PROTOCOLS.get(route['protocol'], route['protocol']),
+            'scope': netlink.SCOPES.get(route['scope'], route['scope']),
+            'iface': self._name(route['oif']),
+            'gateway': route['gateway'],
+            'src': route['prefsrc'],
+            'metric': route['metric'],
+        }
+        if route['nexthops']:
+            record['nexthops'] = [{'iface': self._name(nexthop['oif']), 'gateway': nexthop['gateway'],
+                                   'weight': nexthop['weight']} for nexthop in route['nexthops']]
+        return record
+
+    def _describe_rule(self, rule):
+        record = {'family': FAMILY_NAMES[rule['family']], 'priority': rule['priority'],
+                  'action': netlink.RULE_ACTIONS.get(rule['action'], rule['action'])}
+        if rule['action'] == netlink.FR_ACT_TO_TBL:
+            record['table'] = netlink.TABLE_NAMES.get(rule['table'], rule['table'])
+        for key in ('src', 'dst'):
+            if rule[key]:
+                record[key] = _prefix(rule['family'], rule[key], rule[f"{key}_len"])
+        for key in ('iif', 'oif', 'fwmark', 'goto'):
+            if rule[key] is not None:
+                record[key] = rule[key]
+        if rule['invert']:
+            record['not'] = True
+        return record
+
+    def listing(self, family=None, table=None):
+        """{'version', 'routes', 'rules'}, optionally for one family and/or table."""
+        self._ensure_current()
+        with self._lock:
+            routes = []
+            for (trie_family, trie_table), trie in sorted(self._tries.items()):
+                if family not in (None, trie_family) or table not in (None, trie_table):
+                    continue
+                for _key, _length, values in trie.items():
+                    routes.extend(self.describe(route) for route in sorted(values.values(),
+                                                                           key=lambda route: route['metric']))
+            rules = [self._describe_rule(rule) for rule in self._rules if family in (None, rule['family'])]
+            return {'version': self.version, 'routes': routes, 'rules': rules}
+
+    def _source(self, route, oif, family, dst):
+        if route['prefsrc']:
+            return route['prefsrc']
+        addrs = [addr for addr in self._addresses.get(oif, ()) if addr['family'] == family]
+        if not addrs:
+            return None
+        target = route['gateway'] or dst
+        target_int = parse_address(target)[1]
+        bits = FAMILY_BITS[family]
+        for addr in addrs:
+            length = addr['prefixlen']
+            if length and parse_address(addr['address'])[1] >> (bits - length) == target_int >> (bits - length):
+                return addr['address']
+        link_local = family == socket.AF_INET6 and ipaddress.ip_address(target).is_link_local
+        for addr in addrs:
+            if link_local or addr['scope'] == netlink.RT_SCOPE_UNIVERSE:
+                return addr['address']
+        return addrs[0]['address']
+
+    def _resolve(self, dst, src=None):
+        try:
+            family, address = parse_address(dst)
+            source = parse_address(src)[1] if src else None
+        except (ValueError, AttributeError):
+            return {'dst': dst, 'error': 'Not an IP address.'}
+        goto = None
+        for rule in self._rules:
+            if rule['family'] != family or (goto is not None and rule['priority'] < goto):
+                continue
+            goto = None
+            if not rule_matches(rule, address, source):
+                continue
+            action = rule['action']
+            if action == netlink.FR_ACT_GOTO:
+                goto = rule['goto']
+                continue
+            if action in (netlink.FR_ACT_BLACKHOLE, netlink.FR_ACT_UNREACHABLE, netlink.FR_ACT_PROHIBIT):
+                return {'dst': dst, 'type': netlink.RULE_ACTIONS[action], 'rule': rule['priority'],
+                        'error': os.strerror(errno.EACCES if action == netlink.FR_ACT_PROHIBIT else errno.ENETUNREACH)}
+            if action != netlink.FR_ACT_TO_TBL:
+                continue
+            trie = self._tries.get((family, rule['table']))
+            matches = trie.lookup(address, accept=best_route) if trie is not None else []
+            route = best_route(matches[0]) if matches else None
+            if route is None or route['type'] == netlink.RTN_THROW:
+                continue
+            return self._answer(dst, family, route, rule)
+        return {'dst': dst, 'type': 'unreachable', 'error': os.strerror(errno.ENETUNREACH)}
+
+    def _answer(self, dst, family, route, rule):
+        record = self.describe(route)
+        route_type = route['type']
+        if route_type in (netlink.RTN_BLACKHOLE, netlink.RTN_UNREACHABLE, netlink.RTN_PROHIBIT):
+            error = errno.EACCES if route_type == netlink.RTN_PROHIBIT else errno.ENETUNREACH
+            return {'dst': dst, 'type': record['type'], 'route': record['dst'], 'table': record['table'],
+                    'rule': rule['priority'], 'error': os.strerror(error)}
+        oif, gateway = route['oif'], route['gateway']
+        if route['nexthops']:
+            # The kernel hashes flows over the nexthops; report the first and list them all
+            oif, gateway = route['nexthops'][0]['oif'], route['nexthops'][0]['gateway']
+        answer = {
+            'dst': dst,
+            'type': record['type'],
+            'route': record['dst'],
+            'table': record['table'],
+            'rule': rule['priority'],
+            'iface': LOOPBACK if route_type == netlink.RTN_LOCAL else self._name(oif),
+            'gateway': gateway,
+            'src': self._source(route, oif, family, dst),
+            'metric': route['metric'],
+        }
+        if route['nexthops']:
+            answer['nexthops'] = record['nexthops']
+        return answer
+
+    def lookup(self, destinations, src=None):
+        """Resolve each destination address; unknown or invalid ones get an 'error' entry."""
+        self._ensure_current()
+        with self._lock:
+            return [self._resolve(dst, src) for dst in destinations]
+
+    # -- kernel notifications --------------------------------------------
+
+    def _ensure_watcher(self):
+        # Started lazily so each gunicorn worker gets its own listener; the
+        # lock keeps concurrent first requests from starting two
+        pid = os.getpid()
+        if self._watcher_pid == pid:
+            return
+        with self._start_lock:
+            if self._watcher_pid == pid:
+                return
+            try:
+                sock = netlink.NetlinkSocket(groups=WATCH_GROUPS, rcvbuf=4 << 20)
+                sock.add_membership(netlink.RTNLGRP_IPV6_RULE)
+            except OSError as e:
+                print(f"Route events unavailable, re-reading the tables every {FALLBACK_TTL}s: {e}")
+                self._watching = False
+            else:
+                self._watching = True
+                threading.Thread(target=self._watch, args=(sock,), daemon=True, name='route-watcher').start()
+            self._watcher_pid = pid
+
+    def _handle(self, msg_type, payload):
+        if msg_type in (netlink.RTM_NEWLINK, netlink.RTM_DELLINK):
+            link = netlink.parse_link(payload)
+            with self._lock:
+                if msg_type == netlink.RTM_NEWLINK:
+                    self._link_names[link['index']] = link['ifname']
+                else:
+                    self._link_names.pop(link['index'], None)
+        elif msg_type in (netlink.RTM_NEWADDR, netlink.RTM_DELADDR):
+            # Re-read on the next lookup; addresses change rarely and come in bursts
+            self._addresses_stale = True
+        elif msg_type == netlink.RTM_NEWROUTE:
+            self.upsert_route(netlink.parse_route(payload))
+        elif msg_type == netlink.RTM_DELROUTE:
+            self.remove_route(netlink.parse_route(payload))
+        elif msg_type == netlink.RTM_NEWRULE:
+            self.upsert_rule(netlink.parse_rule(payload))
+        elif msg_type == netlink.RTM_DELRULE:
+            self.remove_rule(netlink.parse_rule(payload))
+
+    def _watch(self, sock):
+        while True:
+            try:
+                data = sock.recv_raw(1 << 20)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Notifications were dropped; a dump brings us back in sync
+                    self.reload()
+                    continue
+                print(f"Route watcher stopped: {e}")
+                self._watching = False
+                return
+            for msg_type, _flags, _seq, payload in netlink.parse_messages(data):
+                try:
+                    self._handle(msg_type, payload)
+                except Exception as e:
+                    print(f"Error handling route event: {e}")
@@ -0,0 +1,188 @@
+"""
+Both backends in one gunicorn service.
+
+Network-configuration.py and arp-pythonscript.py normally run as two
+services, each a Python wrapper that starts a separate gunicorn with 4
+workers.  This script runs gunicorn in-process instead, with a single set of
+workers serving both apps:
+
+* requests arriving on the network bind (5001) go to Network-configuration,
+  requests on the ARP bind (5002) go to arp-pythonscript, so the UI proxy
+  and existing clients are unchanged; ``/api1/...`` and ``/api2/...`` reach
+  the same apps on either port
+* the apps are imported once in the master before forking (preload), and
+  the collected heap is frozen so workers share it copy-on-write
+* workers default to the CPU count, clamped to 2..4, with 16 threads each;
+  NETWORK_CONFIG_WORKERS / NETWORK_CONFIG_THREADS or the options override it
+* systemd is told when the service is ready (Type=notify)
+* with --ui-bind, that port also serves the prebuilt web UI (static_ui.py)
+  next to the same-origin /api1 and /api2 routes
+
+    python3 server.py [--workers N] [--threads N] [--ui-bind 0.0.0.0:5000]
+"""
+import argparse
+import gc
+import importlib
+import os
+import socket
+
+from gunicorn.app.base import BaseApplication
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+import metrics
+import shared_snapshot
+import static_ui
+
+NETWORK_BIND = '0.0.0.0:5001'
+ARP_BIND = '0.0.0.0:5002'
+MIN_WORKERS = 2
+MAX_WORKERS = 4
+THREADS = 16
+# Idle keep-alive connections are held this long, longer than a fleet poll interval
+KEEPALIVE = 30
+
+
+def default_workers():
+    return max(MIN_WORKERS, min(os.cpu_count() or 1, MAX_WORKERS))
+
+
+def bind_port(bind):
+    return int(bind.rsplit(':', 1)[1])
+
+
+def sd_notify(state):
+    """Send ``state`` to systemd's notification socket, if running under it."""
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.sendto(state.encode(), address)
+    except OSError as e:
+        print(f"Failed to notify systemd: {e}")
+
+
+class PortDispatcher:
+    """WSGI app handing each request to the app bound to the port it arrived on."""
+
+    def __init__(self, apps_by_port, default):
+        self.apps_by_port = apps_by_port
+        self.default = default
+
+    def __call__(self, environ, start_response):
+        port = None
+        sock = environ.get('gunicorn.socket')
+        if sock is not None:
+            try:
+                port = sock.getsockname()[1]
+            except (OSError, IndexError, TypeError):
+                port = None
+        if port is None:
+            # SERVER_PORT may come from the Host header, so it is the fallback
+            port = int(environ.get('SERVER_PORT') or 0)
+        return self.apps_by_port.get(port, self.default)(environ, start_response)
+
+
+def load_apps(network_bind=None, arp_bind=None, ui_bind=None, dist_dir=static_ui.DIST_DIR):
+    """Import both backends and return the combined WSGI app."""
+    network_configuration = importlib.import_module('Network-configuration')
+    arp_backend = importlib.import_module('arp-pythonscript')
+    apps_by_port = {}
+    if network_bind:
+        apps_by_port[bind_port(network_bind)] = network_configuration.app
+    if arp_bind:
+        apps_by_port[bind_port(arp_bind)] = arp_backend.app
+    if ui_bind:
+        apps_by_port[bind_port(ui_bind)] = static_ui.StaticUI(dist_dir)
+    by_port = PortDispatcher(apps_by_port, network_configuration.app)
+    return DispatcherMiddleware(by_port, {'/api1': network_configuration.app, '/api2': arp_backend.app})
+
+
+def prepare(run_os_setup=True):
+    """One-time tasks the two services' __main__ blocks used to run."""
+    # Values and snapshots of a previous run; before any app is imported
+    for service in ('network-configuration', 'arp'):
+        metrics.reset(service)
+    for name in ('network-info', 'arp'):
+        shared_snapshot.reset(name)
+
+    network_configuration = importlib.import_module('Network-configuration')
+    arp_backend = importlib.import_module('arp-pythonscript')
+    if run_os_setup:
+        os_version = network_configuration.check_os_version()
+        print(f"Detected OS version: {os_version}")
+        if os_version == "22.04":
+            print("Ubuntu 22.04 detected. Setting up network configuration.")
+            network_configuration.setup_network_for_ubuntu22()
+    # Migrate any legacy `arp -s` script and install the batched restore hook
+    arp_backend.static_arp_store.entries()
+    arp_backend.static_arp_store.install_hook()
+
+
+def when_ready(server):
+    # Objects loaded so far are never freed; keep the collector from
+    # touching (and so copying) their pages in every worker
+    gc.freeze()
+    sd_notify(f"READY=1\nMAINPID={os.getpid()}\nSTATUS=Serving with {server.cfg.workers} workers")
+
+
+def post_worker_init(_worker):
+    # Every worker stands by to sample counters, not only those that got a request
+    importlib.import_module('Network-configuration').counter_sampler.ensure_thread()
+
+
+def on_exit(_server):
+    sd_notify("STOPPING=1")
+
+
+class Server(BaseApplication):
+    def __init__(self, options, app=None, **binds):
+        """
+        app   -- WSGI app to serve instead of the backends
+        binds -- the load_apps() arguments naming which bind serves which app
+        """
+        self.options = options
+        self.app = app
+        self.binds = binds
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.app if self.app is not None else load_apps(**self.binds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the network configuration and ARP backends together.")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('NETWORK_CONFIG_WORKERS') or default_workers()))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('NETWORK_CONFIG_THREADS') or THREADS))
+    parser.add_argument('--network-bind', default=NETWORK_BIND)
+    parser.add_argument('--arp-bind', default=ARP_BIND)
+    parser.add_argument('--ui-bind', help="also serve the web UI here (replaces ui.service)")
+    parser.add_argument('--dist', default=static_ui.DIST_DIR, help="built UI directory for --ui-bind")
+    parser.add_argument('--skip-os-setup', action='store_true',
+                        help="don't run the first-boot netplan setup for Ubuntu 22.04")
+    args = parser.parse_args()
+
+    prepare(run_os_setup=not args.skip_os_setup)
+    binds = [args.network_bind, args.arp_bind] + ([args.ui_bind] if args.ui_bind else [])
+    Server({
+        'bind': binds,
+        'workers': args.workers,
+        'worker_class': 'gthread',  # open event streams don't pin a whole worker
+        'threads': args.threads,
+        'keepalive': KEEPALIVE,
+        'preload_app': True,
+        'when_ready': when_ready,
+        'post_worker_init': post_worker_init,
+        'on_exit': on_exit,
+    }, network_bind=args.network_bind, arp_bind=args.arp_bind, ui_bind=args.ui_bind, dist_dir=args.dist).run()
+
+
+if __name__ == '__main__':
+    main()
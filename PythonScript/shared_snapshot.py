@@ -0,0 +1,289 @@
+"""
+Snapshot shared by all gunicorn workers through a memory-mapped file.
+
+Without it every worker keeps its own ``SnapshotCache`` and repeats the same
+collection.  ``SharedSnapshot`` wraps such a cache: one worker per service,
+the holder of ``lock_path``, keeps collecting and publishes each new
+serialised body into ``/dev/shm``; the other workers only map the file and
+serve the published bytes.  If the publishing worker dies its lock is
+released and another worker's thread takes over.
+
+Reads are seqlock style: the writer makes the sequence number odd, writes
+the body and header, then makes it even again; a reader copies the body
+only when the sequence number moved, and retries if it changed under it.
+Steady-state requests therefore reuse the same ``bytes`` object without
+copying anything, and the body is only parsed when a stream needs the data.
+
+File layout: a fixed header (seq, version, length, retired, delta length,
+etag) followed by the body and the delta.  A body that outgrows the file is written to a new, larger
+file that replaces the old one; the old one is marked retired so readers
+remap.
+
+``SharedSnapshot`` offers ``get``, ``generation``, ``invalidate`` and
+``wait_for_invalidation`` like ``SnapshotCache``, so views and
+``SnapshotBroadcaster`` can use either.  The source only needs that
+interface too: a ``versioned`` source (``NeighborTable``) numbers its own
+snapshots, and its version and ETag are published unchanged so every worker
+reports the same ones.  It also supplies a ``delta(snapshot)`` (bytes) with
+each one, published alongside it; followers read it as the record's
+``delta`` and can apply it instead of parsing the whole body.
+"""
+import fcntl
+import functools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from snapshot_cache import Snapshot
+
+SHM_DIR = '/dev/shm/network-configuration'
+LOCK_DIR = '/run/network-configuration'
+# seq, version, body length, retired flag, delta length, etag
+HEADER = struct.Struct('<QQQQQ64s')
+INITIAL_CAPACITY = 1 << 20
+# Followers poll the sequence number this often while waiting for a change
+POLL_SECONDS = 0.05
+# Upper bound on how long the publisher goes without checking the cache,
+# so file-based invalidation (netplan edits) is still noticed
+REFRESH_SECONDS = 0.5
+# Lets a burst of events settle into one rebuild
+COALESCE_SECONDS = 0.05
+# How long a follower waits for the first publication before collecting itself
+FIRST_PUBLISH_TIMEOUT = 2.0
+READ_RETRIES = 100
+
+
+class SharedSnapshotRecord(Snapshot):
+    """Snapshot read from shared memory; ``data`` is parsed only if something asks for it."""
+
+    # What a versioned source published alongside the body
+    delta = b''
+
+    @functools.cached_property
+    def data(self):
+        return json.loads(self.body)
+
+
+def reset(name, shm_dir=SHM_DIR):
+    """Drop a snapshot published by a previous run; call before the workers start."""
+    try:
+        os.unlink(os.path.join(shm_dir, f"{name}.snap"))
+    except FileNotFoundError:
+        pass
+
+
+class SharedSnapshot:
+    def __init__(self, name, cache, shm_dir=SHM_DIR, lock_dir=LOCK_DIR, versioned=False):
+        """
+        name      -- file name stem, unique per published snapshot
+        cache     -- the SnapshotCache the publishing worker collects with
+        versioned -- publish the cache's own version, ETag and delta instead of numbering bodies here
+        """
+        self.name = name
+        self._cache = cache
+        self.versioned = versioned
+        self.path = os.path.join(shm_dir, f"{name}.snap")
+        self.lock_path = os.path.join(lock_dir, f"{name}-snapshot.lock")
+
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self._leader = False
+        # Reader side
+        self._map = None
+        self._seen_seq = None
+        self._snapshot = None
+        # Writer side
+        self._published_key = None
+        self._published = None
+
+    @property
+    def leader(self):
+        """True in the worker that collects and publishes."""
+        return self._leader
+
+    # -- SnapshotCache interface ------------------------------------------
+
+    @property
+    def generation(self):
+        if self._leader:
+            return self._cache.generation
+        header = self._header()
+        return header[0] if header else 0
+
+    def invalidate(self):
+        self._cache.invalidate()
+
+    def wait_for_invalidation(self, generation, timeout):
+        if self._leader:
+            return self._cache.wait_for_invalidation(generation, timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.generation
+            if current != generation or time.monotonic() >= deadline:
+                return current
+            time.sleep(POLL_SECONDS)
+
+    def get(self):
+        """Return the current snapshot, published by whichever worker collects."""
+        self._ensure_thread()
+        if self._leader:
+            return self._publish(self._cache.get())
+        snapshot = self._read()
+        deadline = time.monotonic() + FIRST_PUBLISH_TIMEOUT
+        while snapshot is None and not self._leader and time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            snapshot = self._read()
+        if snapshot is None:
+            # Nobody has published yet; answer from this worker's own cache
+            return self._publish(self._cache.get()) if self._leader else self._cache.get()
+        return snapshot
+
+    # -- reading ------------------------------------------------------------
+
+    def _open_map(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size:
+                return None
+            return mmap.mmap(fd, size, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+    def _header(self):
+        if self._map is None:
+            self._map = self._open_map()
+            if self._map is None:
+                return None
+        header = HEADER.unpack_from(self._map, 0)
+        if header[3]:
+            # Replaced by a larger file
+            self._map.close()
+            self._map = self._open_map()
+            self._seen_seq = None
+            if self._map is None:
+                return None
+            header = HEADER.unpack_from(self._map, 0)
+        return header
+
+    def _read(self):
+        with self._lock:
+            for _ in range(READ_RETRIES):
+                header = self._header()
+                if header is None:
+                    return None
+                seq, version, length, retired, delta_length, etag = header
+                if seq == self._seen_seq:
+                    return self._snapshot
+                if seq & 1 or retired:
+                    time.sleep(0)
+                    continue
+                if seq == 0:
+                    return None  # created, nothing written yet
+                body = self._map[HEADER.size:HEADER.size + length]
+                delta = self._map[HEADER.size + length:HEADER.size + length + delta_length]
+                if HEADER.unpack_from(self._map, 0)[0] != seq:
+                    continue  # written under us
+                etag = etag.rstrip(b'\0').decode()
+                if self._snapshot is None or self._snapshot.etag != etag:
+                    self._snapshot = SharedSnapshotRecord(version, etag, None, body)
+                    self._snapshot.delta = delta
+                self._seen_seq = seq
+                return self._snapshot
+            return None
+
+    # -- publishing ---------------------------------------------------------
+
+    def _publish(self, snapshot):
+        """Publish ``snapshot`` unless its body is already out; returns the shared version of it."""
+        # SnapshotCache ETags end with the body digest; a versioned source's ETag is unique already
+        key = snapshot.etag if self.versioned else snapshot.etag.rsplit('-', 1)[-1]
+        with self._lock:
+            if key == self._published_key:
+                return self._published
+            try:
+                shared = self._write(snapshot, key, self._cache.delta(snapshot) if self.versioned else b'')
+            except OSError as e:
+                print(f"Failed to publish {self.name} snapshot: {e}")
+                return snapshot
+            self._published_key = key
+            self._published = shared
+            return shared
+
+    def _write(self, snapshot, key, delta=b''):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        body = snapshot.body
+        length = len(body) + len(delta)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size + length:
+                if size >= HEADER.size:
+                    fd = self._replace_file(fd, size, length)
+                else:
+                    os.ftruncate(fd, HEADER.size + max(INITIAL_CAPACITY, 2 * length))
+            mm = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        with mm:
+            seq, version, _length, _retired, _delta_length, _etag = HEADER.unpack_from(mm, 0)
+            if self.versioned:
+                version, etag = snapshot.version, snapshot.etag
+            else:
+                version += 1
+                etag = f"{version}-{key}"
+            struct.pack_into('<Q', mm, 0, seq + 1 if seq % 2 == 0 else seq)
+            mm[HEADER.size:HEADER.size + len(body)] = body
+            mm[HEADER.size + len(body):HEADER.size + length] = delta
+            HEADER.pack_into(mm, 0, (seq | 1) + 1, version, len(body), 0, len(delta), etag.encode())
+        return Snapshot(version, etag, snapshot.data, body)
+
+    def _replace_file(self, fd, size, length):
+        """Carry the header over to a larger file, swap it in and retire the old one."""
+        with mmap.mmap(fd, size) as old:
+            header = bytes(old[:HEADER.size])
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            new_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(new_fd, HEADER.size + max(INITIAL_CAPACITY, 2 * length))
+            os.pwrite(new_fd, header, 0)
+            os.replace(tmp_path, self.path)
+            struct.pack_into('<Q', old, 24, 1)
+        os.close(fd)
+        return new_fd
+
+    # -- leader election ----------------------------------------------------
+
+    def _ensure_thread(self):
+        # Started lazily so each gunicorn worker gets its own candidate thread
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._leader = False
+            threading.Thread(target=self._run, daemon=True, name=f"{self.name}-publisher").start()
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Blocks until this worker becomes the one that collects
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            print(f"Shared {self.name} snapshot unavailable, collecting per worker: {e}")
+            self._leader = True
+            return
+        self._leader = True
+        generation = self._cache.generation
+        while True:
+            try:
+                self._publish(self._cache.get())
+            except Exception as e:
+                print(f"Error publishing {self.name} snapshot: {e}")
+            generation = self._cache.wait_for_invalidation(generation, REFRESH_SECONDS)
+            time.sleep(COALESCE_SECONDS)
@@ -0,0 +1,173 @@
+"""
+Event-invalidated snapshot cache.
+
+A ``SnapshotCache`` holds the last result of an expensive collector together
+with a version number and a strong ETag.  The snapshot stays valid until an
+rtnetlink notification arrives on one of the watched groups or one of the
+watched files changes (mtime, size or presence), so steady-state polls cost a
+few ``stat`` calls instead of a full collection.  Concurrent requests that
+miss the cache share a single rebuild.
+"""
+import errno
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+import netlink
+from request_timing import stage
+
+Snapshot = namedtuple('Snapshot', 'version etag data body')
+
+# Groups that affect what /network-info reports
+INTERFACE_GROUPS = (netlink.RTMGRP_LINK | netlink.RTMGRP_IPV4_IFADDR | netlink.RTMGRP_IPV4_ROUTE
+                    | netlink.RTMGRP_IPV6_IFADDR | netlink.RTMGRP_IPV6_ROUTE)
+
+
+class SnapshotCache:
+    def __init__(self, build, groups=INTERFACE_GROUPS, watch_globs=(), fallback_ttl=2.0, name='snapshot'):
+        """
+        build        -- callable returning the JSON-serialisable snapshot data
+        groups       -- rtnetlink multicast groups whose events invalidate it
+        watch_globs  -- file patterns whose stat signature invalidates it
+        fallback_ttl -- max snapshot age when netlink events are unavailable
+        name         -- cache label in the hit/miss metrics
+        """
+        self._build = build
+        self.name = name
+        self._groups = groups
+        self._watch_globs = watch_globs
+        self._fallback_ttl = fallback_ttl
+
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._snapshot = None
+        self._snapshot_generation = -1
+        self._snapshot_time = 0.0
+        self._building = False
+        self._file_signature = None
+
+        self._watcher_pid = None
+        self._watching = False
+        self._start_lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """Counter bumped on every invalidation."""
+        return self._generation
+
+    def invalidate(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def wait_for_invalidation(self, generation, timeout):
+        """Block until the cache is invalidated past ``generation`` or ``timeout`` expires."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    def get(self):
+        """Return the current snapshot, rebuilding it at most once per invalidation."""
+        self._ensure_watcher()
+        self._check_files()
+
+        with self._cond:
+            while True:
+                if self._is_fresh():
+                    metrics.cache_lookup(self.name, True)
+                    return self._snapshot
+                if not self._building:
+                    break
+                self._cond.wait()
+            self._building = True
+            generation = self._generation
+        metrics.cache_lookup(self.name, False)
+
+        try:
+            data = self._build()
+        except Exception:
+            with self._cond:
+                self._building = False
+                self._cond.notify_all()
+            raise
+
+        with stage('serialize'):
+            body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+            digest = hashlib.sha1(body).hexdigest()[:16]
+        with self._cond:
+            previous = self._snapshot
+            if previous is not None and previous.etag.endswith(digest):
+                snapshot = previous
+            else:
+                version = previous.version + 1 if previous else 1
+                # The digest keeps ETags from different worker processes,
+                # whose version counters are independent, from colliding.
+                snapshot = Snapshot(version, f"{version}-{digest}", data, body)
+            self._snapshot = snapshot
+            self._snapshot_generation = generation
+            self._snapshot_time = time.monotonic()
+            self._building = False
+            self._cond.notify_all()
+            return snapshot
+
+    def _is_fresh(self):
+        if self._snapshot is None or self._snapshot_generation != self._generation:
+            return False
+        if not self._watching and time.monotonic() - self._snapshot_time > self._fallback_ttl:
+            return False
+        return True
+
+    def _check_files(self):
+        if not self._watch_globs:
+            return
+        signature = []
+        for pattern in self._watch_globs:
+            for path in sorted(glob.glob(pattern)):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                signature.append((path, st.st_ino, st.st_mtime_ns, st.st_size))
+        signature = tuple(signature)
+        if signature != self._file_signature:
+            self._file_signature = signature
+            self.invalidate()
+
+    def _ensure_watcher(self):
+        # Gunicorn forks workers after import, so the listener thread is
+        # started lazily in whichever process actually serves requests.
+        # The lock keeps concurrent first requests from starting two.
+        pid = os.getpid()
+        if self._watcher_pid == pid or not self._groups:
+            return
+        with self._start_lock:
+            if self._watcher_pid == pid:
+                return
+            try:
+                sock = netlink.NetlinkSocket(groups=self._groups)
+            except OSError as e:
+                print(f"Netlink events unavailable, snapshots expire after {self._fallback_ttl}s: {e}")
+                self._watching = False
+            else:
+                self._watching = True
+                threading.Thread(target=self._watch, args=(sock,), daemon=True, name='snapshot-watcher').start()
+            self._watcher_pid = pid
+
+    def _watch(self, sock):
+        while True:
+            try:
+                sock.recv_raw()
+            except OSError as e:
+                # ENOBUFS means events were dropped; invalidating is enough
+                # because the next read rebuilds from a fresh dump anyway.
+                if e.errno != errno.ENOBUFS:
+                    print(f"Netlink event watcher stopped: {e}")
+                    self._watching = False
+                    self.invalidate()
+                    return
+            self.invalidate()
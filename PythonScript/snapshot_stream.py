@@ -0,0 +1,123 @@
+"""
+Server-Sent Events fan-out for ``SnapshotCache`` contents.
+
+One watcher thread per process follows the cache and computes per-key
+deltas; every connected client only drains its own queue.  A new subscriber
+first receives the full snapshot, then ``delta`` events carrying the entries
+that changed and the keys that disappeared.
+"""
+import json
+import queue
+import threading
+
+KEEPALIVE_SECONDS = 15
+# Upper bound for a watcher pass when nothing invalidates the cache, so
+# file-based invalidation (netplan edits) is still noticed.
+RECHECK_SECONDS = 2
+# Events a slow client may fall behind before it is disconnected; the
+# browser reconnects and starts over from a fresh snapshot.
+MAX_PENDING_EVENTS = 64
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, sort_keys=True)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def diff_entries(old, new):
+    """Return (changed, removed) between two {key: record} mappings."""
+    changed = {key: value for key, value in new.items() if old.get(key) != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class Subscription:
+    def __init__(self):
+        self.events = queue.Queue(MAX_PENDING_EVENTS)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class SnapshotBroadcaster:
+    def __init__(self, cache, extract):
+        """
+        cache   -- the SnapshotCache to follow
+        extract -- maps snapshot data to the {key: record} mapping to diff
+        """
+        self._cache = cache
+        self._extract = extract
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._entries = None
+        self._version = None
+        self._thread = None
+
+    def subscribe(self):
+        """Register a client; returns (subscription, initial snapshot event)."""
+        self._ensure_thread()
+        subscription = Subscription()
+        with self._lock:
+            # Catch up first so the initial snapshot and later deltas line up
+            self._publish(self._cache.get())
+            initial = format_event('snapshot', self._entries, self._version)
+            self._subscribers.add(subscription)
+        return subscription, initial
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self):
+        """Generator producing the SSE body for one client."""
+        subscription, initial = self.subscribe()
+        try:
+            yield initial
+            while not subscription.overflowed:
+                try:
+                    yield subscription.events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='snapshot-broadcaster')
+                self._thread.start()
+
+    def _publish(self, snapshot):
+        """Diff ``snapshot`` against the last one and queue a delta. Caller holds the lock."""
+        if self._version is not None and snapshot.version < self._version:
+            return  # a newer snapshot was already published by another thread
+        entries = self._extract(snapshot.data)
+        if self._entries is not None and snapshot.version != self._version:
+            changed, removed = diff_entries(self._entries, entries)
+            if changed or removed:
+                event = format_event('delta', {'changed': changed, 'removed': removed}, snapshot.version)
+                for subscription in self._subscribers:
+                    subscription.push(event)
+        self._entries = entries
+        self._version = snapshot.version
+
+    def _run(self):
+        generation = self._cache.generation
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+            if not idle:
+                try:
+                    snapshot = self._cache.get()
+                    with self._lock:
+                        self._publish(snapshot)
+                except Exception as e:
+                    print(f"Error refreshing snapshot for subscribers: {e}")
+            generation = self._cache.wait_for_invalidation(generation, RECHECK_SECONDS)
@@ -0,0 +1,438 @@
+"""
+Persistent store for static ARP entries.
+
+Entries live in a JSON file with an in-memory index by IP.  Every
+mutation is written atomically (temp file, fsync, rename) under an exclusive
+lock so the gunicorn workers never see a half-written store, and only the
+affected neighbour is programmed into the kernel over netlink.
+
+For boot, the store also renders an ``ip -batch`` file and a tiny
+networkd-dispatcher hook that restores the whole set with a single ``ip``
+process, instead of one ``arp -s`` fork per entry.
+
+The old hook's ``arp -s`` lines are imported once, when no store exists
+yet, and the old script is kept in ``legacy_backup_path`` before the new
+hook replaces it.  ``arp -s`` picked the interface when the hook ran, so a
+line whose address has no route at import time is stored with ``iface``
+None.  Such entries are resolved when the store is next written, and until
+then the hook resolves them at boot the way ``arp -s`` did.
+"""
+import csv
+import errno
+import fcntl
+import io
+import ipaddress
+import json
+import os
+import re
+import socket
+import threading
+
+import netlink
+
+STORE_DIR = '/etc/network-configuration'
+STORE_PATH = os.path.join(STORE_DIR, 'static-arp.json')
+BATCH_PATH = os.path.join(STORE_DIR, 'static-arp.batch')
+UNRESOLVED_PATH = os.path.join(STORE_DIR, 'static-arp.unresolved')
+LEGACY_BACKUP_PATH = os.path.join(STORE_DIR, 'setarp-static.legacy')
+LOCK_PATH = os.path.join(STORE_DIR, '.static-arp.lock')
+HOOK_PATH = '/etc/networkd-dispatcher/routable.d/setarp-static'
+
+HOOK_MARKER = "# Generated by arp-pythonscript.py"
+HOOK_TEMPLATE = """#!/bin/sh
+# Generated by arp-pythonscript.py; edit static ARP entries through the API.
+# Restores every static entry with one ip(8) process.
+[ -s {batch} ] && ip -force -batch {batch}
+# Entries without an interface use the one routing to them, as `arp -s` did
+[ -s {unresolved} ] || exit 0
+while read -r ip mac; do
+    dev=$(ip -o route get "$ip" | sed -n 's/.* dev \\([^ ]*\\).*/\\1/p')
+    [ -n "$dev" ] && ip neigh replace "$ip" lladdr "$mac" dev "$dev" nud permanent
+done < {unresolved}
+exit 0
+"""
+
+_LEGACY_LINE = re.compile(r'^\s*arp\s+-s\s+(?P<ip>\S+)\s+(?P<mac>\S+)')
+_MAC_SEPARATORS = re.compile(r'[\s:.-]')
+_MAC_DIGITS = re.compile(r'^[0-9a-f]{12}$')
+
+
+class StaticArpError(Exception):
+    """Raised for invalid entries or failed kernel updates."""
+
+
+def normalize_ip(ip):
+    try:
+        return str(ipaddress.IPv4Address(str(ip).strip()))
+    except ValueError:
+        raise StaticArpError(f"Invalid IP address: {ip}")
+
+
+def normalize_mac(mac):
+    """Accept aa:bb:.., AA-BB-.. or AABBCC.. and return lowercase colon form."""
+    digits = _MAC_SEPARATORS.sub('', str(mac).lower())
+    if not _MAC_DIGITS.match(digits):
+        raise StaticArpError(f"Invalid MAC address: {mac}")
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+CSV_FIELDS = ('ip', 'mac', 'iface')
+
+
+def parse_csv(text):
+    """Read ip,mac[,iface] rows; a header line naming the columns is optional."""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    fields = CSV_FIELDS
+    if rows and rows[0][0].strip().lower() == 'ip':
+        fields = [cell.strip().lower() for cell in rows.pop(0)]
+    return [dict(zip(fields, (cell.strip() for cell in row))) for row in rows]
+
+
+def to_csv(entries):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(entries)
+    return out.getvalue()
+
+
+def _write_atomic(path, data, mode=0o644):
+    directory = os.path.dirname(path)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+# Store signature before the first read; None means the store does not exist
+_NOT_READ = object()
+
+
+class StaticArpStore:
+    def __init__(self, path=STORE_PATH, batch_path=BATCH_PATH, lock_path=LOCK_PATH, hook_path=HOOK_PATH,
+                 unresolved_path=UNRESOLVED_PATH, legacy_backup_path=LEGACY_BACKUP_PATH):
+        self.path = path
+        self.batch_path = batch_path
+        self.unresolved_path = unresolved_path
+        self.lock_path = lock_path
+        self.hook_path = hook_path
+        self.legacy_backup_path = legacy_backup_path
+        self._lock = threading.RLock()
+        self._signature = _NOT_READ
+        self.by_ip = {}
+
+    # -- persistence ------------------------------------------------------
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        """Reload the store if another worker rewrote it since we last read it."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        if signature is None:
+            entries = self._import_legacy_hook()
+            self.by_ip = {entry['ip']: entry for entry in entries}
+            if entries:
+                self._save()
+            else:
+                # Nothing to migrate; don't parse the hook again until the store appears
+                self._signature = None
+            return
+        with open(self.path) as f:
+            entries = json.load(f).get('entries', [])
+        self.by_ip = {entry['ip']: entry for entry in entries}
+        self._signature = signature
+
+    def _import_legacy_hook(self):
+        """Pick up `arp -s` lines from the old replayed dispatcher script."""
+        entries = []
+        try:
+            with open(self.hook_path) as f:
+                lines = f.readlines()
+        except OSError:
+            return entries
+        for line in lines:
+            match = _LEGACY_LINE.match(line)
+            if not match:
+                continue
+            try:
+                entry = {'ip': normalize_ip(match.group('ip')), 'mac': normalize_mac(match.group('mac')), 'iface': None}
+            except StaticArpError as e:
+                print(f"Skipping legacy static ARP line {line.strip()!r}: {e}")
+                continue
+            try:
+                entry['iface'] = self.resolve_iface(entry['ip'])
+            except (StaticArpError, OSError) as e:
+                print(f"Keeping legacy static ARP entry {entry['ip']} without an interface for now: {e}")
+            entries.append(entry)
+        return entries
+
+    def _resolve_pending(self):
+        """Give entries stored without an interface the one routing to them now, if any."""
+        for ip, entry in self.by_ip.items():
+            if entry['iface'] is None:
+                try:
+                    self.by_ip[ip] = dict(entry, iface=self.resolve_iface(ip))
+                except (StaticArpError, OSError):
+                    continue
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._resolve_pending()
+        entries = sorted(self.by_ip.values(), key=lambda entry: socket.inet_aton(entry['ip']))
+        _write_atomic(self.path, json.dumps({'version': 1, 'entries': entries}, indent=2) + "\n")
+        _write_atomic(self.batch_path, "".join(
+            f"neigh replace {e['ip']} lladdr {e['mac']} dev {e['iface']} nud permanent\n"
+            for e in entries if e['iface'] is not None))
+        _write_atomic(self.unresolved_path, "".join(
+            f"{e['ip']} {e['mac']}\n" for e in entries if e['iface'] is None))
+        self._signature = self._file_signature()
+        self.install_hook()
+
+    def install_hook(self):
+        """Replace the dispatcher script with the batched restore hook if needed."""
+        script = HOOK_TEMPLATE.format(batch=self.batch_path, unresolved=self.unresolved_path)
+        try:
+            with open(self.hook_path) as f:
+                current = f.read()
+        except OSError:
+            current = None
+        if current == script:
+            return
+        if current is not None and HOOK_MARKER not in current:
+            # The old `arp -s` script is the only copy of those entries
+            os.makedirs(os.path.dirname(self.legacy_backup_path), exist_ok=True)
+            _write_atomic(self.legacy_backup_path, current)
+        os.makedirs(os.path.dirname(self.hook_path), exist_ok=True)
+        _write_atomic(self.hook_path, script, mode=0o755)
+
+    def locked(self):
+        """Exclusive cross-process lock around read-modify-write cycles."""
+        return _StoreLock(self)
+
+    # -- kernel -----------------------------------------------------------
+
+    @staticmethod
+    def resolve_iface(ip, nl=None):
+        """Interface the kernel would use to reach ``ip``, as `arp -s` picked it."""
+        if nl is None:
+            with netlink.NetlinkSocket() as nl:
+                route = nl.route_get(ip)
+        else:
+            route = nl.route_get(ip)
+        if route['oif'] is None:
+            raise StaticArpError(f"No route to {ip}")
+        return socket.if_indextoname(route['oif'])
+
+    @classmethod
+    def program(cls, changes):
+        """
+        Apply ('add'|'delete', entry) pairs to the kernel neighbour table.
+
+        Returns the errno (0 on success) for each change, in order; changes
+        on interfaces that no longer exist, or entries without an interface
+        that nothing routes to, report ENODEV.
+        """
+        results = [errno.ENODEV] * len(changes)
+        requests, positions = [], []
+        for position, (action, entry) in enumerate(changes):
+            try:
+                index = socket.if_nametoindex(entry['iface'] or cls.resolve_iface(entry['ip']))
+            except (StaticArpError, OSError):
+                continue
+            if action == 'add':
+                requests.append((netlink.RTM_NEWNEIGH, netlink.NLM_F_CREATE | netlink.NLM_F_REPLACE,
+                                 netlink.pack_neigh(index, entry['ip'], entry['mac'])))
+            else:
+                requests.append((netlink.RTM_DELNEIGH, 0, netlink.pack_neigh(index, entry['ip'])))
+            positions.append(position)
+        if requests:
+            with netlink.NetlinkSocket() as nl:
+                for position, error in zip(positions, nl.execute(requests)):
+                    results[position] = error
+        return results
+
+    # -- API --------------------------------------------------------------
+
+    def entries(self):
+        with self._lock:
+            self._refresh()
+            return sorted(self.by_ip.values(), key=lambda entry: socket.inet_aton(entry['ip']))
+
+    def get(self, ip):
+        with self._lock:
+            self._refresh()
+            return self.by_ip.get(ip)
+
+    def add(self, ip, mac, iface=None):
+        ip = normalize_ip(ip)
+        mac = normalize_mac(mac)
+        try:
+            iface = iface or self.resolve_iface(ip)
+            socket.if_nametoindex(iface)
+        except OSError as e:
+            raise StaticArpError(f"Cannot determine interface for {ip}: {e}")
+        entry = {'ip': ip, 'mac': mac, 'iface': iface}
+        with self.locked():
+            previous = self.by_ip.get(ip)
+            if previous == entry:
+                return entry
+            changes = [('add', entry)]
+            if previous is not None and previous['iface'] != iface:
+                changes.insert(0, ('delete', previous))
+            errors = self.program(changes)
+            if errors[-1]:
+                raise StaticArpError(f"Kernel rejected {ip}: {os.strerror(errors[-1])}")
+            self.by_ip[ip] = entry
+            self._save()
+        return entry
+
+    def bulk_add(self, rows, replace=False):
+        """
+        Validate, deduplicate and apply many {ip, mac, iface} rows at once.
+
+        Runs in one pass over the rows, programs the kernel with a single
+        batched netlink exchange and writes the store once.  Rows for an IP
+        that is already stored with a different MAC or interface (or that
+        appears twice in ``rows`` with different values) are reported as
+        conflicts unless ``replace`` is set, in which case the last row wins.
+
+        Returns one {row, ip, status[, error]} result per input row, where
+        status is added, updated, unchanged, duplicate, conflict, invalid or
+        failed.
+        """
+        with self.locked():
+            results, staged = self._stage(rows, replace)
+            changes, owners = [], []
+            for ip, position in staged.items():
+                result = results[position]
+                if result['status'] == 'unchanged':
+                    continue
+                previous = self.by_ip.get(ip)
+                if previous is not None and previous['iface'] != result['entry']['iface']:
+                    changes.append(('delete', previous))
+                    owners.append(None)
+                changes.append(('add', result['entry']))
+                owners.append(result)
+
+            applied = False
+            for owner, error in zip(owners, self.program(changes) if changes else []):
+                if owner is None:
+                    continue
+                entry = owner['entry']
+                if error:
+                    owner.update(status='failed', error=f"Kernel rejected {entry['ip']}: {os.strerror(error)}")
+                    continue
+                self.by_ip[entry['ip']] = entry
+                applied = True
+            if applied:
+                self._save()
+        for result in results:
+            result.pop('entry', None)
+        return results
+
+    def _stage(self, rows, replace):
+        """Single validation pass for bulk_add; returns (results, {ip: row})."""
+        results = []
+        staged = {}
+        with netlink.NetlinkSocket() as nl:
+            for row_number, row in enumerate(rows):
+                result = {'row': row_number, 'ip': row.get('ip')}
+                results.append(result)
+                try:
+                    ip = normalize_ip(row.get('ip'))
+                    result['ip'] = ip
+                    mac = normalize_mac(row.get('mac'))
+                    iface = row.get('iface') or None
+                    try:
+                        iface = iface or self.resolve_iface(ip, nl)
+                        socket.if_nametoindex(iface)
+                    except OSError as e:
+                        raise StaticArpError(f"Cannot determine interface for {ip}: {e}")
+                except StaticArpError as e:
+                    result.update(status='invalid', error=str(e))
+                    continue
+
+                entry = {'ip': ip, 'mac': mac, 'iface': iface}
+                if ip in staged:
+                    earlier = results[staged[ip]]
+                    if earlier['entry'] == entry:
+                        result['status'] = 'duplicate'
+                        continue
+                    if not replace:
+                        result.update(status='conflict',
+                                      error=f"{ip} appears earlier in this import as row {earlier['row']}")
+                        continue
+                    earlier['status'] = 'duplicate'
+                    del earlier['entry']
+                previous = self.by_ip.get(ip)
+                if previous == entry:
+                    result['status'] = 'unchanged'
+                elif previous is not None and not replace:
+                    result.update(status='conflict',
+                                  error=f"{ip} is already stored as {previous['mac']} on {previous['iface']}")
+                    continue
+                else:
+                    result['status'] = 'added' if previous is None else 'updated'
+                result['entry'] = entry
+                staged[ip] = row_number
+        return results, staged
+
+    def delete(self, ip):
+        ip = normalize_ip(ip)
+        with self.locked():
+            entry = self.by_ip.get(ip)
+            if entry is None:
+                return None
+            error = self.program([('delete', entry)])[0]
+            # Already gone from the kernel is fine; anything else is not
+            if error and error not in (errno.ENOENT, errno.ENODEV):
+                raise StaticArpError(f"Kernel refused to delete {ip}: {os.strerror(error)}")
+            del self.by_ip[ip]
+            self._save()
+        return entry
+
+
+class _StoreLock:
+    def __init__(self, store):
+        self.store = store
+        self.fd = None
+
+    def __enter__(self):
+        self.store._lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.store.lock_path), exist_ok=True)
+            self.fd = os.open(self.store.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            self.store._refresh()
+        except BaseException:
+            if self.fd is not None:
+                os.close(self.fd)
+            self.store._lock.release()
+            raise
+        return self.store
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.store._lock.release()
@@ -0,0 +1,238 @@
+"""
+Serve the prebuilt React UI (``dist/``) from Python instead of vite preview.
+
+``build-ui.sh`` runs ``npm run build`` once, only when the sources changed,
+and then ``python3 static_ui.py --precompress`` writes ``.gz`` (and ``.br``
+when the ``brotli`` module is installed) next to every compressible file.
+``StaticUI`` then serves the bundle:
+
+* the file list is read once at startup, so a request is a dict lookup and
+  a sendfile; nothing outside ``dist/`` (or hidden) can be requested
+* the smallest variant the client accepts is sent, with its own ETag
+* vite's content-hashed files under ``assets/`` are cached for a year as
+  immutable; index.html and the other files are revalidated (no-cache)
+* unknown paths without a file extension get index.html, so client-side
+  routes survive a reload
+
+Run standalone, it serves the UI on port 5000 and forwards ``/api1`` and
+``/api2`` to the backends on ports 5001 and 5002, as vite's proxy did, so
+the UI process does not load a copy of the backends.  ``server.py
+--ui-bind`` serves the UI from the backend service itself instead, with the
+apps mounted in-process.
+
+    python3 static_ui.py [--bind 0.0.0.0:5000] [--dist ../dist]
+    python3 static_ui.py --precompress [--dist ../dist]
+"""
+import argparse
+import gzip
+import http.client
+import json
+import mimetypes
+import os
+from urllib.parse import parse_qsl, quote, urlencode
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.wrappers import Request, Response
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dist')
+UI_BIND = '0.0.0.0:5000'
+UI_WORKERS = 2
+# vite puts every content-hashed file here
+IMMUTABLE_PREFIX = 'assets/'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = ('.html', '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt', '.ico', '.webmanifest', '.xml')
+# Files smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Suffix of each precompressed variant, preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+# Where the standalone UI forwards the API prefixes, like vite.config.js
+BACKENDS = {'/api1': ('127.0.0.1', 5001), '/api2': ('127.0.0.1', 5002)}
+# Longer than the event streams' keepalive interval
+PROXY_TIMEOUT = 120
+# Connection-level headers are not forwarded
+HOP_BY_HOP = frozenset(('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+                        'trailer', 'transfer-encoding', 'upgrade', 'host'))
+# Set by the proxy itself, or only honoured from local clients (request_timing's profiling)
+NOT_FORWARDED = HOP_BY_HOP | {'x-forwarded-for', 'x-profile'}
+NOT_FORWARDED_ARGS = ('profile',)
+
+
+def precompress(dist_dir=DIST_DIR):
+    """Write .gz (and .br) variants of the compressible files in ``dist_dir``."""
+    written = 0
+    for root, _dirs, files in os.walk(dist_dir):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < COMPRESS_MIN_BYTES:
+                continue
+            variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, body in variants.items():
+                # A variant that saves nothing would only cost a lookup
+                if len(body) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(body)
+                    written += 1
+    return written
+
+
+class StaticUI:
+    """WSGI app serving a vite build directory."""
+
+    def __init__(self, dist_dir=DIST_DIR):
+        self.dist_dir = dist_dir
+        self.files = self._scan()
+
+    def _scan(self):
+        """Map url path -> {encoding or None: (file path, size, etag)}."""
+        files = {}
+        suffixes = {suffix: encoding for encoding, suffix in ENCODINGS.items()}
+        for root, dirs, names in os.walk(self.dist_dir):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                url = os.path.relpath(path, self.dist_dir).replace(os.sep, '/')
+                base, suffix = os.path.splitext(url)
+                encoding = suffixes.get(suffix)
+                if encoding is not None and os.path.exists(os.path.join(self.dist_dir, base)):
+                    url = base
+                st = os.stat(path)
+                etag = f"{st.st_size:x}-{st.st_mtime_ns:x}" + (f".{encoding}" if encoding else '')
+                files.setdefault(url, {})[encoding] = (path, st.st_size, etag)
+        return files
+
+    def _lookup(self, path):
+        path = path.strip('/')
+        for candidate in (path, f"{path}/index.html" if path else 'index.html'):
+            if candidate in self.files:
+                return candidate
+        # Client-side routes (no file extension) load the app shell
+        if '.' not in path.rsplit('/', 1)[-1] and 'index.html' in self.files:
+            return 'index.html'
+        return None
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        if request.method not in ('GET', 'HEAD'):
+            return Response(status=405, headers={'Allow': 'GET, HEAD'})(environ, start_response)
+        if not self.files:
+            return Response('UI not built; run build-ui.sh', status=503)(environ, start_response)
+        url = self._lookup(request.path)
+        if url is None:
+            return Response('Not found', status=404)(environ, start_response)
+
+        variants = self.files[url]
+        offered = [encoding for encoding in ENCODINGS if encoding in variants]
+        encoding = request.accept_encodings.best_match(offered + ['identity'], default='identity')
+        path, size, etag = variants.get(encoding) or variants[None]
+        response = Response(mimetype=mimetypes.guess_type(url)[0] or 'application/octet-stream')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE if url.startswith(IMMUTABLE_PREFIX) else 'no-cache'
+        if offered:
+            response.headers['Vary'] = 'Accept-Encoding'
+        if encoding in offered:
+            response.headers['Content-Encoding'] = encoding
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+        elif request.method == 'GET':
+            response.response = wrap_file(environ, open(path, 'rb'))
+            response.direct_passthrough = True
+            response.content_length = size
+        else:
+            response.content_length = size
+        return response(environ, start_response)
+
+
+class BackendProxy:
+    """WSGI app forwarding requests to a backend port, streaming the response back."""
+
+    def __init__(self, host, port, timeout=PROXY_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        # The dispatcher moved the /api1 or /api2 prefix into SCRIPT_NAME
+        path = quote(request.path, safe="/:@!$&'()*+,;=~")
+        query = environ.get('QUERY_STRING', '')
+        if query:
+            pairs = parse_qsl(query, keep_blank_values=True)
+            if any(name in NOT_FORWARDED_ARGS for name, _value in pairs):
+                query = urlencode([(name, value) for name, value in pairs if name not in NOT_FORWARDED_ARGS])
+        if query:
+            path += f"?{query}"
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in NOT_FORWARDED}
+        # Replaces whatever the client claimed
+        headers['X-Forwarded-For'] = request.remote_addr or ''
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(request.method, path, body=request.get_data(), headers=headers)
+            response = connection.getresponse()
+        except OSError as e:
+            connection.close()
+            body = json.dumps({'error': f"Backend on port {self.port} unavailable: {e}"})
+            return Response(body, status=502, mimetype='application/json')(environ, start_response)
+        start_response(f"{response.status} {response.reason}",
+                       [(name, value) for name, value in response.getheaders() if name.lower() not in HOP_BY_HOP])
+        return self._stream(connection, response)
+
+    @staticmethod
+    def _stream(connection, response):
+        # read1 returns what has arrived, so event streams are relayed as they come
+        try:
+            while True:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            connection.close()
+
+
+def ui_app(dist_dir=DIST_DIR, backends=BACKENDS):
+    """The standalone UI: ``dist_dir`` plus the API prefixes forwarded to ``backends``."""
+    return DispatcherMiddleware(StaticUI(dist_dir), {
+        prefix: BackendProxy(host, port) for prefix, (host, port) in backends.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the prebuilt web UI, forwarding /api1 and /api2 to the backends.")
+    parser.add_argument('--dist', default=DIST_DIR)
+    parser.add_argument('--bind', default=UI_BIND)
+    parser.add_argument('--workers', type=int, default=UI_WORKERS)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--precompress', action='store_true', help="write .gz/.br variants into --dist and exit")
+    args = parser.parse_args()
+
+    if args.precompress:
+        print(f"Wrote {precompress(args.dist)} precompressed files")
+        return
+
+    import server
+    server.Server({
+        'bind': [args.bind],
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'preload_app': True,
+        'when_ready': server.when_ready,
+        'on_exit': server.on_exit,
+    }, app=ui_app(args.dist)).run()
+
+
+if __name__ == '__main__':
+    main()
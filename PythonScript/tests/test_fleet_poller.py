@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fleet_poller import FleetConfigError, FleetIndex, parse_appliance, parse_appliances  # noqa: E402
+
+
+class ParseApplianceTests(unittest.TestCase):
+    def test_host(self):
+        appliance = parse_appliance('10.0.0.5')
+        self.assertEqual(appliance.name, '10.0.0.5')
+        self.assertEqual(appliance.urls, {'network': 'http://10.0.0.5:5001', 'arp': 'http://10.0.0.5:5002'})
+
+    def test_url_behind_the_ui_proxy(self):
+        appliance = parse_appliance('https://edge-1.example/')
+        self.assertEqual(appliance.name, 'edge-1.example')
+        self.assertEqual(appliance.urls, {'network': 'https://edge-1.example/api1',
+                                          'arp': 'https://edge-1.example/api2'})
+
+    def test_explicit_urls_and_name(self):
+        appliance = parse_appliance({'name': 'lab', 'network_url': 'http://lab:8001/', 'arp_url': 'http://lab:8002'})
+        self.assertEqual(appliance.name, 'lab')
+        self.assertEqual(appliance.urls, {'network': 'http://lab:8001', 'arp': 'http://lab:8002'})
+        self.assertEqual(parse_appliance({'host': 'edge-2', 'name': 'Edge 2'}).name, 'Edge 2')
+
+    def test_documents_start_empty(self):
+        for state in parse_appliance('edge-3').documents.values():
+            self.assertEqual(state, {'etag': None, 'data': None, 'updated': None, 'error': None})
+
+    def test_invalid(self):
+        for item in (42, None, {}, {'network_url': 'http://a:1'}, 'ftp://edge/', 'http://:5001',
+                     {'network_url': 'http://a:99999', 'arp_url': 'http://a:1'}, {'host': 'a:b:c'}):
+            with self.subTest(item=item), self.assertRaises(FleetConfigError):
+                parse_appliance(item)
+
+    def test_parse_appliances(self):
+        names = [appliance.name for appliance in parse_appliances({'appliances': ['a', {'host': 'b'}]})]
+        self.assertEqual(names, ['a', 'b'])
+        self.assertEqual(len(parse_appliances(['a', 'b'])), 2)
+        with self.assertRaises(FleetConfigError):
+            parse_appliances({'hosts': ['a']})
+        with self.assertRaises(FleetConfigError) as raised:
+            parse_appliances(['a', 'http://a:5001', {'host': 'a'}])
+        self.assertIn('a', str(raised.exception))
+
+
+class FleetIndexSearchTests(unittest.TestCase):
+    def setUp(self):
+        edge1, edge2 = parse_appliance('edge-1'), parse_appliance('edge-2')
+        edge1.documents['network_info']['data'] = {'network_info': {
+            'eth0': {'IP Address': '10.0.0.1'}, 'eth1': {'IP Address': 'No IP'}}}
+        edge1.documents['arp']['data'] = [
+            {'iface': 'eth0', 'ip': '10.0.0.20', 'mac': 'AA:BB:CC:00:00:20'},
+            {'iface': 'eth0', 'ip': '10.0.1.30', 'mac': 'aa:bb:cc:00:00:30'},
+        ]
+        edge2.documents['arp']['data'] = [{'iface': 'br0', 'ip': '10.0.0.20', 'mac': 'aa:bb:dd:00:00:20'}]
+        self.index = FleetIndex.build([edge1, edge2], stale={'edge-2'})
+
+    def search(self, **filters):
+        return [(hit['appliance'], hit['source'], hit['interface'], hit['ip'])
+                for hit in self.index.search(**filters)]
+
+    def test_ip_filters(self):
+        self.assertEqual(self.search(ip='10.0.0.20'), [('edge-1', 'arp', 'eth0', '10.0.0.20'),
+                                                      ('edge-2', 'arp', 'br0', '10.0.0.20')])
+        self.assertEqual(len(self.search(ip='10.0.0.0/24')), 3)
+        self.assertEqual(self.search(ip='10.0.1'), [('edge-1', 'arp', 'eth0', '10.0.1.30')])
+
+    def test_mac_and_substring_filters(self):
+        self.assertEqual(len(self.search(mac='aa-bb-cc')), 2)
+        self.assertEqual(self.search(mac='aabbdd', ip='10.0.0.20'), [('edge-2', 'arp', 'br0', '10.0.0.20')])
+        self.assertEqual(self.search(q='BR0'), [('edge-2', 'arp', 'br0', '10.0.0.20')])
+        self.assertEqual(self.search(q='eth1'), [('edge-1', 'interface', 'eth1', None)])
+
+    def test_hits(self):
+        hit = self.index.search(q='br0')[0]
+        self.assertEqual(hit, {'appliance': 'edge-2', 'source': 'arp', 'interface': 'br0', 'ip': '10.0.0.20',
+                               'mac': 'aa:bb:dd:00:00:20', 'stale': True})
+
+    def test_limit(self):
+        self.assertEqual(len(self.search()), 5)
+        self.assertEqual(len(self.search(limit=2)), 2)
+        self.assertEqual(len(self.search(ip='10.0.0.0/24', limit=1)), 1)
+        for limit in (0, -1):
+            with self.assertRaises(ValueError):
+                self.index.search(limit=limit)
+
+    def test_invalid_filters(self):
+        for filters in ({'ip': '10.300'}, {'mac': '::'}):
+            with self.subTest(filters=filters), self.assertRaises(ValueError):
+                self.index.search(**filters)
+
+
+if __name__ == '__main__':
+    unittest.main()
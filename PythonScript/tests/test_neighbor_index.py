@@ -0,0 +1,127 @@
+import base64
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neighbor_index import (NeighborIndex, QueryError, decode_cursor, encode_cursor,  # noqa: E402
+                            ip_to_int, normalize_mac_prefix, parse_ip_prefix)
+from neighbor_table import entry_key  # noqa: E402
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def make_entries(count):
+    entries = {}
+    for i in range(count):
+        entry = {
+            'iface': f"eth{i % 3}",
+            'ip': f"10.{i % 7}.{i // 250}.{i % 250}",
+            'mac': f"02:00:00:{i % 5:02x}:{i // 256:02x}:{i % 256:02x}",
+            'flags': 'CM' if i % 4 == 0 else 'C',
+        }
+        entries[entry_key(entry)] = entry
+    return entries
+
+
+class CursorTests(unittest.TestCase):
+    def test_round_trip(self):
+        for sort, position in (('ip', (167772161, 'eth0', '10.0.0.1')),
+                               ('mac', ('02:00:00:00:00:01', 167772161, 'eth0', '10.0.0.1')),
+                               ('iface', ('eth0', 167772161, '10.0.0.1'))):
+            self.assertEqual(decode_cursor(encode_cursor(list(position)), sort), position)
+
+    def test_rejects_malformed(self):
+        for cursor in ('!!!', raw_cursor(1), raw_cursor(None), raw_cursor('abc')[:-1] + '*'):
+            with self.assertRaises(QueryError):
+                decode_cursor(cursor)
+
+    def test_rejects_wrong_shape(self):
+        for value in ([1, 2], [True, 'eth0', '10.0.0.1'], ['eth0', 1, '10.0.0.1'],
+                      [1, 'eth0', '10.0.0.1', 'extra'], {'ip': 1}, 'abc'):
+            with self.assertRaises(QueryError):
+                decode_cursor(raw_cursor(value), 'ip')
+
+    def test_cursor_of_another_sort(self):
+        index = NeighborIndex()
+        entries = make_entries(20)
+        index.rebuild(entries)
+        _page, cursor = index.query(entries, sort='mac', limit=5)
+        with self.assertRaises(QueryError):
+            index.query(entries, sort='ip', cursor=cursor)
+
+
+class QueryTests(unittest.TestCase):
+    def setUp(self):
+        self.entries = make_entries(600)
+        self.index = NeighborIndex()
+        for key, entry in self.entries.items():
+            self.index.add(key, entry)
+
+    def page_through(self, limit, **filters):
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.index.query(self.entries, limit=limit, cursor=cursor, **filters)
+            seen.extend(page)
+            if cursor is None:
+                return seen
+
+    def expected(self, sort, keep=lambda entry: True):
+        sort_key = {
+            'ip': lambda e: (ip_to_int(e['ip']), e['iface']),
+            'mac': lambda e: (e['mac'], ip_to_int(e['ip']), e['iface']),
+            'iface': lambda e: (e['iface'], ip_to_int(e['ip'])),
+        }[sort]
+        return sorted((e for e in self.entries.values() if keep(e)), key=sort_key)
+
+    def test_pages_cover_every_entry_once_in_order(self):
+        for sort in ('ip', 'mac', 'iface'):
+            with self.subTest(sort=sort):
+                self.assertEqual(self.page_through(37, sort=sort), self.expected(sort))
+
+    def test_filtered_paging(self):
+        low, high = parse_ip_prefix('10.3')
+        cases = [
+            ({'iface': 'eth1'}, lambda e: e['iface'] == 'eth1'),
+            ({'flags': 'static'}, lambda e: 'M' in e['flags']),
+            ({'prefix': (low, high)}, lambda e: low <= ip_to_int(e['ip']) <= high),
+            ({'mac': normalize_mac_prefix('02-00-00-03')}, lambda e: e['mac'].startswith('02:00:00:03')),
+            ({'iface': 'eth2', 'flags': 'dynamic'}, lambda e: e['iface'] == 'eth2' and 'M' not in e['flags']),
+        ]
+        for filters, keep in cases:
+            for sort in ('ip', 'mac', 'iface'):
+                with self.subTest(filters=filters, sort=sort):
+                    self.assertEqual(self.page_through(11, sort=sort, **filters), self.expected(sort, keep))
+
+    def test_discard(self):
+        removed = list(self.entries)[::2]
+        for key in removed:
+            self.index.discard(key, self.entries.pop(key))
+        self.assertEqual(self.page_through(50, sort='mac'), self.expected('mac'))
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(QueryError):
+            self.index.query(self.entries, sort='state')
+        with self.assertRaises(QueryError):
+            self.index.query(self.entries, flags='permanent')
+
+
+class ParsingTests(unittest.TestCase):
+    def test_parse_ip_prefix(self):
+        self.assertEqual(parse_ip_prefix('10.1'), (ip_to_int('10.1.0.0'), ip_to_int('10.1.255.255')))
+        self.assertEqual(parse_ip_prefix('192.168.1.7'), (ip_to_int('192.168.1.7'),) * 2)
+        self.assertEqual(parse_ip_prefix('192.168.1.7/24'), (ip_to_int('192.168.1.0'), ip_to_int('192.168.1.255')))
+        with self.assertRaises(ValueError):
+            parse_ip_prefix('10.300')
+
+    def test_normalize_mac_prefix(self):
+        self.assertEqual(normalize_mac_prefix('AA-BB-CC'), 'aa:bb:cc')
+        self.assertEqual(normalize_mac_prefix('aabbc'), 'aa:bb:c')
+
+
+if __name__ == '__main__':
+    unittest.main()
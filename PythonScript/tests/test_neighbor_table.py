@@ -0,0 +1,118 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import neighbor_table  # noqa: E402
+from neighbor_table import NeighborTable, entry_key  # noqa: E402
+from shared_snapshot import SharedSnapshotRecord  # noqa: E402
+
+
+def entry(i, state='REACHABLE', mac=None):
+    return {'ip': f"10.0.{i // 250}.{i % 250}", 'hw_type': 'ether', 'iface': 'eth0', 'flags': 'C',
+            'mac': mac or f"02:00:00:00:{i // 256:02x}:{i % 256:02x}", 'state': state}
+
+
+class FakeShared:
+    """The part of SharedSnapshot a table uses, for a leader publishing its own snapshots."""
+
+    def __init__(self, table, leader):
+        self.table = table
+        self.leader = leader
+
+    def get(self):
+        return self.table.get()
+
+
+class NeighborTableTests(unittest.TestCase):
+    def setUp(self):
+        self.kernel = [entry(i) for i in range(400)]
+        self.leader = self.table(lambda: list(self.kernel), leader=True)
+        self.follower = self.table(None, leader=False)
+        self.syncs = []
+        sync = self.follower.sync
+        self.follower.sync = lambda entries, version=None: (self.syncs.append(version), sync(entries, version))
+        self.follow(self.publish())
+
+    def table(self, reader, leader):
+        table = NeighborTable(reader=reader)
+        table._shared = FakeShared(table, leader)
+        # No kernel events here: the tests drive the table themselves
+        table._watcher_pid, table._watching = os.getpid(), True
+        return table
+
+    def publish(self):
+        snapshot = self.leader.get()
+        record = SharedSnapshotRecord(snapshot.version, snapshot.etag, None, snapshot.body)
+        record.delta = self.leader.delta(snapshot)
+        return record
+
+    def follow(self, record):
+        self.follower._follow(record)
+        self.assertEqual(self.follower._entries, self.leader._entries)
+        self.assertEqual((self.follower.version, self.follower.epoch), (self.leader.version, self.leader.epoch))
+
+    def test_state_changes_are_held_back(self):
+        version = self.leader.version
+        for i in range(50):
+            self.leader.upsert(entry(i, 'STALE'))
+        self.leader.upsert(entry(0, 'REACHABLE'))
+        self.assertEqual(self.leader.version, version)
+        self.assertEqual(self.leader._entries[entry_key(entry(1))]['state'], 'REACHABLE')
+        with mock.patch.object(neighbor_table, 'STATE_COALESCE_SECONDS', 0):
+            self.leader.get()
+        self.assertEqual(self.leader.version, version + 1)
+        self.assertEqual(self.leader._entries[entry_key(entry(1))]['state'], 'STALE')
+        self.assertEqual(self.leader._entries[entry_key(entry(0))]['state'], 'REACHABLE')
+        changes = self.leader.changes(version, self.leader.epoch)
+        self.assertEqual(len(changes['changed']), 49)
+
+    def test_real_change_carries_the_held_state(self):
+        version = self.leader.version
+        self.leader.upsert(entry(3, 'STALE'))
+        self.leader.upsert(entry(3, 'DELAY', mac='02:ff:ff:ff:ff:ff'))
+        self.assertEqual(self.leader.version, version + 1)
+        self.assertEqual(self.leader._pending_states, {})
+        self.assertEqual(self.leader._entries[entry_key(entry(3))]['state'], 'DELAY')
+
+    def test_reload_holds_back_state_changes(self):
+        self.kernel = [entry(i, 'STALE' if i % 4 == 0 else 'REACHABLE') for i in range(401)]
+        version = self.leader.version
+        self.leader.reload()
+        self.assertEqual(self.leader.version, version + 1)
+        self.assertEqual(len(self.leader._pending_states), 100)
+
+    def test_followers_apply_deltas(self):
+        self.leader.upsert(entry(5, mac='02:ff:ff:ff:ff:ff'))
+        self.leader.remove(entry_key(entry(7)))
+        self.leader.upsert(entry(1000))
+        record = self.publish()
+        self.assertTrue(record.delta)
+        self.follow(record)
+        # Several publications behind
+        for i in range(2000, 2005):
+            self.leader.upsert(entry(i))
+            self.publish()
+        self.leader.remove(entry_key(entry(2001)))
+        self.follow(self.publish())
+        self.assertEqual(len(self.syncs), 1)
+
+    def test_large_changes_are_published_whole(self):
+        for i in range(200):
+            self.leader.remove(entry_key(entry(i)))
+        record = self.publish()
+        self.assertEqual(record.delta, b'')
+        self.follow(record)
+        self.assertEqual(len(self.syncs), 2)
+
+    def test_new_epoch_is_not_applied_as_delta(self):
+        self.leader._following = True  # as after losing the lock; the next read starts a new history
+        self.leader.upsert(entry(1000))
+        self.follow(self.publish())
+        self.assertEqual(len(self.syncs), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import netlink  # noqa: E402
+from netplan_diff import FULL, NARROW, NOOP, interface_changes, netlink_delta, plan_apply  # noqa: E402
+
+BASE = {
+    'network': {
+        'version': 2,
+        'ethernets': {
+            'eth0': {
+                'dhcp4': False,
+                'addresses': ['192.0.2.10/24'],
+                'routes': [{'to': 'default', 'via': '192.0.2.1'}],
+                'nameservers': {'addresses': ['192.0.2.53']},
+            },
+            'eth1': {'dhcp4': True},
+        },
+    },
+}
+
+
+def edited(change):
+    config = copy.deepcopy(BASE)
+    change(config['network']['ethernets'])
+    return config
+
+
+class InterfaceChangesTests(unittest.TestCase):
+    def test_identical(self):
+        self.assertEqual(interface_changes(BASE, copy.deepcopy(BASE)), {})
+
+    def test_defaults_are_not_changes(self):
+        after = edited(lambda ethernets: ethernets['eth0'].pop('dhcp4'))
+        self.assertEqual(interface_changes(BASE, after), {})
+
+    def test_changed_keys(self):
+        def change(ethernets):
+            ethernets['eth0']['addresses'] = ['192.0.2.11/24']
+            ethernets['eth0']['mtu'] = 9000
+        self.assertEqual(interface_changes(BASE, edited(change)), {'eth0': ['addresses', 'mtu']})
+
+    def test_added_and_removed_interfaces(self):
+        def change(ethernets):
+            del ethernets['eth1']
+            ethernets['eth2'] = {}
+        self.assertEqual(interface_changes(BASE, edited(change)), {'eth1': ['dhcp4'], 'eth2': []})
+
+    def test_missing_sections(self):
+        self.assertEqual(interface_changes({}, {'network': None}), {})
+
+
+class PlanApplyTests(unittest.TestCase):
+    def assertPlan(self, change, expected):
+        path, _changes = plan_apply(BASE, edited(change))
+        self.assertEqual(path, expected)
+
+    def test_noop(self):
+        self.assertPlan(lambda ethernets: None, NOOP)
+
+    def test_narrow_changes(self):
+        cases = [
+            lambda e: e['eth0'].update(addresses=['192.0.2.11/24', '198.51.100.1/24']),
+            lambda e: e['eth0'].update(routes=[{'to': 'default', 'via': '192.0.2.254', 'metric': 100}]),
+            lambda e: e['eth0'].update(routes=[{'to': '203.0.113.0/24', 'via': '192.0.2.1'}]),
+            lambda e: e['eth0'].update(nameservers={'addresses': ['198.51.100.53']}),
+        ]
+        for change in cases:
+            with self.subTest(change=change):
+                self.assertPlan(change, NARROW)
+
+    def test_full_changes(self):
+        cases = {
+            'other key': lambda e: e['eth0'].update(mtu=9000),
+            'dhcp switch': lambda e: e['eth0'].update(dhcp4=True),
+            'dhcp interface': lambda e: e['eth1'].update(addresses=['198.51.100.2/24']),
+            'ipv6 address': lambda e: e['eth0'].update(addresses=['2001:db8::2/64']),
+            'ipv6 route': lambda e: e['eth0'].update(routes=[{'to': '2001:db8:1::/48', 'via': '2001:db8::1'}]),
+            'route options': lambda e: e['eth0'].update(routes=[{'to': 'default', 'via': '192.0.2.1',
+                                                                 'on-link': True}]),
+            'address options': lambda e: e['eth0'].update(addresses=[{'192.0.2.10/24': {'label': 'x'}}]),
+            'new interface': lambda e: e.update(eth2={'addresses': ['198.51.100.2/24']}),
+            'removed interface': lambda e: e.pop('eth0'),
+        }
+        for name, change in cases.items():
+            with self.subTest(name):
+                self.assertPlan(change, FULL)
+
+
+class NetlinkDeltaTests(unittest.TestCase):
+    def test_request_order(self):
+        old = BASE['network']['ethernets']['eth0']
+        new = dict(old, addresses=['192.0.2.11/24'], routes=[{'to': 'default', 'via': '192.0.2.254'}])
+        requests, deletions = netlink_delta(2, old, new)
+        self.assertEqual([msg_type for msg_type, _flags, _payload in requests], [
+            netlink.RTM_NEWLINK, netlink.RTM_NEWADDR, netlink.RTM_DELROUTE, netlink.RTM_DELADDR,
+            netlink.RTM_NEWROUTE])
+        self.assertEqual(deletions, [False, False, True, True, False])
+
+    def test_unchanged_settings_only_bring_the_link_up(self):
+        old = BASE['network']['ethernets']['eth0']
+        requests, deletions = netlink_delta(2, old, copy.deepcopy(old))
+        self.assertEqual([msg_type for msg_type, _flags, _payload in requests], [netlink.RTM_NEWLINK])
+        self.assertEqual(deletions, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from networkd_state import (LEASES_DIR, LINKS_DIR, RESOLVE_LINKS_DIR, NetworkdState,  # noqa: E402
+                            build_links, parse_lease, parse_state_file)
+
+LINK_FILE = """# This is private data. Do not parse.
+ADMIN_STATE=configured
+OPER_STATE=routable
+DNS=192.0.2.53 192.0.2.54
+DOMAINS=
+DHCP_LEASE=/run/systemd/netif/leases/2
+"""
+
+LEASE_FILE = """# This is private data. Do not parse.
+ADDRESS=192.0.2.10
+NETMASK=255.255.255.0
+ROUTER=192.0.2.1 192.0.2.2
+SERVER_ADDRESS=192.0.2.254
+LIFETIME=3600
+"""
+
+
+class ParseTests(unittest.TestCase):
+    def test_parse_state_file(self):
+        values = parse_state_file(LINK_FILE + 'HOSTNAME="quoted name"\nnot a pair\n  \n')
+        self.assertEqual(values['OPER_STATE'], 'routable')
+        self.assertEqual(values['DNS'], '192.0.2.53 192.0.2.54')
+        self.assertEqual(values['DOMAINS'], '')
+        self.assertEqual(values['DHCP_LEASE'], '/run/systemd/netif/leases/2')
+        self.assertEqual(values['HOSTNAME'], 'quoted name')
+        self.assertNotIn('not a pair', values)
+        self.assertFalse(any(key.startswith('#') for key in values))
+
+    def test_parse_lease(self):
+        values = dict(parse_state_file(LEASE_FILE), _mtime=1000.7)
+        self.assertEqual(parse_lease(values), {
+            'Address': '192.0.2.10', 'Server': '192.0.2.254', 'Router': '192.0.2.1',
+            'Lifetime': 3600, 'Expires': 4600,
+        })
+
+    def test_parse_lease_without_lifetime(self):
+        self.assertEqual(parse_lease({'ADDRESS': '192.0.2.10', 'LIFETIME': 'infinity', '_mtime': 5.0}), {
+            'Address': '192.0.2.10', 'Server': None, 'Router': None, 'Lifetime': None, 'Expires': None,
+        })
+
+    def test_build_links(self):
+        links = {2: parse_state_file(LINK_FILE), 3: {'OPER_STATE': 'off'}}
+        leases = {2: dict(parse_state_file(LEASE_FILE), _mtime=0)}
+        state = build_links(links, leases, {3: {'SERVERS': '198.51.100.53'}, 9: {'SERVERS': '198.51.100.1'}})
+        self.assertEqual(sorted(state), [2, 3])
+        self.assertEqual(state[2]['dns'], ['192.0.2.53', '192.0.2.54'])
+        self.assertEqual(state[2]['admin_state'], 'configured')
+        self.assertEqual(state[2]['lease']['Expires'], 3600)
+        self.assertEqual(state[3], {'oper_state': 'off', 'admin_state': None,
+                                    'dns': ['198.51.100.53'], 'lease': None})
+
+    def test_runtime_servers_take_precedence(self):
+        state = build_links({2: parse_state_file(LINK_FILE)}, {}, {2: {'SERVERS': '198.51.100.53'}})
+        self.assertEqual(state[2]['dns'], ['198.51.100.53'])
+
+
+class NetworkdStateTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+
+    def write(self, directory, name, text):
+        path = os.path.join(self.root, directory)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(text)
+
+    def wait_for(self, state, predicate, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not predicate(state.links()) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return state.links()
+
+    def test_not_managed(self):
+        self.assertIsNone(NetworkdState(self.root).links())
+
+    def test_reads_state_directories(self):
+        self.write(LINKS_DIR, '2', LINK_FILE)
+        self.write(LINKS_DIR, 'README', 'ignored')
+        self.write(LEASES_DIR, '2', LEASE_FILE)
+        self.write(RESOLVE_LINKS_DIR, '2', 'SERVERS=198.51.100.53\n')
+        links = NetworkdState(self.root).links()
+        self.assertEqual(sorted(links), [2])
+        self.assertEqual(links[2]['dns'], ['198.51.100.53'])
+        self.assertEqual(links[2]['lease']['Address'], '192.0.2.10')
+        lease_mtime = int(os.stat(os.path.join(self.root, LEASES_DIR, '2')).st_mtime)
+        self.assertEqual(links[2]['lease']['Expires'], lease_mtime + 3600)
+
+    def test_cached_until_changed(self):
+        self.write(LINKS_DIR, '2', LINK_FILE)
+        state = NetworkdState(self.root)
+        self.assertIs(state.links(), state.links())
+        self.write(LINKS_DIR, '2', LINK_FILE.replace('routable', 'degraded'))
+        links = self.wait_for(state, lambda links: links[2]['oper_state'] == 'degraded')
+        self.assertEqual(links[2]['oper_state'], 'degraded')
+
+    def test_directories_created_later(self):
+        state = NetworkdState(self.root)
+        self.assertIsNone(state.links())
+        self.write(LINKS_DIR, '4', 'OPER_STATE=carrier\n')
+        links = self.wait_for(state, lambda links: links is not None)
+        self.assertEqual(links[4]['oper_state'], 'carrier')
+
+    def test_unrelated_root_entries_do_not_invalidate(self):
+        self.write(LINKS_DIR, '2', LINK_FILE)
+        state = NetworkdState(self.root)
+        links = state.links()
+        calls = []
+        state.subscribe(lambda: calls.append(True))
+        for name in ('users', 'units', 'journal'):
+            os.makedirs(os.path.join(self.root, name))
+        time.sleep(0.2)
+        self.assertIs(state.links(), links)
+        self.assertEqual(calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request, Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import representations  # noqa: E402
+from representations import (COLUMNAR, JSON, MSGPACK, FormatUnavailable, SnapshotRepresentations,  # noqa: E402
+                             columns, negotiate)
+from snapshot_cache import Snapshot  # noqa: E402
+
+
+def request(query=None, accept=None, accept_encoding=None, if_none_match=None):
+    headers = {name: value for name, value in (('Accept', accept), ('Accept-Encoding', accept_encoding),
+                                               ('If-None-Match', if_none_match)) if value is not None}
+    return Request(EnvironBuilder(query_string=query, headers=headers).get_environ())
+
+
+def choose(**kwargs):
+    req = request(**kwargs)
+    return negotiate(req.args, req.accept_mimetypes, req.accept_encodings)
+
+
+def snapshot(version=1, count=100):
+    data = [{'ip': f"192.0.2.{i}", 'mac': f"02:00:00:00:00:{i:02x}", 'iface': 'eth0'} for i in range(count)]
+    return Snapshot(version, f"{version}-abc", data, json.dumps(data).encode())
+
+
+class NegotiateTests(unittest.TestCase):
+    def test_default_is_plain_json(self):
+        self.assertEqual(choose(), (JSON, None))
+        self.assertEqual(choose(accept='*/*'), (JSON, None))
+        self.assertEqual(choose(accept='text/html'), (JSON, None))
+
+    def test_format_parameter_wins_over_accept(self):
+        self.assertEqual(choose(query='format=columnar', accept='application/json'), (COLUMNAR, None))
+
+    def test_accept_header(self):
+        self.assertEqual(choose(accept='application/vnd.network-config.columnar+json'), (COLUMNAR, None))
+        self.assertEqual(choose(accept='application/json;q=0.5, application/vnd.network-config.columnar+json'),
+                         (COLUMNAR, None))
+
+    @mock.patch.object(representations, 'msgpack', object())
+    def test_msgpack_media_types(self):
+        self.assertEqual(choose(accept='application/msgpack'), (MSGPACK, None))
+        self.assertEqual(choose(accept='application/x-msgpack'), (MSGPACK, None))
+
+    @mock.patch.object(representations, 'msgpack', None)
+    def test_msgpack_not_installed(self):
+        self.assertEqual(choose(accept='application/msgpack'), (JSON, None))
+        with self.assertRaises(FormatUnavailable):
+            choose(query='format=msgpack')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError) as raised:
+            choose(query='format=xml')
+        self.assertNotIsInstance(raised.exception, FormatUnavailable)
+
+    @mock.patch.object(representations, 'zstandard', object())
+    def test_encodings(self):
+        self.assertEqual(choose(accept_encoding='gzip'), (JSON, 'gzip'))
+        self.assertEqual(choose(accept_encoding='gzip, zstd'), (JSON, 'zstd'))
+        self.assertEqual(choose(accept_encoding='zstd;q=0.1, gzip'), (JSON, 'gzip'))
+        self.assertEqual(choose(accept_encoding='br'), (JSON, None))
+
+    @mock.patch.object(representations, 'zstandard', None)
+    def test_zstd_not_installed(self):
+        self.assertEqual(choose(accept_encoding='zstd, gzip;q=0.5'), (JSON, 'gzip'))
+        self.assertEqual(choose(accept_encoding='zstd'), (JSON, None))
+
+
+class RepresentationTests(unittest.TestCase):
+    def setUp(self):
+        self.representations = SnapshotRepresentations(columns)
+
+    def test_columns(self):
+        self.assertEqual(columns([{'a': 1}, {'a': 2, 'b': 3}]), {'count': 2, 'columns': {'a': [1, 2], 'b': [None, 3]}})
+
+    def test_renderings_are_cached_per_version(self):
+        snap = snapshot()
+        body, encoding = self.representations.get(snap, JSON)
+        self.assertIs(body, snap.body)
+        self.assertIsNone(encoding)
+        columnar, _ = self.representations.get(snap, COLUMNAR, 'gzip')
+        self.assertIs(self.representations.get(snap, COLUMNAR, 'gzip')[0], columnar)
+        self.assertEqual(json.loads(gzip.decompress(columnar)), columns(snap.data))
+
+    def test_small_bodies_are_not_compressed(self):
+        snap = snapshot(count=1)
+        self.assertEqual(self.representations.get(snap, JSON, 'gzip'), (snap.body, None))
+
+    def test_keeps_recent_versions_only(self):
+        first = self.representations.get(snapshot(1), COLUMNAR)[0]
+        self.representations.get(snapshot(2), COLUMNAR)
+        self.assertIs(self.representations.get(snapshot(1), COLUMNAR)[0], first)
+        self.representations.get(snapshot(2), COLUMNAR)
+        self.representations.get(snapshot(3), COLUMNAR)
+        self.assertIsNot(self.representations.get(snapshot(1), COLUMNAR)[0], first)
+
+    def test_response_etags_and_304(self):
+        snap = snapshot()
+        response = self.representations.response(Response, request(query='format=columnar',
+                                                                    accept_encoding='gzip'), snap)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.get_etag(), ('1-abc.columnar.gzip', False))
+        self.assertEqual(response.headers['Vary'], 'Accept, Accept-Encoding')
+        response = self.representations.response(Response, request(if_none_match='"1-abc"'), snap)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_etag(), ('1-abc', False))
+
+    def test_response_errors(self):
+        response = self.representations.response(Response, request(query='format=xml'), snapshot())
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.object(representations, 'msgpack', None):
+            response = self.representations.response(Response, request(query='format=msgpack'), snapshot())
+        self.assertEqual(response.status_code, 406)
+        self.assertIn('error', json.loads(response.get_data()))
+
+
+if __name__ == '__main__':
+    unittest.main()
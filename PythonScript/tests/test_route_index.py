@@ -0,0 +1,109 @@
+import os
+import random
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_index import PrefixTrie, parse_address  # noqa: E402
+
+
+def prefix(address, length, bits=32):
+    family = socket.AF_INET if bits == 32 else socket.AF_INET6
+    key = int.from_bytes(socket.inet_pton(family, address), 'big')
+    return key >> (bits - length) << (bits - length) if length else 0, length
+
+
+def contains(key, length, address, bits):
+    return length == 0 or address >> (bits - length) == key >> (bits - length)
+
+
+class PrefixTrieTests(unittest.TestCase):
+    def test_longest_match_first(self):
+        trie = PrefixTrie(32)
+        for address, length in (('0.0.0.0', 0), ('10.0.0.0', 8), ('10.1.0.0', 16), ('10.1.2.0', 24)):
+            trie.setdefault(*prefix(address, length))['route'] = f"{address}/{length}"
+        _family, address = parse_address('10.1.2.3')
+        self.assertEqual([values['route'] for values in trie.lookup(address)],
+                         ['10.1.2.0/24', '10.1.0.0/16', '10.0.0.0/8', '0.0.0.0/0'])
+        _family, address = parse_address('10.2.0.1')
+        self.assertEqual([values['route'] for values in trie.lookup(address)], ['10.0.0.0/8', '0.0.0.0/0'])
+
+    def test_accept_picks_longest_accepted(self):
+        trie = PrefixTrie(32)
+        trie.setdefault(*prefix('192.0.2.0', 24))['usable'] = False
+        trie.setdefault(*prefix('192.0.0.0', 16))['usable'] = True
+        _family, address = parse_address('192.0.2.9')
+        self.assertEqual(trie.lookup(address, accept=lambda values: values['usable']), [{'usable': True}])
+        self.assertEqual(trie.lookup(address, accept=lambda values: False), [])
+
+    def test_setdefault_get_discard(self):
+        trie = PrefixTrie(32)
+        values = trie.setdefault(*prefix('198.51.100.0', 24))
+        values['x'] = 1
+        self.assertIs(trie.setdefault(*prefix('198.51.100.0', 24)), values)
+        self.assertIs(trie.get(*prefix('198.51.100.0', 24)), values)
+        self.assertIsNone(trie.get(*prefix('198.51.100.0', 25)))
+        self.assertEqual(len(trie), 1)
+        trie.discard(*prefix('198.51.100.0', 25))
+        self.assertEqual(len(trie), 1)
+        trie.discard(*prefix('198.51.100.0', 24))
+        self.assertEqual(len(trie), 0)
+        self.assertIsNone(trie.get(*prefix('198.51.100.0', 24)))
+        self.assertEqual(list(trie.items()), [])
+
+    def test_host_bits_are_ignored(self):
+        trie = PrefixTrie(32)
+        trie.setdefault(*prefix('203.0.113.0', 24))['route'] = 1
+        _family, address = parse_address('203.0.113.77')
+        self.assertIs(trie.setdefault(address, 24), trie.get(*prefix('203.0.113.0', 24)))
+
+    def test_ipv6(self):
+        trie = PrefixTrie(128)
+        trie.setdefault(*prefix('::', 0, 128))['route'] = 'default'
+        trie.setdefault(*prefix('2001:db8::', 32, 128))['route'] = 'doc'
+        trie.setdefault(*prefix('2001:db8:1::', 48, 128))['route'] = 'site'
+        family, address = parse_address('2001:db8:1::5')
+        self.assertEqual(family, socket.AF_INET6)
+        self.assertEqual([values['route'] for values in trie.lookup(address)], ['site', 'doc', 'default'])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for bits in (32, 128):
+            trie, reference = PrefixTrie(bits), {}
+            for step in range(3000):
+                length = rng.choice((0, 1, 7, 8, 12, 16, 23, 24, 31, bits))
+                key = rng.getrandbits(bits) >> (bits - length) << (bits - length) if length else 0
+                if rng.random() < 0.3 and reference:
+                    key, length = rng.choice(list(reference))
+                    trie.discard(key, length)
+                    del reference[key, length]
+                else:
+                    trie.setdefault(key, length)['prefix'] = (key, length)
+                    reference[key, length] = True
+                if step % 100:
+                    continue
+                self.assertEqual(len(trie), len(reference))
+                # Address order: shorter prefixes before the ones they contain
+                self.assertEqual([(key, length) for key, length, _values in trie.items()], sorted(reference))
+                for _ in range(50):
+                    address = rng.getrandbits(bits)
+                    expected = sorted((length for key, length in reference if contains(key, length, address, bits)),
+                                      reverse=True)
+                    self.assertEqual([values['prefix'][1] for values in trie.lookup(address)], expected)
+
+
+class ParseAddressTests(unittest.TestCase):
+    def test_families(self):
+        self.assertEqual(parse_address(' 192.0.2.1 '), (socket.AF_INET, 0xC0000201))
+        self.assertEqual(parse_address('::1'), (socket.AF_INET6, 1))
+
+    def test_rejects_non_addresses(self):
+        for value in ('', 'host.example', '192.0.2.0/24', '300.1.1.1'):
+            with self.assertRaises(ValueError):
+                parse_address(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
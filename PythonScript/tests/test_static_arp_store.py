@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static_arp_store import (HOOK_MARKER, StaticArpError, StaticArpStore, normalize_ip,  # noqa: E402
+                              normalize_mac, parse_csv, to_csv)
+
+LEGACY_HOOK = """#!/bin/sh
+arp -s 192.0.2.20 AA-BB-CC-DD-EE-02
+  arp -s 192.0.2.10 aa:bb:cc:dd:ee:01
+arp -s 198.51.100.7 aabb.ccdd.ee03
+arp -s not-an-ip aa:bb:cc:dd:ee:04
+arp -s 192.0.2.30 zz:zz
+echo done
+"""
+
+
+class NormalizeTests(unittest.TestCase):
+    def test_mac_forms(self):
+        for mac in ('AA:BB:CC:DD:EE:FF', 'aa-bb-cc-dd-ee-ff', 'aabbccddeeff', 'aabb.ccdd.eeff', ' AA BB CC DD EE FF'):
+            self.assertEqual(normalize_mac(mac), 'aa:bb:cc:dd:ee:ff')
+
+    def test_invalid_mac(self):
+        for mac in ('', 'aa:bb:cc', 'aa:bb:cc:dd:ee:gg', 'aa:bb:cc:dd:ee:ff:00'):
+            with self.assertRaises(StaticArpError):
+                normalize_mac(mac)
+
+    def test_ip(self):
+        self.assertEqual(normalize_ip(' 192.0.2.1 '), '192.0.2.1')
+        for ip in ('', '192.0.2', '300.1.1.1', '2001:db8::1'):
+            with self.assertRaises(StaticArpError):
+                normalize_ip(ip)
+
+
+class CsvTests(unittest.TestCase):
+    def test_without_header(self):
+        self.assertEqual(parse_csv("192.0.2.1,aa:bb:cc:dd:ee:ff,eth0\n 192.0.2.2 , 02:00:00:00:00:01\n"), [
+            {'ip': '192.0.2.1', 'mac': 'aa:bb:cc:dd:ee:ff', 'iface': 'eth0'},
+            {'ip': '192.0.2.2', 'mac': '02:00:00:00:00:01'},
+        ])
+
+    def test_header_and_blank_lines(self):
+        self.assertEqual(parse_csv("IP, MAC\n\n , \n192.0.2.1,aa:bb:cc:dd:ee:ff\n"),
+                         [{'ip': '192.0.2.1', 'mac': 'aa:bb:cc:dd:ee:ff'}])
+
+    def test_round_trip(self):
+        entries = [{'ip': '192.0.2.1', 'mac': 'aa:bb:cc:dd:ee:ff', 'iface': 'eth0'},
+                   {'ip': '192.0.2.2', 'mac': '02:00:00:00:00:01', 'iface': 'eth1'}]
+        text = to_csv(entries)
+        self.assertTrue(text.startswith("ip,mac,iface\n"))
+        self.assertEqual(parse_csv(text), entries)
+
+
+class LegacyImportTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = lambda name: os.path.join(self.tmp.name, name)  # noqa: E731
+        self.hook_path = path('routable.d/setarp-static')
+        self.store = StaticArpStore(path=path('store/static-arp.json'), batch_path=path('store/static-arp.batch'),
+                                    lock_path=path('store/.lock'), hook_path=self.hook_path,
+                                    unresolved_path=path('store/static-arp.unresolved'),
+                                    legacy_backup_path=path('store/setarp-static.legacy'))
+        self.lookups = []
+
+        def resolve_iface(ip, nl=None):
+            self.lookups.append(ip)
+            if ip.startswith('198.51.100.'):
+                raise StaticArpError(f"No route to {ip}")
+            return 'eth0'
+        self.store.resolve_iface = resolve_iface
+
+    def write_hook(self, text):
+        os.makedirs(os.path.dirname(self.hook_path), exist_ok=True)
+        with open(self.hook_path, 'w') as f:
+            f.write(text)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_imports_and_keeps_unrouted_entries(self):
+        self.write_hook(LEGACY_HOOK)
+        self.assertEqual(self.store.entries(), [
+            {'ip': '192.0.2.10', 'mac': 'aa:bb:cc:dd:ee:01', 'iface': 'eth0'},
+            {'ip': '192.0.2.20', 'mac': 'aa:bb:cc:dd:ee:02', 'iface': 'eth0'},
+            {'ip': '198.51.100.7', 'mac': 'aa:bb:cc:dd:ee:03', 'iface': None},
+        ])
+        with open(self.store.path) as f:
+            self.assertEqual(len(json.load(f)['entries']), 3)
+        self.assertEqual(self.read(self.store.batch_path),
+                         "neigh replace 192.0.2.10 lladdr aa:bb:cc:dd:ee:01 dev eth0 nud permanent\n"
+                         "neigh replace 192.0.2.20 lladdr aa:bb:cc:dd:ee:02 dev eth0 nud permanent\n")
+        self.assertEqual(self.read(self.store.unresolved_path), "198.51.100.7 aa:bb:cc:dd:ee:03\n")
+
+    def test_replaces_hook_and_backs_up_the_original(self):
+        self.write_hook(LEGACY_HOOK)
+        self.store.entries()
+        self.assertEqual(self.read(self.store.legacy_backup_path), LEGACY_HOOK)
+        hook = self.read(self.hook_path)
+        self.assertIn(HOOK_MARKER, hook)
+        self.assertIn(self.store.batch_path, hook)
+        self.assertIn(self.store.unresolved_path, hook)
+        # A generated hook is not a legacy script: no further backup
+        self.store.install_hook()
+        self.assertEqual(self.read(self.store.legacy_backup_path), LEGACY_HOOK)
+
+    def test_resolves_pending_entries_on_save(self):
+        self.write_hook(LEGACY_HOOK)
+        self.store.entries()
+        self.store.resolve_iface = lambda ip, nl=None: 'eth1'
+        self.store._save()
+        self.assertEqual(self.store.get('198.51.100.7')['iface'], 'eth1')
+        self.assertEqual(self.read(self.store.unresolved_path), "")
+
+    def test_reloads_store_rewritten_elsewhere(self):
+        self.write_hook(LEGACY_HOOK)
+        self.store.entries()
+        other = StaticArpStore(path=self.store.path, batch_path=self.store.batch_path,
+                               lock_path=self.store.lock_path, hook_path=self.hook_path,
+                               unresolved_path=self.store.unresolved_path,
+                               legacy_backup_path=self.store.legacy_backup_path)
+        self.assertEqual(other.entries(), self.store.entries())
+
+    def test_nothing_to_migrate_reads_hook_once(self):
+        self.write_hook("#!/bin/sh\necho nothing\n")
+        opened = []
+        original = self.store._import_legacy_hook
+
+        def counting():
+            opened.append(True)
+            return original()
+        self.store._import_legacy_hook = counting
+        self.assertEqual(self.store.entries(), [])
+        self.assertEqual(self.store.entries(), [])
+        self.assertIsNone(self.store.get('192.0.2.10'))
+        self.assertEqual(len(opened), 1)
+        self.assertFalse(os.path.exists(self.store.path))
+
+    def test_missing_hook(self):
+        self.assertEqual(self.store.entries(), [])
+        self.assertEqual(self.lookups, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/bin/bash
+
+# Build the web UI into dist/ once. Later runs (every ui.service start) only
+# rebuild when the sources changed, so a normal boot skips npm entirely.
+
+export PATH=$PATH:/usr/local/bin:/usr/bin
+
+cd "$(dirname "$0")" || exit 1
+
+STAMP=dist/.build-stamp
+
+# Hash of everything the build reads
+sources=$(find src public index.html package.json package-lock.json vite.config.js \
+               tailwind.config.js postcss.config.js -type f -print0 2>/dev/null \
+          | sort -z | xargs -0 sha256sum | sha256sum | cut -d' ' -f1)
+
+if [ -f "$STAMP" ] && [ "$(cat "$STAMP")" = "$sources" ]; then
+    echo "dist/ is up to date"
+    exit 0
+fi
+
+if [ -f package-lock.json ]; then
+    npm ci || { echo "npm ci failed"; exit 1; }
+else
+    npm install || { echo "npm install failed"; exit 1; }
+fi
+
+npm run build || { echo "Build failed"; exit 1; }
+
+# gzip (and brotli, if python3-brotli is installed) copies served as-is
+python3 PythonScript/static_ui.py --precompress --dist dist || { echo "Precompression failed"; exit 1; }
+
+echo "$sources" > "$STAMP"
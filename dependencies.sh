@@ -9,6 +9,15 @@ sudo apt install -y gunicorn || { echo "Failed to install Gunicorn"; exit 1; }
 # Install Python dependencies for Flask
 sudo apt install -y python3-flask-cors python3-psutil || { echo "Failed to install Flask dependencies"; exit 1; }
 
+# Optional: Prometheus client for the /metrics endpoints
+sudo apt install -y python3-prometheus-client || echo "python3-prometheus-client not installed; /metrics will be disabled"
+
+# Optional: MessagePack and zstd responses for /arp and /network-info
+sudo apt install -y python3-msgpack python3-zstandard || echo "python3-msgpack/python3-zstandard not installed; JSON and gzip only"
+
+# Optional: brotli copies of the built UI files (gzip is always written)
+sudo apt install -y python3-brotli || echo "python3-brotli not installed; the UI is precompressed with gzip only"
+
 # Install Node.js and npm
 curl -fsSL https://deb.nodesource.com/setup_lts.x | sudo -E bash -
 sudo apt install -y nodejs  || { echo "Failed to install Node.js and npm"; exit 1; }
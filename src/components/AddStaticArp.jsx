@@ -1,8 +1,9 @@
 import { useEffect, useState } from "react";
 import SideMenu from "./SideMenu";
+import useArpTable from "../hooks/useArpTable";
 
 const AddStaticArp = () => {
-  const [arpData, setArpData] = useState([]);
+  const { arpData, error: arpError, refresh: fetchArpData } = useArpTable();
   const [error, setError] = useState(null);
   const [successMessage, setSuccessMessage] = useState(null);
   const [ip, setIp] = useState("");
@@ -10,20 +11,6 @@ const AddStaticArp = () => {
   const [interfaces, setInterfaces] = useState([]);
   const [ipError, setIpError] = useState("");
 
-  const fetchArpData = async () => {
-    try {
-      const response = await fetch("/api2/arp");
-      if (!response.ok) {
-        throw new Error("Failed to fetch ARP data");
-      }
-      const data = await response.json();
-      setArpData(data);
-      setError(null); // Clear any previous error
-    } catch (error) {
-      setError("Failed to fetch ARP data.");
-    }
-  };
-
   const fetchInterfaces = async () => {
     try {
       const response = await fetch("/api2/interfaces");
@@ -88,10 +75,7 @@ const AddStaticArp = () => {
   };
 
   useEffect(() => {
-    fetchArpData();
     fetchInterfaces();
-    const interval = setInterval(fetchArpData, 2000);
-    return () => clearInterval(interval); // Clear the interval on cleanup
   }, []);
 
   const handleIpChange = (e) => {
@@ -124,9 +108,9 @@ const AddStaticArp = () => {
           <h3 className="text-blue-600 text-3xl font-bold mb-4">ARP Table</h3>
 
           {/* Error Display */}
-          {error && (
+          {(error || arpError) && (
             <div className="text-red-600 font-semibold mb-4">
-              Error: {error}
+              Error: {error || "Failed to fetch ARP data."}
             </div>
           )}
 
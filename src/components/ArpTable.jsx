@@ -1,38 +1,9 @@
-import { useEffect, useState } from "react";
 import SideMenu from "./SideMenu";
+import useArpTable from "../hooks/useArpTable";
 
 const ArpTable = () => {
-  const [arpData, setArpData] = useState([]);
-  const [error, setError] = useState(null);
-
-  // Function to fetch ARP data
-  const fetchArpData = async () => {
-    try {
-      const response = await fetch("/api2/arp");
-      if (!response.ok) {
-        throw new Error(`Failed to fetch ARP data: ${response.statusText}`);
-      }
-      const data = await response.json();
-
-      // Ensure data is an array before setting state
-      if (Array.isArray(data)) {
-        setArpData(data);
-        setError(null);
-      } else {
-        throw new Error("Unexpected API response format.");
-      }
-    } catch (err) {
-      setError(err.message);
-      setArpData([]);
-    }
-  };
-
-  // useEffect for periodic data fetching
-  useEffect(() => {
-    fetchArpData();
-    const interval = setInterval(fetchArpData, 2000); // Refresh every 2 seconds
-    return () => clearInterval(interval); // Cleanup on unmount
-  }, []);
+  // Refreshes every 2 seconds with only the entries that changed
+  const { arpData, error } = useArpTable();
 
   return (
     <div className="flex h-screen w-screen mt=10">
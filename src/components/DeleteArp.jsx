@@ -1,8 +1,9 @@
 import { useEffect, useState } from "react";
 import SideMenu from "./SideMenu";
+import useArpTable from "../hooks/useArpTable";
 
 const DeleteArp = () => {
-  const [arpData, setArpData] = useState([]);
+  const { arpData, error: arpError, refresh: fetchArpData } = useArpTable();
   const [interfaces, setInterfaces] = useState([]);
   const [error, setError] = useState(null);
   const [successMessage, setSuccessMessage] = useState("");
@@ -10,21 +11,6 @@ const DeleteArp = () => {
   const [ipError, setIpError] = useState(""); // Track IP error state
 
   
-  // Function to fetch ARP data
-  const fetchArpData = async () => {
-    try {
-      const response = await fetch(`/api2/arp`);
-      if (!response.ok) {
-        throw new Error("Failed to fetch ARP data");
-      }
-      const data = await response.json();
-      setArpData(data);
-    } catch (error) {
-      console.error("Error fetching ARP data:", error);
-      setError("Failed to load ARP data.");
-    }
-  };
-
   // Function to fetch available network interfaces for the dropdown
   const fetchInterfaces = async () => {
     try {
@@ -88,10 +74,7 @@ const DeleteArp = () => {
   };
 
   useEffect(() => {
-    fetchArpData();
     fetchInterfaces();
-    const intervalId = setInterval(fetchArpData, 2000); // Refresh every 4 seconds
-    return () => clearInterval(intervalId);
   }, []);
 
   return (
@@ -99,7 +82,9 @@ const DeleteArp = () => {
       <SideMenu />
       <div className="flex-grow p-6 overflow-auto mt-4 justify-center">
         {/* Error Display */}
-        {error && <div className="text-red-500 mb-4">{error}</div>}
+        {(error || arpError) && (
+          <div className="text-red-500 mb-4">{error || "Failed to load ARP data."}</div>
+        )}
 
         {/* Success Message Display */}
         {successMessage && <div className="text-green-500 mb-4">{successMessage}</div>}
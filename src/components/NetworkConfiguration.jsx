@@ -1,6 +1,38 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import SideMenu from "./SideMenu";
 
+// Resolve with the final job record once a queued update is done or failed,
+// following the job's event stream and polling if the stream drops.
+function followJob(jobId) {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`/api1/jobs/${jobId}/stream`);
+    source.addEventListener("status", (event) => {
+      const job = JSON.parse(event.data);
+      if (job.status === "done" || job.status === "failed") {
+        source.close();
+        resolve(job);
+      }
+    });
+    source.onerror = () => {
+      source.close();
+      const poll = () =>
+        fetch(`/api1/jobs/${jobId}`)
+          .then((response) => response.json())
+          .then((job) => {
+            if (job.status === "done" || job.status === "failed") {
+              resolve(job);
+            } else if (job.status === "error") {
+              reject(new Error(job.message));
+            } else {
+              setTimeout(poll, 1000);
+            }
+          })
+          .catch(reject);
+      poll();
+    };
+  });
+}
+
 function NetworkConfiguration() {
   const [networkInfo, setNetworkInfo] = useState({});
   const [selectedInterface, setSelectedInterface] = useState("");
@@ -9,17 +41,68 @@ function NetworkConfiguration() {
   const [gateway, setGateway] = useState("");
   const [dns, setDns] = useState("");
   const [dhcpEnabled, setDhcpEnabled] = useState("DHCP");
+  const etagRef = useRef(null);
 
+  // Follow the change stream; poll every 5 seconds only while it is down
+  // and try to reopen it every 30 seconds.
   useEffect(() => {
-    fetchNetworkInfo();
-    const interval = setInterval(fetchNetworkInfo, 5000);
-    return () => clearInterval(interval);
+    let source = null;
+    let pollInterval = null;
+    let retryTimeout = null;
+
+    const startPolling = () => {
+      if (!pollInterval) {
+        fetchNetworkInfo();
+        pollInterval = setInterval(fetchNetworkInfo, 5000);
+      }
+    };
+
+    const stopPolling = () => {
+      clearInterval(pollInterval);
+      pollInterval = null;
+    };
+
+    const openStream = () => {
+      source = new EventSource("/api1/network-info/stream");
+      source.addEventListener("snapshot", (event) => {
+        stopPolling();
+        setNetworkInfo(JSON.parse(event.data));
+      });
+      source.addEventListener("delta", (event) => {
+        const { changed, removed } = JSON.parse(event.data);
+        setNetworkInfo((previous) => {
+          const next = { ...previous, ...changed };
+          removed.forEach((iface) => delete next[iface]);
+          return next;
+        });
+      });
+      source.onerror = () => {
+        source.close();
+        startPolling();
+        retryTimeout = setTimeout(openStream, 30000);
+      };
+    };
+
+    openStream();
+    return () => {
+      if (source) source.close();
+      stopPolling();
+      clearTimeout(retryTimeout);
+    };
   }, []);
 
   const fetchNetworkInfo = () => {
-    fetch(`/api1/network-info?ts=${new Date().getTime()}`)
-      .then((response) => response.json())
-      .then((data) => setNetworkInfo(data.network_info))
+    // Send the last ETag so unchanged polls come back as an empty 304
+    const headers = etagRef.current ? { "If-None-Match": etagRef.current } : {};
+    fetch("/api1/network-info", { headers, cache: "no-store" })
+      .then((response) => {
+        if (response.status === 304) {
+          return null;
+        }
+        etagRef.current = response.headers.get("ETag");
+        return response.json();
+      })
+      .then((data) => data && setNetworkInfo(data.network_info))
       .catch((error) => console.error("Error fetching network info:", error));
   };
 
@@ -57,8 +140,9 @@ function NetworkConfiguration() {
       body: JSON.stringify(payload),
     })
       .then((response) => response.json())
+      .then((data) => (data.status === "queued" ? followJob(data.job_id) : data))
       .then((data) => {
-        if (data.status === "success") {
+        if (data.status === "done") {
           alert("Network updated successfully!");
           // Clear input fields and reset DHCP to default
           setIp("");
@@ -0,0 +1,52 @@
+import { useCallback, useEffect, useRef, useState } from "react";
+
+const entryKey = (entry) => `${entry.iface}|${entry.ip}`;
+
+// Keeps a local copy of the ARP table in sync through /arp/changes, so each
+// poll only transfers the neighbours that were added, changed or removed.
+function useArpTable(intervalMs = 2000) {
+  const [arpData, setArpData] = useState([]);
+  const [error, setError] = useState(null);
+  const tableRef = useRef(new Map());
+  const cursorRef = useRef({ epoch: null, version: null });
+
+  const refresh = useCallback(async () => {
+    const { epoch, version } = cursorRef.current;
+    const query = epoch ? `?since=${version}&epoch=${epoch}` : "";
+    try {
+      const response = await fetch(`/api2/arp/changes${query}`);
+      if (!response.ok) {
+        throw new Error(`Failed to fetch ARP data: ${response.statusText}`);
+      }
+      const data = await response.json();
+      const table = tableRef.current;
+
+      if (data.full) {
+        table.clear();
+        data.entries.forEach((entry) => table.set(entryKey(entry), entry));
+      } else {
+        data.removed.forEach((entry) => table.delete(entryKey(entry)));
+        [...data.added, ...data.changed].forEach((entry) => table.set(entryKey(entry), entry));
+      }
+
+      const changed = data.full || data.added.length || data.changed.length || data.removed.length;
+      cursorRef.current = { epoch: data.epoch, version: data.version };
+      if (changed) {
+        setArpData(Array.from(table.values()));
+      }
+      setError(null);
+    } catch (err) {
+      setError(err.message);
+    }
+  }, []);
+
+  useEffect(() => {
+    refresh();
+    const interval = setInterval(refresh, intervalMs);
+    return () => clearInterval(interval);
+  }, [refresh, intervalMs]);
+
+  return { arpData, error, refresh };
+}
+
+export default useArpTable;
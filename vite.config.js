@@ -9,12 +9,14 @@ export default defineConfig({
       '/api1': {
         target: 'http://localhost:5001', // Flask server URL
         changeOrigin: true,
+        xfwd: true, // lets the backends tell proxied clients from local ones
         rewrite: (path) => path.replace(/^\/api1/, '')
 
       },
       '/api2': {
         target: 'http://localhost:5002', // Flask server URL
         changeOrigin: true,
+        xfwd: true, // lets the backends tell proxied clients from local ones
         rewrite: (path) => path.replace(/^\/api2/, '')
       },
       